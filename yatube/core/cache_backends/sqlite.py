@@ -0,0 +1,194 @@
+"""Кеш в файле SQLite, общий для всех процессов одного сервера."""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+
+class SQLiteCache(BaseCache):
+    """
+    Бэкенд кеша на SQLite.
+
+    В отличие от LocMemCache, данные видны всем воркерам gunicorn,
+    поэтому сброс кеша в одном процессе действует во всех. Целые числа
+    хранятся как INTEGER, что позволяет атомарно выполнять incr
+    одним UPDATE. Остальные значения сериализуются pickle.
+    """
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+    # Как часто (в записях) проверять превышение MAX_ENTRIES
+    cull_every = 100
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = os.path.abspath(location)
+        self._local = threading.local()
+
+    @property
+    def _db(self):
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            directory = os.path.dirname(self._path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            db = sqlite3.connect(
+                self._path, timeout=30, isolation_level=None,
+                check_same_thread=False,
+            )
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            db.execute(
+                'CREATE TABLE IF NOT EXISTS cache ('
+                'key TEXT PRIMARY KEY, value BLOB, expires REAL)'
+            )
+            self._local.db = db
+            self._local.writes = 0
+        return db
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _encode(self, value):
+        if type(value) is int:
+            return value
+        return pickle.dumps(value, self.pickle_protocol)
+
+    @staticmethod
+    def _decode(value):
+        if isinstance(value, int):
+            return value
+        return pickle.loads(value)
+
+    def _write(self, sql, params):
+        db = self._db
+        db.execute(sql, params)
+        self._local.writes += 1
+        if self._local.writes % self.cull_every == 0:
+            self._cull(db)
+
+    def _cull(self, db):
+        db.execute('DELETE FROM cache WHERE expires <= ?', (time.time(),))
+        count = db.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        if count > self._max_entries:
+            if self._cull_frequency == 0:
+                db.execute('DELETE FROM cache')
+            else:
+                db.execute(
+                    'DELETE FROM cache WHERE key IN ('
+                    'SELECT key FROM cache '
+                    'ORDER BY expires IS NULL, expires LIMIT ?)',
+                    (count // self._cull_frequency,)
+                )
+
+    def get(self, key, default=None, version=None):
+        row = self._db.execute(
+            'SELECT value FROM cache WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (self._key(key, version), time.time())
+        ).fetchone()
+        return default if row is None else self._decode(row[0])
+
+    def get_many(self, keys, version=None):
+        keys = {self._key(key, version): key for key in keys}
+        if not keys:
+            return {}
+        placeholders = ', '.join('?' * len(keys))
+        rows = self._db.execute(
+            f'SELECT key, value FROM cache WHERE key IN ({placeholders}) '
+            'AND (expires IS NULL OR expires > ?)',
+            (*keys, time.time())
+        )
+        return {keys[key]: self._decode(value) for key, value in rows}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._write(
+            'INSERT OR REPLACE INTO cache (key, value, expires) '
+            'VALUES (?, ?, ?)',
+            (self._key(key, version), self._encode(value),
+             self.get_backend_timeout(timeout))
+        )
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self.get_backend_timeout(timeout)
+        db = self._db
+        with db:
+            db.execute('BEGIN')
+            for key, value in data.items():
+                self._write(
+                    'INSERT OR REPLACE INTO cache (key, value, expires) '
+                    'VALUES (?, ?, ?)',
+                    (self._key(key, version), self._encode(value), expires)
+                )
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        db = self._db
+        db.execute(
+            'DELETE FROM cache WHERE key = ? AND expires <= ?',
+            (key, time.time())
+        )
+        cursor = db.execute(
+            'INSERT OR IGNORE INTO cache (key, value, expires) '
+            'VALUES (?, ?, ?)',
+            (key, self._encode(value), self.get_backend_timeout(timeout))
+        )
+        return cursor.rowcount == 1
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        cursor = self._db.execute(
+            'UPDATE cache SET expires = ? WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (self.get_backend_timeout(timeout), self._key(key, version),
+             time.time())
+        )
+        return cursor.rowcount == 1
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        db = self._db
+        with db:
+            db.execute('BEGIN IMMEDIATE')
+            cursor = db.execute(
+                'UPDATE cache SET value = value + ? WHERE key = ? '
+                "AND typeof(value) = 'integer' "
+                'AND (expires IS NULL OR expires > ?)',
+                (delta, key, time.time())
+            )
+            if cursor.rowcount != 1:
+                raise ValueError(f"Key '{key}' not found")
+            return db.execute(
+                'SELECT value FROM cache WHERE key = ?', (key,)
+            ).fetchone()[0]
+
+    def delete(self, key, version=None):
+        cursor = self._db.execute(
+            'DELETE FROM cache WHERE key = ?', (self._key(key, version),)
+        )
+        return cursor.rowcount == 1
+
+    def delete_many(self, keys, version=None):
+        keys = [self._key(key, version) for key in keys]
+        if keys:
+            placeholders = ', '.join('?' * len(keys))
+            self._db.execute(
+                f'DELETE FROM cache WHERE key IN ({placeholders})', keys
+            )
+
+    def has_key(self, key, version=None):
+        return self._db.execute(
+            'SELECT 1 FROM cache WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (self._key(key, version), time.time())
+        ).fetchone() is not None
+
+    def clear(self):
+        self._db.execute('DELETE FROM cache')
+
+    def close(self, **kwargs):
+        # Соединение живет в потоке и переиспользуется между запросами
+        pass
@@ -0,0 +1,244 @@
+import threading
+import time
+from collections import defaultdict
+from functools import wraps
+
+from django.core.cache import caches
+from django.template.base import Template
+
+# Границы корзин гистограмм: секунды и число SQL-запросов
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+
+HISTOGRAMS = {
+    'yatube_request_duration_seconds': (
+        'Полное время обработки запроса.', TIME_BUCKETS
+    ),
+    'yatube_request_db_seconds': (
+        'Время SQL-запросов за запрос.', TIME_BUCKETS
+    ),
+    'yatube_request_template_seconds': (
+        'Время рендеринга шаблонов за запрос.', TIME_BUCKETS
+    ),
+    'yatube_request_queries': (
+        'Число SQL-запросов за запрос.', QUERY_BUCKETS
+    ),
+}
+COUNTERS = {
+    'yatube_requests_total': 'Обработанные запросы по view и статусу.',
+    'yatube_cache_requests_total': 'Чтения кеша: попадания и промахи.',
+    'yatube_page_cache_total': (
+        'Страницы из кеша: hit, stale (устаревшая копия) и miss.'
+    ),
+}
+
+_MISSING = object()
+_local = threading.local()
+
+
+class Registry:
+    """
+    Гистограммы и счетчики в памяти процесса. У каждого процесса
+    воркера свои значения, Prometheus собирает их по отдельности.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self.lock:
+            # (имя, метки) -> [счетчики корзин, сумма, количество]
+            self.histograms = {}
+            self.counters = defaultdict(int)
+
+    def observe(self, name, labels, value):
+        buckets = HISTOGRAMS[name][1]
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.setdefault(
+                key, [[0] * len(buckets), 0, 0]
+            )
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    histogram[0][i] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def inc(self, name, labels, amount=1):
+        with self.lock:
+            self.counters[(name, tuple(sorted(labels.items())))] += amount
+
+    def render(self, extra=()):
+        """Все значения в текстовом формате Prometheus."""
+        with self.lock:
+            histograms = sorted(self.histograms.items())
+            counters = sorted(self.counters.items())
+        lines = list(extra)
+        for name, (help_text, buckets) in HISTOGRAMS.items():
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+            for (key, labels), (counts, total, count) in histograms:
+                if key != name:
+                    continue
+                for bound, value in zip(buckets, counts):
+                    lines.append('{}_bucket{} {}'.format(
+                        name, format_labels(labels + (('le', bound),)), value
+                    ))
+                lines.append('{}_bucket{} {}'.format(
+                    name, format_labels(labels + (('le', '+Inf'),)), count
+                ))
+                lines.append(f'{name}_sum{format_labels(labels)} {total}')
+                lines.append(f'{name}_count{format_labels(labels)} {count}')
+        for name, help_text in COUNTERS.items():
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+            lines += [
+                f'{name}{format_labels(labels)} {value}'
+                for (key, labels), value in counters if key == name
+            ]
+        return '\n'.join(lines) + '\n'
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{%s}' % ','.join(
+        '{}="{}"'.format(key, str(value).replace('\\', r'\\').replace(
+            '"', r'\"'
+        ).replace('\n', r'\n'))
+        for key, value in labels
+    )
+
+
+registry = Registry()
+
+
+class RequestStats:
+    """
+    Измерения одного запроса; активны для текущего потока. SQL-запросы
+    считаются и из потоков core.parallel.gather.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        # Вложенные шаблоны и вызовы кеша не учитываются повторно
+        self.depth = 0
+
+    def __enter__(self):
+        _local.stats = self
+        return self
+
+    def __exit__(self, *exc_info):
+        _local.stats = None
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                self.db_time += elapsed
+                self.queries += 1
+
+    def record(self, view, status, duration):
+        labels = {'view': view}
+        registry.observe('yatube_request_duration_seconds', labels, duration)
+        registry.observe('yatube_request_db_seconds', labels, self.db_time)
+        registry.observe(
+            'yatube_request_template_seconds', labels, self.template_time
+        )
+        registry.observe('yatube_request_queries', labels, self.queries)
+        registry.inc(
+            'yatube_requests_total', {'view': view, 'status': status}
+        )
+        for result, amount in (
+            ('hit', self.cache_hits), ('miss', self.cache_misses)
+        ):
+            if amount:
+                registry.inc(
+                    'yatube_cache_requests_total',
+                    {'view': view, 'result': result}, amount
+                )
+
+
+def current_stats():
+    stats = getattr(_local, 'stats', None)
+    if stats is None or stats.depth:
+        return None
+    return stats
+
+
+def _timed_render(render):
+    @wraps(render)
+    def wrapper(self, context):
+        stats = current_stats()
+        if stats is None:
+            return render(self, context)
+        stats.depth += 1
+        start = time.perf_counter()
+        try:
+            return render(self, context)
+        finally:
+            stats.depth -= 1
+            stats.template_time += time.perf_counter() - start
+    return wrapper
+
+
+def _counted_get(get):
+    @wraps(get)
+    def wrapper(self, key, default=None, version=None):
+        stats = current_stats()
+        if stats is None:
+            return get(self, key, default, version=version)
+        stats.depth += 1
+        try:
+            value = get(self, key, _MISSING, version=version)
+        finally:
+            stats.depth -= 1
+        if value is _MISSING:
+            stats.cache_misses += 1
+            return default
+        stats.cache_hits += 1
+        return value
+    return wrapper
+
+
+def _counted_get_many(get_many):
+    @wraps(get_many)
+    def wrapper(self, keys, version=None):
+        stats = current_stats()
+        if stats is None:
+            return get_many(self, keys, version=version)
+        keys = list(keys)
+        stats.depth += 1
+        try:
+            found = get_many(self, keys, version=version)
+        finally:
+            stats.depth -= 1
+        stats.cache_hits += len(found)
+        stats.cache_misses += len(keys) - len(found)
+        return found
+    return wrapper
+
+
+_instrumented = False
+
+
+def instrument():
+    """
+    Подключает измерение рендеринга шаблонов и чтений кеша. Вызывается
+    один раз, только когда метрики включены.
+    """
+    global _instrumented
+    if _instrumented:
+        return
+    _instrumented = True
+    Template.render = _timed_render(Template.render)
+    for backend in {type(cache) for cache in caches.all()}:
+        backend.get = _counted_get(backend.get)
+        backend.get_many = _counted_get_many(backend.get_many)
@@ -0,0 +1,66 @@
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from . import metrics
+from .queries import QueryInspector
+
+
+class MetricsMiddleware:
+    """
+    Измеряет время ответа, число и время SQL-запросов, время рендеринга
+    шаблонов и попадания в кеш для доли METRICS_SAMPLE_RATE запросов.
+    При METRICS_ENABLED=False Django исключает middleware из цепочки.
+    """
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = settings.METRICS_SAMPLE_RATE
+        metrics.instrument()
+
+    def __call__(self, request):
+        if random.random() >= self.sample_rate:
+            return self.get_response(request)
+        with metrics.RequestStats() as stats, ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(
+                    connection.execute_wrapper(stats.execute_wrapper)
+                )
+            start = time.perf_counter()
+            response = self.get_response(request)
+            duration = time.perf_counter() - start
+        match = getattr(request, 'resolver_match', None)
+        stats.record(
+            match.view_name if match else 'unresolved',
+            response.status_code, duration
+        )
+        return response
+
+
+class QueryInspectorMiddleware:
+    """
+    Ищет N+1 и медленные запросы и пишет их в лог core.queries с
+    именем view. При QUERY_INSPECTOR='raise' повтор запроса вызывает
+    RepeatedQueries, и тест со страницей падает.
+    """
+
+    def __init__(self, get_response):
+        if settings.QUERY_INSPECTOR not in ('log', 'raise'):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.fail = settings.QUERY_INSPECTOR == 'raise'
+
+    def __call__(self, request):
+        with QueryInspector() as inspector:
+            response = self.get_response(request)
+        match = getattr(request, 'resolver_match', None)
+        inspector.report(
+            match.view_name if match else request.path, fail=self.fail
+        )
+        return response
@@ -0,0 +1,135 @@
+import hashlib
+import random
+import re
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+
+from .metrics import registry
+
+# Пауза между проверками кеша, пока страницу строит другой запрос
+POLL_INTERVAL = 0.05
+# Метка места персонального фрагмента в общей странице
+HOLE_MARK = '<!--personal:{}-->'
+HOLE_RE = re.compile(r'<!--personal:(\d+)-->')
+
+
+def page_key(key_prefix, request, per_user=False):
+    """Ключ страницы: адрес с параметрами и, если per_user, пользователь."""
+    return 'page.{}.{}'.format(key_prefix, hashlib.md5('{}|{}'.format(
+        request.build_absolute_uri(), request.user.pk if per_user else ''
+    ).encode()).hexdigest())
+
+
+def fill_holes(request, response, holes):
+    """
+    Подставляет на места меток фрагменты holes - пары (шаблон,
+    переменные), отрисованные для текущего запроса.
+    """
+    if not holes:
+        return response
+    content = response.content.decode(response.charset)
+    response.content = HOLE_RE.sub(
+        lambda match: render_to_string(
+            *holes[int(match.group(1))], request=request
+        ),
+        content
+    )
+    return response
+
+
+def fresh_until(timeout):
+    """
+    Срок свежести, случайно сокращенный на долю до PAGE_CACHE_JITTER,
+    чтобы одновременно закешированные страницы устаревали вразброс.
+    """
+    jitter = settings.PAGE_CACHE_JITTER
+    return time.time() + timeout * (1 - jitter * random.random())
+
+
+def wait_for_page(key, state):
+    """Ждет страницу, которую строит другой запрос, до PAGE_CACHE_WAIT."""
+    deadline = time.monotonic() + settings.PAGE_CACHE_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None and entry[0] == state:
+            return entry
+    return None
+
+
+def cache_page_swr(timeout, state_func=None, key_prefix=None,
+                   per_user=False):
+    """
+    Кеш страниц GET с перестроением одним запросом (single-flight) и
+    отдачей устаревшей копии (stale-while-revalidate).
+
+    Страница одна для всех пользователей, если не указан per_user.
+    Зависящие от пользователя части выводятся тегом {% personal %}:
+    в кеш попадает метка, а фрагмент отрисовывается в каждом запросе.
+
+    Страница свежая timeout секунд с разбросом PAGE_CACHE_JITTER, пока
+    state_func(request, *args, **kwargs) возвращает то же значение,
+    что при ее построении. Устаревшую страницу перестраивает запрос,
+    взявший блокировку в кеше, а остальные еще PAGE_CACHE_STALE секунд
+    получают старую копию с атрибутом stale_copy: ей нельзя ставить
+    ETag и Last-Modified текущих данных. Если копии нет, запросы ждут
+    построения до PAGE_CACHE_WAIT секунд. Попадания, промахи и
+    устаревшие ответы считаются в yatube_page_cache_total.
+    """
+    def decorator(view_func):
+        prefix = key_prefix or view_func.__name__
+
+        def count(result):
+            registry.inc(
+                'yatube_page_cache_total', {'page': prefix, 'result': result}
+            )
+
+        @wraps(view_func)
+        def _wrapped_view(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view_func(request, *args, **kwargs)
+            state = state_func and state_func(request, *args, **kwargs)
+            key = page_key(prefix, request, per_user)
+            lock_key = f'{key}:lock'
+            entry = cache.get(key)
+            if entry is not None and entry[0] == state and (
+                time.time() < entry[1]
+            ):
+                count('hit')
+                return fill_holes(request, *entry[2:])
+            locked = cache.add(
+                lock_key, True, timeout=settings.PAGE_CACHE_LOCK_TIMEOUT
+            )
+            if not locked:
+                if entry is not None:
+                    count('stale')
+                    response = fill_holes(request, *entry[2:])
+                    response.stale_copy = True
+                    return response
+                entry = wait_for_page(key, state)
+                if entry is not None:
+                    count('hit')
+                    return fill_holes(request, *entry[2:])
+            count('miss')
+            request.page_holes = []
+            try:
+                response = view_func(request, *args, **kwargs)
+                holes = request.page_holes
+                if (response.status_code == 200
+                        and not response.streaming
+                        and not response.cookies):
+                    cache.set(
+                        key, (state, fresh_until(timeout), response, holes),
+                        timeout=timeout + settings.PAGE_CACHE_STALE
+                    )
+            finally:
+                request.page_holes = None
+                if locked:
+                    cache.delete(lock_key)
+            return fill_holes(request, response, holes)
+        return _wrapped_view
+    return decorator
@@ -0,0 +1,68 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import close_old_connections, connections, transaction
+
+_executor = None
+_local = threading.local()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.VIEW_LOADER_THREADS,
+            thread_name_prefix='view-loader',
+        )
+    return _executor
+
+
+def _call_in_worker(call, wrappers):
+    _local.worker = True
+    # Соединение потока живет между вызовами, как соединение потока
+    # запроса: закрывается по CONN_MAX_AGE или после ошибки.
+    close_old_connections()
+    with ExitStack() as stack:
+        for alias, alias_wrappers in wrappers.items():
+            for wrapper in alias_wrappers:
+                stack.enter_context(
+                    connections[alias].execute_wrapper(wrapper)
+                )
+        return call()
+
+
+def gather(*calls):
+    """
+    Выполняет независимые вызовы без аргументов одновременно и
+    возвращает их результаты по порядку. Первый вызов идет в текущем
+    потоке, остальные - в общем пуле из VIEW_LOADER_THREADS потоков,
+    у каждого свое соединение с базой, которое переиспользуется по
+    CONN_MAX_AGE. Обертки execute_wrapper текущего потока (метрики,
+    QueryInspector) ставятся и на соединения пула, поэтому запросы
+    из потоков учитываются вместе с запросами страницы. Ошибка
+    вызова поднимается.
+
+    Вызовы идут по очереди при VIEW_LOADER_THREADS = 0, внутри потока
+    пула и внутри транзакции: другие соединения не видят ее
+    незафиксированных изменений.
+    """
+    if (len(calls) < 2 or not settings.VIEW_LOADER_THREADS
+            or getattr(_local, 'worker', False)
+            or transaction.get_connection().in_atomic_block):
+        return [call() for call in calls]
+    wrappers = {
+        alias: list(connections[alias].execute_wrappers)
+        for alias in connections
+    }
+    executor = get_executor()
+    futures = [
+        executor.submit(_call_in_worker, call, wrappers)
+        for call in calls[1:]
+    ]
+    try:
+        first = calls[0]()
+    finally:
+        wait(futures)
+    return [first, *(future.result() for future in futures)]
@@ -0,0 +1,141 @@
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.template.base import Node
+
+logger = logging.getLogger('core.queries')
+
+# Модули измерений не считаются местом, откуда выполнен запрос
+INSTRUMENTATION = {
+    os.path.join(os.path.dirname(__file__), name)
+    for name in ('queries.py', 'metrics.py', 'middleware.py')
+}
+
+STRING_RE = re.compile(r"'(?:[^']|'')*'")
+NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+IN_LIST_RE = re.compile(r'\(\s*(?:%s|\?)(?:\s*,\s*(?:%s|\?))*\s*\)')
+SPACE_RE = re.compile(r'\s+')
+
+
+def normalize(sql):
+    """
+    Форма запроса без значений: строки, числа и списки IN заменяются
+    на ?, чтобы запросы, отличающиеся только параметрами, совпадали.
+    """
+    sql = STRING_RE.sub('?', sql)
+    sql = NUMBER_RE.sub('?', sql)
+    sql = sql.replace('%s', '?')
+    sql = IN_LIST_RE.sub('(?)', sql)
+    return SPACE_RE.sub(' ', sql).strip()
+
+
+def query_origin():
+    """
+    Строка кода проекта и шаблона, из которых выполнен запрос. Стек
+    разбирается только для отмеченных запросов.
+    """
+    code = template = None
+    frame = sys._getframe(1)
+    while frame and not (code and template):
+        node = frame.f_locals.get('self')
+        if template is None and isinstance(node, Node):
+            token = getattr(node, 'token', None)
+            origin = getattr(node, 'origin', None)
+            if token is not None and origin is not None:
+                template = f'{origin.template_name}:{token.lineno}'
+        filename = frame.f_code.co_filename
+        if (code is None and filename.startswith(settings.BASE_DIR)
+                and filename not in INSTRUMENTATION
+                and f'{os.sep}site-packages{os.sep}' not in filename):
+            code = '{}:{}'.format(
+                os.path.relpath(filename, settings.BASE_DIR), frame.f_lineno
+            )
+        frame = frame.f_back
+    return {'code': code, 'template': template}
+
+
+class RepeatedQueries(AssertionError):
+    """Запрос одной формы повторился больше допустимого (N+1)."""
+
+
+class QueryInspector:
+    """
+    Считает запросы каждой формы за время работы контекста и
+    запоминает медленные. Место в коде определяется для запроса,
+    на котором форма достигла порога повторов, и для медленных.
+    Запросы из потоков core.parallel.gather тоже учитываются.
+    """
+
+    def __init__(self, threshold=None, slow_ms=None):
+        self.threshold = threshold or settings.QUERY_REPEAT_THRESHOLD
+        self.slow_ms = slow_ms or settings.SLOW_QUERY_MS
+        self.counts = Counter()
+        self.origins = {}
+        self.slow = []
+        self.stack = None
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        self.stack = ExitStack()
+        for connection in connections.all():
+            self.stack.enter_context(connection.execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stack.close()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            shape = normalize(sql)
+            with self.lock:
+                self.counts[shape] += 1
+                repeated = self.counts[shape] == self.threshold
+            if repeated:
+                self.origins[shape] = query_origin()
+            if elapsed >= self.slow_ms:
+                self.slow.append({
+                    'sql': sql, 'ms': round(elapsed, 1), **query_origin()
+                })
+
+    def repeated(self):
+        """Формы, повторенные threshold раз и больше: форма -> данные."""
+        return {
+            shape: {'count': count, **self.origins[shape]}
+            for shape, count in self.counts.items()
+            if count >= self.threshold
+        }
+
+    def report(self, view, fail=False):
+        """Пишет найденное в лог; при fail повтор вызывает ошибку."""
+        for query in self.slow:
+            logger.warning(
+                'Медленный запрос %s мс во view %s (%s, шаблон %s): %s',
+                query['ms'], view, query['code'], query['template'],
+                query['sql']
+            )
+        repeated = self.repeated()
+        for shape, data in repeated.items():
+            logger.warning(
+                'Повтор запроса %s раз во view %s (%s, шаблон %s): %s',
+                data['count'], view, data['code'], data['template'], shape
+            )
+        if fail and repeated:
+            raise RepeatedQueries(
+                f'N+1 во view {view}: ' + '; '.join(
+                    f'{data["count"]} x {shape} ({data["code"]}, '
+                    f'шаблон {data["template"]})'
+                    for shape, data in repeated.items()
+                )
+            )
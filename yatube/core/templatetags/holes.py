@@ -0,0 +1,25 @@
+from django import template
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from ..page_cache import HOLE_MARK
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def personal(context, template_name, **kwargs):
+    """
+    Фрагмент страницы, зависящий от пользователя. В странице из
+    cache_page_swr выводится метка, а фрагмент отрисовывается для
+    каждого запроса, иначе он выводится сразу. В обоих случаях
+    фрагменту доступны только переданные переменные и переменные
+    контекст-процессоров запроса. Переменные хранятся в кеше, поэтому
+    передаются простые значения, а не объекты.
+    """
+    request = context.get('request')
+    holes = getattr(request, 'page_holes', None)
+    if holes is None:
+        return render_to_string(template_name, kwargs, request=request)
+    holes.append((template_name, kwargs))
+    return mark_safe(HOLE_MARK.format(len(holes) - 1))
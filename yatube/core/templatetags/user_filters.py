@@ -1,4 +1,7 @@
+import html
+
 from django import template
+from django.utils.html import strip_tags
 
 register = template.Library()
 
@@ -7,3 +10,9 @@ register = template.Library()
 def addclass(field, css):
     """Добавляет атрибут 'class' в шаблоны."""
     return field.as_widget(attrs={'class': css})
+
+
+@register.filter
+def plaintext(value):
+    """Текст из HTML без тегов и сущностей, например для <title>."""
+    return html.unescape(strip_tags(value))
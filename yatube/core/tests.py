@@ -0,0 +1,453 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection, transaction
+from django.http import HttpResponse
+from django.test import (
+    RequestFactory, SimpleTestCase, TestCase, TransactionTestCase,
+    override_settings
+)
+from django.urls import reverse
+
+from posts.cache import bump_feed_versions, get_feed_versions
+
+from . import metrics
+from .metrics import registry
+from .middleware import MetricsMiddleware, QueryInspectorMiddleware
+from .page_cache import cache_page_swr, fresh_until, page_key
+from .parallel import gather
+from .queries import QueryInspector, RepeatedQueries, normalize
+
+User = get_user_model()
+
+WORKER = '''
+import sys, time
+from django.core.cache import cache
+{code}
+'''
+
+WAIT_FOR_BUMP = '''
+from posts.cache import get_feed_versions
+version = get_feed_versions('index')['index']
+cache.incr('workers_ready')
+deadline = time.monotonic() + 20
+while get_feed_versions('index')['index'] == version:
+    if time.monotonic() > deadline:
+        sys.exit('version did not change')
+    time.sleep(0.05)
+print(get_feed_versions('index')['index'])
+'''
+
+INCREMENT = '''
+for _ in range(200):
+    cache.incr('counter')
+'''
+
+
+class SharedCacheTests(SimpleTestCase):
+    """Общий кеш SQLite виден всем процессам-воркерам."""
+
+    WORKERS = 3
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.location = os.path.join(self.directory, 'cache.sqlite3')
+        self.settings_override = override_settings(CACHES={
+            'default': {
+                'BACKEND': 'core.cache_backends.sqlite.SQLiteCache',
+                'LOCATION': self.location,
+            }
+        })
+        self.settings_override.enable()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def start_workers(self, code):
+        env = {
+            **os.environ,
+            'CACHE_BACKEND': 'sqlite',
+            'CACHE_LOCATION': self.location,
+        }
+        return [
+            subprocess.Popen(
+                [sys.executable, 'manage.py', 'shell', '-c',
+                 WORKER.format(code=code)],
+                cwd=settings.BASE_DIR, env=env, text=True,
+                stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            ) for _ in range(self.WORKERS)
+        ]
+
+    def finish_workers(self, workers):
+        results = []
+        for worker in workers:
+            out, err = worker.communicate(timeout=60)
+            self.assertEqual(worker.returncode, 0, err)
+            results.append(out.strip())
+        return results
+
+    def test_core_sqlite_cache_operations(self):
+        """
+        [!] Базовые операции кеша SQLite.
+        """
+        cache.set('key', {'value': 1})
+        self.assertEqual(cache.get('key'), {'value': 1})
+        self.assertFalse(cache.add('key', 'other'))
+        self.assertTrue(cache.add('new', 'value'))
+        cache.set('number', 1)
+        self.assertEqual(cache.incr('number', 5), 6)
+        with self.assertRaises(ValueError):
+            cache.incr('missing')
+        self.assertEqual(
+            cache.get_many(['key', 'number', 'missing']),
+            {'key': {'value': 1}, 'number': 6}
+        )
+        cache.set('short', 'value', timeout=0.05)
+        time.sleep(0.1)
+        self.assertIsNone(cache.get('short'))
+        self.assertTrue(cache.add('short', 'again'))
+        cache.delete('key')
+        self.assertFalse(cache.has_key('key'))
+        cache.clear()
+        self.assertIsNone(cache.get('number'))
+
+    def test_core_sqlite_cache_incr_is_atomic_across_processes(self):
+        """
+        [!] Одновременные incr из нескольких процессов не теряются.
+        """
+        cache.set('counter', 0)
+        self.finish_workers(self.start_workers(INCREMENT))
+        self.assertEqual(cache.get('counter'), 200 * self.WORKERS)
+
+    def test_core_feed_invalidation_reaches_all_workers(self):
+        """
+        [!] Сброс версии ленты в одном процессе виден всем воркерам.
+        """
+        cache.set('workers_ready', 0)
+        version = get_feed_versions('index')['index']
+        workers = self.start_workers(WAIT_FOR_BUMP)
+        deadline = time.monotonic() + 30
+        while cache.get('workers_ready') < self.WORKERS:
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.05)
+        bump_feed_versions('index')
+        results = self.finish_workers(workers)
+        self.assertEqual(results, [str(version + 1)] * self.WORKERS)
+
+
+@override_settings(
+    METRICS_ENABLED=True, METRICS_SAMPLE_RATE=1.0, METRICS_TOKEN='secret'
+)
+class MetricsTests(TestCase):
+    """Метрики запросов и адрес /metrics."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username='Staff', is_staff=True)
+        cls.user = User.objects.create_user(username='User')
+
+    def setUp(self):
+        cache.clear()
+        registry.clear()
+
+    def get_metrics(self, **headers):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('metrics'), **headers)
+        self.client.logout()
+        return response
+
+    def test_core_metrics_disabled(self):
+        """
+        [!] Выключенные метрики не подключают middleware и адрес.
+        """
+        with override_settings(METRICS_ENABLED=False):
+            with self.assertRaises(MiddlewareNotUsed):
+                MetricsMiddleware(lambda request: None)
+            response = self.get_metrics()
+        self.assertEqual(response.status_code, 404)
+
+    def test_core_metrics_recorded(self):
+        """
+        [!] Время, SQL-запросы и попадания в кеш учитываются по view.
+        """
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:index'))
+        text = self.get_metrics().content.decode()
+        view = 'view="posts:index"'
+        self.assertIn(
+            f'yatube_request_duration_seconds_count{{{view}}} 2', text
+        )
+        self.assertIn(f'yatube_request_queries_count{{{view}}} 2', text)
+        self.assertIn(
+            f'yatube_request_queries_bucket{{{view},le="+Inf"}} 2', text
+        )
+        self.assertIn(f'yatube_request_template_seconds_sum{{{view}}}', text)
+        self.assertIn(
+            f'yatube_requests_total{{status="200",{view}}} 2', text
+        )
+        self.assertIn(
+            f'yatube_cache_requests_total{{result="hit",{view}}}', text
+        )
+        self.assertIn(
+            f'yatube_cache_requests_total{{result="miss",{view}}}', text
+        )
+        self.assertIn('# TYPE yatube_request_db_seconds histogram', text)
+
+    def test_core_metrics_sampling(self):
+        """
+        [!] Запросы вне выборки не измеряются.
+        """
+        with override_settings(METRICS_SAMPLE_RATE=0.0):
+            self.client.get(reverse('posts:index'))
+        self.assertNotIn('posts:index', self.get_metrics().content.decode())
+
+    def test_core_metrics_access(self):
+        """
+        [!] Метрики доступны персоналу и сборщику с токеном.
+        """
+        response = self.get_metrics()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        self.assertEqual(
+            self.client.get(reverse('metrics')).status_code, 403
+        )
+        self.client.force_login(self.user)
+        self.assertEqual(
+            self.client.get(reverse('metrics')).status_code, 403
+        )
+        self.client.logout()
+        response = self.client.get(
+            reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret'
+        )
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(
+            reverse('metrics'), HTTP_AUTHORIZATION='Bearer wrong'
+        )
+        self.assertEqual(response.status_code, 403)
+
+
+class QueryInspectorTests(TestCase):
+    """Поиск N+1 и медленных запросов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            User.objects.create_user(username=f'user{i}') for i in range(5)
+        ]
+
+    def test_core_queries_normalize(self):
+        """
+        [!] Запросы с разными параметрами имеют одну форму.
+        """
+        self.assertEqual(
+            normalize("SELECT * FROM t WHERE id = 15 AND name = 'it''s'"),
+            'SELECT * FROM t WHERE id = ? AND name = ?'
+        )
+        self.assertEqual(
+            normalize('SELECT *\n FROM t WHERE id IN (%s, %s, %s)'),
+            normalize('SELECT * FROM t WHERE id IN (%s)'),
+        )
+
+    def test_core_queries_repeated(self):
+        """
+        [!] Повтор запроса одной формы отмечается с местом в коде.
+        """
+        with QueryInspector(threshold=3) as inspector:
+            for user in self.users:
+                User.objects.filter(pk=user.pk).first()
+            User.objects.count()
+        repeated = inspector.repeated()
+        self.assertEqual(len(repeated), 1)
+        data = next(iter(repeated.values()))
+        self.assertEqual(data['count'], 5)
+        self.assertTrue(data['code'].startswith('core/tests.py:'))
+        with self.assertLogs('core.queries', 'WARNING') as logs:
+            with self.assertRaises(RepeatedQueries):
+                inspector.report('view', fail=True)
+        self.assertIn('Повтор запроса 5 раз во view view', logs.output[0])
+
+    def test_core_queries_slow(self):
+        """
+        [!] Медленные запросы пишутся в лог.
+        """
+        with QueryInspector(slow_ms=0.0001) as inspector:
+            User.objects.count()
+        with self.assertLogs('core.queries', 'WARNING') as logs:
+            inspector.report('view')
+        self.assertIn('Медленный запрос', logs.output[0])
+
+    def test_core_queries_middleware(self):
+        """
+        [!] В режиме raise страница с N+1 вызывает ошибку.
+        """
+        with override_settings(QUERY_INSPECTOR='off'):
+            with self.assertRaises(MiddlewareNotUsed):
+                QueryInspectorMiddleware(lambda request: None)
+        with override_settings(QUERY_INSPECTOR='raise'):
+            middleware = QueryInspectorMiddleware(
+                lambda request: [user.username for user in (
+                    User.objects.get(pk=user.pk) for user in self.users
+                )]
+            )
+            request = self.client.get('/').wsgi_request
+            with self.assertLogs('core.queries', 'WARNING'):
+                with self.assertRaises(RepeatedQueries):
+                    middleware(request)
+
+
+class ParallelTests(TransactionTestCase):
+    def test_core_parallel_gather(self):
+        """
+        [!] Вызовы выполняются одновременно, результаты идут по порядку.
+        """
+        barrier = threading.Barrier(3, timeout=5)
+
+        def load(value):
+            barrier.wait()
+            return value
+
+        self.assertEqual(
+            gather(lambda: load(1), lambda: load(2), lambda: load(3)),
+            [1, 2, 3]
+        )
+        User.objects.create_user(username='Author')
+        self.assertEqual(
+            gather(User.objects.count, User.objects.get(
+                username='Author'
+            ).posts.count), [1, 0]
+        )
+
+    def test_core_parallel_sequential(self):
+        """
+        [!] Внутри транзакции и без потоков вызовы идут по очереди.
+        """
+        def thread():
+            return threading.current_thread()
+
+        with transaction.atomic():
+            self.assertEqual(
+                gather(thread, thread), [threading.current_thread()] * 2
+            )
+        with override_settings(VIEW_LOADER_THREADS=0):
+            self.assertEqual(
+                gather(thread, thread), [threading.current_thread()] * 2
+            )
+
+    def test_core_parallel_wrappers_in_workers(self):
+        """
+        [!] Запросы из потоков пула видны QueryInspector и метрикам.
+        """
+        User.objects.create_user(username='Author')
+        threads = set()
+
+        def count():
+            threads.add(threading.current_thread())
+            return User.objects.count()
+
+        with metrics.RequestStats() as stats, QueryInspector(
+            threshold=3
+        ) as inspector, connection.execute_wrapper(stats.execute_wrapper):
+            self.assertEqual(gather(count, count, count), [1, 1, 1])
+        self.assertGreater(len(threads), 1)
+        self.assertEqual(stats.queries, 3)
+        self.assertEqual(
+            [data['count'] for data in inspector.repeated().values()], [3]
+        )
+
+    def test_core_parallel_error(self):
+        """
+        [!] Ошибка вызова в потоке пула поднимается.
+        """
+        def fail():
+            raise ValueError('ошибка')
+
+        with self.assertRaisesMessage(ValueError, 'ошибка'):
+            gather(lambda: 1, fail)
+
+
+@override_settings(PAGE_CACHE_WAIT=5, PAGE_CACHE_JITTER=0.1)
+class PageCacheTests(SimpleTestCase):
+    """Кеш страниц с перестроением одним запросом."""
+
+    def setUp(self):
+        cache.clear()
+        registry.clear()
+        self.calls = 0
+        self.state = 1
+
+        def page(request):
+            self.calls += 1
+            time.sleep(0.2)
+            return HttpResponse(f'{self.state}:{self.calls}')
+
+        self.view = cache_page_swr(
+            20, state_func=lambda request: self.state
+        )(page)
+        self.request = RequestFactory().get('/page/')
+        self.request.user = AnonymousUser()
+
+    def get(self):
+        return self.view(self.request).content.decode()
+
+    def counted(self, result):
+        return registry.counters[(
+            'yatube_page_cache_total', (('page', 'page'), ('result', result))
+        )]
+
+    def test_core_page_cache_stale_while_revalidate(self):
+        """
+        [!] Пока страницу перестраивает другой запрос, отдается старая.
+        """
+        self.assertEqual(self.get(), '1:1')
+        self.assertEqual(self.get(), '1:1')
+        self.state = 2
+        lock_key = page_key('page', self.request) + ':lock'
+        cache.add(lock_key, True)
+        self.assertEqual(self.get(), '1:1')
+        cache.delete(lock_key)
+        self.assertEqual(self.get(), '2:2')
+        self.assertEqual(self.get(), '2:2')
+        self.assertEqual(
+            [self.counted(result) for result in ('hit', 'stale', 'miss')],
+            [2, 1, 2]
+        )
+        self.assertIn(
+            'yatube_page_cache_total{page="page",result="stale"} 1',
+            registry.render()
+        )
+
+    def test_core_page_cache_single_flight(self):
+        """
+        [!] Одновременные запросы без копии строят страницу один раз.
+        """
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(self.get()))
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ['1:1'] * 4)
+        self.assertEqual(self.calls, 1)
+
+    def test_core_page_cache_jitter(self):
+        """
+        [!] Срок свежести случайно сокращается не больше чем на долю.
+        """
+        now = time.time()
+        until = [fresh_until(100) - now for _ in range(50)]
+        self.assertTrue(all(89 <= value <= 100.5 for value in until))
+        self.assertGreater(len({round(value) for value in until}), 1)
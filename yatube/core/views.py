@@ -1,4 +1,10 @@
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.http import Http404, HttpResponse
 from django.shortcuts import render
+from django.utils.crypto import constant_time_compare
+
+from .metrics import registry
 
 
 def page_not_found(request, exception):
@@ -31,3 +37,26 @@ def server_error(request):
         'core/500.html',
         status=500
     )
+
+
+def metrics(request):
+    """
+    Метрики процесса в формате Prometheus. Доступны персоналу или по
+    заголовку Authorization: Bearer METRICS_TOKEN для сборщика.
+    """
+    if not settings.METRICS_ENABLED:
+        raise Http404
+    token = settings.METRICS_TOKEN
+    authorization = request.META.get('HTTP_AUTHORIZATION', '')
+    if not request.user.is_staff and not (
+        token and constant_time_compare(authorization, f'Bearer {token}')
+    ):
+        raise PermissionDenied
+    return HttpResponse(
+        registry.render(extra=(
+            '# HELP yatube_metrics_sample_rate Доля измеряемых запросов.',
+            '# TYPE yatube_metrics_sample_rate gauge',
+            f'yatube_metrics_sample_rate {settings.METRICS_SAMPLE_RATE}',
+        )),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
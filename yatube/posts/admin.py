@@ -1,16 +1,110 @@
+from django.conf import settings
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connection
+from django.db.models import Max, Q
+from django.utils.functional import cached_property
 
 from .models import Follow, Post, Group, Comment
+from .search import search_comment_ids, search_post_ids
+
+
+def estimate_count(model):
+    """
+    Примерное число строк таблицы без COUNT(*): статистика планировщика
+    в PostgreSQL, наибольший первичный ключ в остальных базах.
+    """
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples FROM pg_class WHERE relname = %s',
+                [model._meta.db_table]
+            )
+            row = cursor.fetchone()
+        if row and row[0] > 0:
+            return int(row[0])
+    return model.objects.aggregate(last=Max('pk'))['last'] or 0
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Для списка без фильтров и поиска число строк оценивается, если
+    таблица больше ADMIN_EXACT_COUNT_LIMIT строк, вместо COUNT(*).
+    """
+
+    @cached_property
+    def count(self):
+        if not self.object_list.query.where:
+            estimate = estimate_count(self.object_list.model)
+            if estimate > settings.ADMIN_EXACT_COUNT_LIMIT:
+                return estimate
+        return super().count
+
+
+class InputFilter(admin.SimpleListFilter):
+    """Фильтр с полем ввода вместо списка всех значений."""
+    template = 'admin/input_filter.html'
+
+    def lookups(self, request, model_admin):
+        # Непустой список нужен, чтобы фильтр выводился
+        return ((None, None),)
+
+    def choices(self, changelist):
+        all_choice = next(super().choices(changelist))
+        all_choice['query_parts'] = [
+            (key, value) for key, value in changelist.params.items()
+            if key not in (self.parameter_name, 'p')
+        ]
+        yield all_choice
+
+
+class AuthorFilter(InputFilter):
+    """Фильтр по точному имени автора, идет по индексу username."""
+    title = 'автору'
+    parameter_name = 'author'
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(author__username=self.value().strip())
+        return queryset
+
+
+class ScalableAdmin(admin.ModelAdmin):
+    """Список без полного COUNT(*) таблицы на каждой странице."""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(Post)
-class PostAdmin(admin.ModelAdmin):
-    list_display = ('pk', 'text', 'pub_date', 'author', 'group',)
+class PostAdmin(ScalableAdmin):
+    list_display = (
+        'pk', 'text', 'pub_date', 'author', 'group', 'comments_count',
+    )
     list_editable = ('group',)
+    list_select_related = ('author', 'group')
     search_fields = ('text',)
-    list_filter = ('pub_date',)
+    list_filter = ('pub_date', AuthorFilter)
+    autocomplete_fields = ('author',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        """Поиск по полнотекстовому индексу вместо LIKE по всей таблице."""
+        if not search_term:
+            return queryset, False
+        ids = search_post_ids(search_term, settings.SEARCH_MAX_RESULTS)
+        return queryset.filter(pk__in=ids), False
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        """Список групп для list_editable читается один раз на страницу."""
+        formfield = super().formfield_for_foreignkey(
+            db_field, request, **kwargs
+        )
+        if db_field.name == 'group' and request is not None:
+            if not hasattr(request, '_group_choices'):
+                request._group_choices = list(formfield.choices)
+            formfield.choices = request._group_choices
+        return formfield
+
 
 @admin.register(Group)
 class GroupAdmin(admin.ModelAdmin):
@@ -21,13 +115,32 @@ class GroupAdmin(admin.ModelAdmin):
 
 
 @admin.register(Comment)
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(ScalableAdmin):
     list_display = ('text', 'created', 'post', 'author')
-    search_fields = ('text', 'post', 'author', 'created')
-    list_filter = ('author', 'created')
+    list_select_related = ('post', 'author')
+    search_fields = ('=author__username',)
+    list_filter = ('created', AuthorFilter)
+    autocomplete_fields = ('post', 'author')
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Точное имя автора ищется по индексу username, слова - по
+        полнотекстовому индексу в тексте комментария и его поста.
+        """
+        if not search_term:
+            return queryset, False
+        limit = settings.SEARCH_MAX_RESULTS
+        return queryset.filter(
+            Q(author__username=search_term.strip())
+            | Q(pk__in=search_comment_ids(search_term, limit))
+            | Q(post_id__in=search_post_ids(search_term, limit))
+        ), False
+
 
 @admin.register(Follow)
-class FollowAdmin(admin.ModelAdmin):
+class FollowAdmin(ScalableAdmin):
     list_display = ('user', 'author')
+    list_select_related = ('user', 'author')
+    list_filter = (AuthorFilter,)
+    autocomplete_fields = ('user', 'author')
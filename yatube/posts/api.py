@@ -0,0 +1,154 @@
+from functools import wraps
+
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_GET
+
+from .cache import feed_condition, post_condition
+from .feeds import follow_feed, group_feed, index_feed, profile_feed
+from .models import Group, Post, User
+from .utils import comments_on_page, posts_on_page
+
+POST_FIELDS = (
+    'id', 'text', 'pub_date', 'author', 'group', 'image', 'thumbnails',
+    'comments_count',
+)
+
+
+def serialize_post(post, fields):
+    values = {
+        'id': lambda: post.pk,
+        'text': lambda: post.text,
+        'pub_date': lambda: post.pub_date.isoformat(),
+        'author': lambda: post.author.username,
+        'group': lambda: post.group.slug if post.group_id else None,
+        'image': lambda: post.image.url if post.image else None,
+        'thumbnails': lambda: post.thumbnails,
+        'comments_count': lambda: post.comments_count,
+    }
+    return {field: values[field]() for field in fields}
+
+
+def serialize_comment(comment):
+    return {
+        'id': comment.pk,
+        'text': comment.text,
+        'author': comment.author.username,
+        'created': comment.created.isoformat(),
+    }
+
+
+def error_response(detail, status):
+    return JsonResponse(
+        {'detail': detail}, status=status,
+        json_dumps_params={'ensure_ascii': False}
+    )
+
+
+def api_login_required(view_func):
+    """Как login_required, но вместо редиректа на вход отвечает 401."""
+    @wraps(view_func)
+    def _wrapped_view(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return error_response('Требуется авторизация.', 401)
+        return view_func(request, *args, **kwargs)
+    return _wrapped_view
+
+
+def get_fields(request):
+    """Поля поста из ?fields=id,text; без параметра - все поля."""
+    fields = request.GET.get('fields')
+    if not fields:
+        return POST_FIELDS, None
+    fields = tuple(field.strip() for field in fields.split(','))
+    unknown = [field for field in fields if field not in POST_FIELDS]
+    if unknown:
+        return None, error_response(
+            'Неизвестные поля: {}.'.format(', '.join(unknown)), 400
+        )
+    return fields, None
+
+
+def page_url(request, cursor):
+    """Адрес соседней страницы с теми же параметрами запроса."""
+    if cursor is None:
+        return None
+    query = request.GET.copy()
+    query['cursor'] = cursor
+    return request.build_absolute_uri(f'{request.path}?{query.urlencode()}')
+
+
+def feed_response(request, post_list, **kwargs):
+    """Страница ленты в JSON: посты и ссылки на соседние страницы."""
+    fields, error = get_fields(request)
+    if error:
+        return error
+    page = posts_on_page(request, post_list, **kwargs)
+    return JsonResponse(
+        {
+            'results': [serialize_post(post, fields) for post in page],
+            'next': page_url(request, page.next_cursor),
+            'previous': page_url(request, page.previous_cursor),
+        },
+        json_dumps_params={'ensure_ascii': False}
+    )
+
+
+@require_GET
+@feed_condition('index')
+def index(request):
+    """Лента главной страницы."""
+    return feed_response(request, index_feed())
+
+
+@require_GET
+@feed_condition('group:{slug}')
+def group_posts(request, slug):
+    """Лента группы."""
+    group = get_object_or_404(Group, slug=slug)
+    return feed_response(request, group_feed(group))
+
+
+@require_GET
+@feed_condition('profile:{username}')
+def profile(request, username):
+    """Лента автора."""
+    author = get_object_or_404(User, username=username)
+    return feed_response(request, profile_feed(author))
+
+
+@require_GET
+@api_login_required
+@feed_condition('index', 'follow:{request.user.pk}')
+def follow_index(request):
+    """Лента подписок."""
+    return feed_response(
+        request, follow_feed(request.user),
+        date_field='feed_date', id_field='feed_post'
+    )
+
+
+@require_GET
+@post_condition()
+def post_detail(request, post_id):
+    """Пост и страница его комментариев."""
+    fields, error = get_fields(request)
+    if error:
+        return error
+    post = get_object_or_404(
+        Post.objects.select_related('author', 'group'), pk=post_id
+    )
+    comments = comments_on_page(request, post)
+    return JsonResponse(
+        {
+            **serialize_post(post, fields),
+            'comments': {
+                'results': [
+                    serialize_comment(comment) for comment in comments
+                ],
+                'next': page_url(request, comments.next_cursor),
+                'previous': page_url(request, comments.previous_cursor),
+            },
+        },
+        json_dumps_params={'ensure_ascii': False}
+    )
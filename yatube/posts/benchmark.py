@@ -0,0 +1,358 @@
+import io
+import math
+import random
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from faker import Faker
+from mixer.backend.django import Mixer
+from PIL import Image
+
+from .models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+BENCHMARK_IMAGE = 'posts/benchmark.jpg'
+
+# Доля каждого адреса posts.urls в нагрузке: чтение лент и постов
+# преобладает, изменения данных встречаются редко
+REQUEST_MIX = {
+    'index': 25,
+    'post_detail': 25,
+    'group_list': 10,
+    'profile': 10,
+    'follow_index': 10,
+    'post_comments': 5,
+    'search': 5,
+    'add_comment': 4,
+    'post_create': 2,
+    'profile_follow': 2,
+    'profile_unfollow': 2,
+}
+
+
+def zipf_weights(count, alpha=1.0):
+    """Веса степенного распределения: первый элемент самый популярный."""
+    return [1 / (rank ** alpha) for rank in range(1, count + 1)]
+
+
+def benchmark_image():
+    """Картинка для постов, сохраняется в хранилище один раз."""
+    if not default_storage.exists(BENCHMARK_IMAGE):
+        buffer = io.BytesIO()
+        Image.new('RGB', (960, 640), (90, 120, 160)).save(buffer, 'JPEG')
+        default_storage.save(BENCHMARK_IMAGE, ContentFile(buffer.getvalue()))
+    return BENCHMARK_IMAGE
+
+
+def seed(users=100, groups=10, posts=2000, comments=10000, follows=20,
+         images=0.0, alpha=1.0, random_seed=0, batch_size=1000):
+    """
+    Заполняет базу синтетическими данными через bulk_create.
+
+    Авторы постов и комментариев и цели подписок выбираются по
+    степенному закону с показателем alpha: у первых пользователей
+    больше всего постов и подписчиков. Каждый пользователь подписан
+    в среднем на follows авторов, доля images постов получает картинку.
+    Сигналы не вызываются, производные данные пересчитываются отдельно.
+    """
+    rnd = random.Random(random_seed)
+    fake = Faker('ru_RU')
+    fake.seed_instance(random_seed)
+    mixer = Mixer(commit=False, locale='ru')
+    first_user = (User.objects.order_by('-pk').values_list(
+        'pk', flat=True
+    ).first() or 0) + 1
+    User.objects.bulk_create(mixer.cycle(users).blend(
+        User, username=mixer.sequence(
+            lambda n: f'user{first_user + n}'
+        )
+    ), batch_size=batch_size)
+    user_list = list(User.objects.order_by('pk'))
+    first_group = (Group.objects.order_by('-pk').values_list(
+        'pk', flat=True
+    ).first() or 0) + 1
+    Group.objects.bulk_create(mixer.cycle(groups).blend(
+        Group, slug=mixer.sequence(
+            lambda n: f'group{first_group + n}'
+        )
+    ), batch_size=batch_size)
+    group_list = list(Group.objects.order_by('pk'))
+    weights = zipf_weights(len(user_list), alpha)
+    image = benchmark_image() if images else ''
+    Post.objects.bulk_create(mixer.cycle(posts).blend(
+        Post,
+        text=(fake.text() for _ in range(posts)),
+        author=(
+            user for user in rnd.choices(user_list, weights, k=posts)
+        ),
+        group=(rnd.choice(group_list + [None]) for _ in range(posts)),
+        image=(
+            image if rnd.random() < images else '' for _ in range(posts)
+        ),
+    ), batch_size=batch_size)
+    post_ids = list(Post.objects.values_list('pk', flat=True))
+    Comment.objects.bulk_create(mixer.cycle(comments).blend(
+        Comment,
+        text=(fake.sentence() for _ in range(comments)),
+        post_id=(rnd.choice(post_ids) for _ in range(comments)),
+        author=(
+            user for user in rnd.choices(user_list, weights, k=comments)
+        ),
+    ), batch_size=batch_size)
+    Follow.objects.bulk_create((
+        Follow(user=user, author=author)
+        for user in user_list
+        for author in set(rnd.choices(user_list, weights, k=follows))
+        if author != user
+    ), batch_size=batch_size, ignore_conflicts=True)
+    return {
+        'users': users,
+        'groups': groups,
+        'posts': posts,
+        'comments': comments,
+        'follows': Follow.objects.count(),
+    }
+
+
+def percentile(timings, percent):
+    """Процентиль отсортированного списка по методу ближайшего ранга."""
+    if not timings:
+        return None
+    return timings[max(math.ceil(percent / 100 * len(timings)), 1) - 1]
+
+
+def summarize(timings, queries, seconds):
+    """Сводка по времени (мс) и числу запросов к базе."""
+    timings = sorted(timings)
+    summary = {
+        'requests': len(timings),
+        'rps': round(len(timings) / seconds, 1) if seconds else None,
+        'p50_ms': percentile(timings, 50),
+        'p95_ms': percentile(timings, 95),
+        'p99_ms': percentile(timings, 99),
+    }
+    if queries:
+        summary['queries_avg'] = round(sum(queries) / len(queries), 2)
+        summary['queries_max'] = max(queries)
+    return summary
+
+
+class Workload:
+    """
+    Случайная последовательность запросов к posts.urls по REQUEST_MIX
+    от имени user. Посты, группы и авторы берутся из базы.
+    """
+
+    def __init__(self, user, mix=None, random_seed=0, sample=1000):
+        self.user = user
+        self.mix = mix or REQUEST_MIX
+        self.rnd = random.Random(random_seed)
+        self.post_ids = self.sample(
+            Post.objects.values_list('pk', flat=True), sample
+        )
+        self.slugs = list(Group.objects.values_list('slug', flat=True))
+        self.usernames = self.sample(User.objects.exclude(
+            pk=user.pk
+        ).values_list('username', flat=True), sample)
+        self.words = [
+            word.strip('.,') for text in Post.objects.filter(
+                pk__in=self.post_ids[:50]
+            ).values_list('text', flat=True)
+            for word in text.split() if len(word) > 3
+        ] or ['пост']
+
+    def sample(self, values, size):
+        """Одинаковая при одном random_seed выборка из queryset."""
+        values = list(values.order_by('pk'))
+        return self.rnd.sample(values, min(size, len(values)))
+
+    def request(self, name):
+        """Метод, адрес и данные запроса name."""
+        rnd = self.rnd
+        post_id = rnd.choice(self.post_ids)
+        username = rnd.choice(self.usernames)
+        return {
+            'index': lambda: ('get', reverse('posts:index'), None),
+            'post_detail': lambda: ('get', reverse(
+                'posts:post_detail', kwargs={'post_id': post_id}
+            ), None),
+            'post_comments': lambda: ('get', reverse(
+                'posts:post_comments', kwargs={'post_id': post_id}
+            ), None),
+            'group_list': lambda: ('get', reverse(
+                'posts:group_list', kwargs={'slug': rnd.choice(self.slugs)}
+            ), None),
+            'profile': lambda: ('get', reverse(
+                'posts:profile', kwargs={'username': username}
+            ), None),
+            'follow_index': lambda: (
+                'get', reverse('posts:follow_index'), None
+            ),
+            'search': lambda: ('get', reverse('posts:search'), {
+                'q': rnd.choice(self.words),
+            }),
+            'add_comment': lambda: ('post', reverse(
+                'posts:add_comment', kwargs={'post_id': post_id}
+            ), {'text': 'Комментарий нагрузочного теста'}),
+            'post_create': lambda: ('post', reverse('posts:post_create'), {
+                'text': 'Пост нагрузочного теста',
+            }),
+            'profile_follow': lambda: ('get', reverse(
+                'posts:profile_follow', kwargs={'username': username}
+            ), None),
+            'profile_unfollow': lambda: ('get', reverse(
+                'posts:profile_unfollow', kwargs={'username': username}
+            ), None),
+        }[name]()
+
+    def __iter__(self):
+        names, weights = zip(*self.mix.items())
+        while True:
+            name = self.rnd.choices(names, weights)[0]
+            yield (name, *self.request(name))
+
+
+class ClientRunner:
+    """
+    Запросы через тестовый клиент Django в этом процессе. Считает
+    запросы к базе; изменения данных откатываются, если rollback.
+    """
+
+    def __init__(self, user, rollback=True, cold=False):
+        self.client = Client()
+        self.client.force_login(user)
+        self.rollback = rollback
+        self.cold = cold
+
+    def __call__(self, method, url, data):
+        if self.cold:
+            cache.clear()
+        with transaction.atomic():
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                response = getattr(self.client, method)(url, data)
+                elapsed = time.perf_counter() - start
+            transaction.set_rollback(self.rollback)
+        return response.status_code, elapsed * 1000, len(captured)
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    """Редирект возвращается как ответ, как в тестовом клиенте."""
+
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HTTPRunner:
+    """
+    Запросы по HTTP к запущенному серверу base_url с сессией user.
+    Сервер должен работать с той же базой. Запросы к базе не считаются.
+    """
+
+    def __init__(self, base_url, user):
+        self.base_url = base_url.rstrip('/')
+        client = Client()
+        client.force_login(user)
+        self.session = client.cookies[settings.SESSION_COOKIE_NAME].value
+        self.csrf_token = 'b' * 32
+        self.opener = urllib.request.build_opener(NoRedirect)
+
+    def __call__(self, method, url, data):
+        headers = {'Cookie': (
+            f'{settings.SESSION_COOKIE_NAME}={self.session}; '
+            f'{settings.CSRF_COOKIE_NAME}={self.csrf_token}'
+        )}
+        body = None
+        if method == 'post':
+            data = {**(data or {}), 'csrfmiddlewaretoken': self.csrf_token}
+            body = urlencode(data).encode()
+            headers['Referer'] = self.base_url
+        elif data:
+            url = f'{url}?{urlencode(data)}'
+        request = urllib.request.Request(
+            self.base_url + url, data=body, headers=headers,
+            method=method.upper()
+        )
+        start = time.perf_counter()
+        try:
+            with self.opener.open(request) as response:
+                response.read()
+                status = response.status
+        except urllib.error.HTTPError as error:
+            status = error.code
+        return status, (time.perf_counter() - start) * 1000, None
+
+
+def run(runner, workload, requests, warmup=0, concurrency=1):
+    """
+    Выполняет requests запросов из workload, первые warmup не
+    учитываются. При concurrency > 1 запросы идут одновременно из
+    стольких потоков. Возвращает сводку по всем запросам и по каждому
+    адресу.
+    """
+    stream = iter(workload)
+    for _ in range(warmup):
+        runner(*next(stream)[1:])
+    batch = [next(stream) for _ in range(requests)]
+
+    def execute(request):
+        return runner(*request[1:])
+
+    started = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            responses = list(executor.map(execute, batch))
+    else:
+        responses = [execute(request) for request in batch]
+    seconds = time.perf_counter() - started
+    results = {}
+    errors = {}
+    for (name, *_), (status, elapsed, queries) in zip(batch, responses):
+        if status >= 400:
+            errors[name] = errors.get(name, 0) + 1
+        timings, counts = results.setdefault(name, ([], []))
+        timings.append(round(elapsed, 2))
+        if queries is not None:
+            counts.append(queries)
+    return {
+        'total': summarize(
+            [t for timings, _ in results.values() for t in timings],
+            [q for _, counts in results.values() for q in counts],
+            seconds,
+        ),
+        'views': {
+            name: summarize(timings, counts, None)
+            for name, (timings, counts) in sorted(results.items())
+        },
+        'errors': errors,
+    }
+
+
+def compare(reports):
+    """
+    Сравнивает отчеты run для нескольких серверов: rps и p95 каждого
+    относительно первого.
+    """
+    base = next(iter(reports.values()))['total']
+    ratios = {}
+    for name, report in reports.items():
+        total = report['total']
+        ratios[name] = {
+            key: round(total[key] / base[key], 2)
+            if total[key] and base[key] else None
+            for key in ('rps', 'p95_ms')
+        }
+    return ratios
@@ -0,0 +1,277 @@
+import hashlib
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connection, transaction
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from core.page_cache import cache_page_swr
+
+from .models import Group, Post, User
+
+VERSION_KEY = 'feed_version:{}'
+MODIFIED_KEY = 'feed_modified:{}'
+COUNT_KEY = 'feed_count:{}'
+
+logger = logging.getLogger(__name__)
+_count_executor = None
+
+
+def initial_version():
+    """
+    Начальное значение счетчика. Если счетчик вытеснен из кеша, отсчет
+    начнется с нового числа и старые страницы не станут снова свежими.
+    """
+    return time.time_ns() // 1000
+
+
+def get_feed_versions(*feeds):
+    """Текущие версии лент: {имя ленты: версия}."""
+    keys = {VERSION_KEY.format(feed): feed for feed in feeds}
+    found = cache.get_many(keys)
+    versions = {keys[key]: value for key, value in found.items()}
+    for key, feed in keys.items():
+        if feed not in versions:
+            cache.add(key, initial_version(), timeout=None)
+            versions[feed] = cache.get(key)
+    return versions
+
+
+def bump_feed_versions(*feeds):
+    """Делает устаревшими закешированные страницы указанных лент."""
+    for feed in set(feeds):
+        key = VERSION_KEY.format(feed)
+        try:
+            cache.incr(key)
+        except ValueError:
+            if not cache.add(key, initial_version(), timeout=None):
+                cache.incr(key)
+    now = time.time()
+    cache.set_many(
+        {MODIFIED_KEY.format(feed): now for feed in set(feeds)},
+        timeout=None
+    )
+
+
+def get_feed_modified(*feeds):
+    """Время последнего изменения лент для заголовка Last-Modified."""
+    keys = [MODIFIED_KEY.format(feed) for feed in feeds]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, time.time(), timeout=None)
+            found[key] = cache.get(key)
+    return datetime.fromtimestamp(max(found.values()), tz=timezone.utc)
+
+
+def post_feeds(author_id, group_id=None):
+    """Ленты, на которых показывается пост автора из группы."""
+    feeds = ['index']
+    username = User.objects.filter(pk=author_id).values_list(
+        'username', flat=True
+    ).first()
+    if username is not None:
+        feeds.append(f'profile:{username}')
+    if group_id is not None:
+        slug = Group.objects.filter(pk=group_id).values_list(
+            'slug', flat=True
+        ).first()
+        if slug is not None:
+            feeds.append(f'group:{slug}')
+    return feeds
+
+
+def feed_names(feeds, request, kwargs):
+    """Имена лент из шаблонов, заполненных аргументами view."""
+    return [feed.format(request=request, **kwargs) for feed in feeds]
+
+
+def feed_state(names):
+    """Хеш текущих версий лент - основа ключей кеша и ETag."""
+    versions = get_feed_versions(*names)
+    state = ';'.join(f'{name}={versions[name]}' for name in names)
+    return hashlib.md5(state.encode()).hexdigest()
+
+
+def request_etag(request, state):
+    """
+    ETag ответа: состояние данных, адрес с параметрами, пользователь
+    и csrf-cookie, чтобы после входа не показывалась старая форма.
+    """
+    return hashlib.md5('{}|{}|{}|{}'.format(
+        state,
+        request.get_full_path(),
+        request.user.pk,
+        request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''),
+    ).encode()).hexdigest()
+
+
+def feed_condition(*feeds):
+    """
+    Условный GET по версиям лент, как condition() из django.
+
+    ETag строится из хеша версий лент, Last-Modified - время последнего
+    изменения лент. Для неизменившейся ленты ответ 304 отдается без
+    запросов к базе, рендеринга и сериализации. Устаревшая копия из
+    cache_feed отдается без ETag и Last-Modified: иначе клиент получил
+    бы 304 на старую страницу и после ее перестроения.
+    """
+    def etag(request, *args, **kwargs):
+        names = feed_names(feeds, request, kwargs)
+        return request_etag(request, feed_state(names))
+
+    def last_modified(request, *args, **kwargs):
+        return get_feed_modified(*feed_names(feeds, request, kwargs))
+
+    def decorator(view_func):
+        conditional_view = condition(
+            etag_func=etag, last_modified_func=last_modified
+        )(view_func)
+
+        @wraps(view_func)
+        def _wrapped_view(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            if getattr(response, 'stale_copy', False):
+                del response['ETag']
+                del response['Last-Modified']
+            return response
+        return _wrapped_view
+    return decorator
+
+
+def get_post_state(request, post_id):
+    """Время изменения, счетчик комментариев, автор и группа поста."""
+    if not hasattr(request, '_post_state'):
+        request._post_state = Post.objects.filter(pk=post_id).values_list(
+            'updated', 'comments_count', 'author__username', 'group__slug'
+        ).first()
+    return request._post_state
+
+
+def post_condition():
+    """
+    Условный GET страницы поста одним запросом по первичному ключу.
+
+    Post.updated меняется и при изменении комментариев. Версии ленты
+    автора и группы учитывают число постов автора и данные группы.
+    """
+    def etag(request, post_id, *args, **kwargs):
+        state = get_post_state(request, post_id)
+        if state is None:
+            return None
+        updated, comments_count, username, slug = state
+        names = [f'profile:{username}']
+        if slug is not None:
+            names.append(f'group:{slug}')
+        return request_etag(request, '{}|{}|{}'.format(
+            updated.timestamp(), comments_count, feed_state(names)
+        ))
+
+    def last_modified(request, post_id, *args, **kwargs):
+        state = get_post_state(request, post_id)
+        return state and state[0]
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
+
+
+def public_cache_control(max_age):
+    """
+    Гостям - Cache-Control: public, max-age, чтобы страницы мог отдавать
+    обратный прокси. Пользователям - private с проверкой по ETag.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def _wrapped_view(request, *args, **kwargs):
+            response = view_func(request, *args, **kwargs)
+            if request.user.is_authenticated:
+                patch_cache_control(response, private=True, max_age=0)
+            else:
+                patch_cache_control(response, public=True, max_age=max_age)
+            return response
+        return _wrapped_view
+    return decorator
+
+
+def cache_feed(timeout, *feeds):
+    """
+    Кеширует страницу ленты, пока не изменились версии лент.
+
+    Имена лент - шаблоны str.format, которые заполняются аргументами
+    view и request, например 'group:{slug}' или 'follow:{request.user.pk}'.
+    При изменении данных версия ленты увеличивается сигналами, и
+    устаревают только страницы затронутых лент. Устаревшую страницу
+    перестраивает один запрос, остальные получают старую копию.
+
+    Страница общая для всех пользователей, кроме лент с request.user
+    в имени: зависящие от пользователя части выводятся {% personal %}.
+    """
+    def state(request, *args, **kwargs):
+        return feed_state(feed_names(feeds, request, kwargs))
+
+    return cache_page_swr(
+        timeout, state_func=state,
+        per_user=any('request.user' in feed for feed in feeds)
+    )
+
+
+def count_sources(sources):
+    """Точное число записей в одном или нескольких источниках ленты."""
+    if not isinstance(sources, (list, tuple)):
+        sources = [sources]
+    return sum(source.order_by().count() for source in sources)
+
+
+def store_count(key, sources):
+    """Считает записи и сохраняет число в кеш вместе с временем."""
+    count = count_sources(sources)
+    cache.set(key, (count, time.time()), timeout=None)
+    return count
+
+
+def _refresh_count(key, sources):
+    try:
+        store_count(key, sources)
+    except DatabaseError:
+        logger.exception('Не удалось пересчитать %s', key)
+    finally:
+        connection.close()
+
+
+def refresh_count_later(key, sources):
+    """Пересчитывает число записей в фоновом потоке после коммита."""
+    global _count_executor
+    if _count_executor is None:
+        _count_executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix='feed_counts'
+        )
+    transaction.on_commit(
+        lambda: _count_executor.submit(_refresh_count, key, sources)
+    )
+
+
+def get_feed_count(feed, sources):
+    """
+    Примерное число постов ленты без COUNT(*) в каждом запросе.
+
+    Значение хранится в кеше. Если оно старше FEED_COUNT_REFRESH секунд,
+    запрос получает старое значение, а один из запросов отправляет
+    пересчет в фоновый поток. Считается в самом запросе только ни разу
+    не посчитанная лента.
+    """
+    key = COUNT_KEY.format(feed)
+    cached = cache.get(key)
+    if cached is None:
+        return store_count(key, sources)
+    count, counted_at = cached
+    refresh = settings.FEED_COUNT_REFRESH
+    if time.time() - counted_at > refresh and cache.add(
+        f'{key}:refreshing', True, timeout=refresh
+    ):
+        refresh_count_later(key, sources)
+    return count
@@ -0,0 +1,180 @@
+from django.conf import settings
+from django.db.models import Count, F
+
+from .models import FeedEntry, Follow, PopularAuthor, Post
+
+
+def is_popular(author_id):
+    """Автор читается подписчиками напрямую, без рассылки по лентам."""
+    return PopularAuthor.objects.filter(author_id=author_id).exists()
+
+
+def fanout_post(post):
+    """
+    Добавляет новый пост в ленты подписчиков автора порциями по
+    FOLLOW_FEED_BATCH_SIZE. После каждой вставки ленты порции, ставшие
+    длиннее FOLLOW_FEED_MAX_LENGTH, обрезаются.
+    """
+    if is_popular(post.author_id):
+        return
+    followers = list(Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True))
+    size = settings.FOLLOW_FEED_BATCH_SIZE
+    for start in range(0, len(followers), size):
+        batch = followers[start:start + size]
+        FeedEntry.objects.bulk_create(
+            [
+                FeedEntry(
+                    user_id=user_id,
+                    post=post,
+                    author_id=post.author_id,
+                    pub_date=post.pub_date,
+                ) for user_id in batch
+            ],
+            ignore_conflicts=True,
+        )
+        trim_feeds(batch)
+
+
+def backfill_feed(user_id, author_id):
+    """Заполняет ленту последними постами автора после подписки."""
+    if is_popular(author_id):
+        return
+    posts = Post.objects.filter(author_id=author_id).order_by(
+        '-pub_date', '-pk'
+    ).values_list('pk', 'pub_date')[:settings.FOLLOW_FEED_MAX_LENGTH]
+    FeedEntry.objects.bulk_create(
+        (
+            FeedEntry(
+                user_id=user_id,
+                post_id=post_id,
+                author_id=author_id,
+                pub_date=pub_date,
+            ) for post_id, pub_date in posts
+        ),
+        batch_size=settings.FOLLOW_FEED_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    trim_feed(user_id)
+
+
+def prune_feed(user_id, author_id):
+    """Убирает из ленты посты автора после отписки."""
+    FeedEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def trim_feed(user_id):
+    """Обрезает ленту до FOLLOW_FEED_MAX_LENGTH последних записей."""
+    entries = FeedEntry.objects.filter(user_id=user_id).order_by(
+        '-pub_date', '-post_id'
+    )
+    cutoff = entries.values_list(
+        'pub_date', 'post_id'
+    )[settings.FOLLOW_FEED_MAX_LENGTH:][:1]
+    for pub_date, post_id in cutoff:
+        FeedEntry.objects.filter(
+            user_id=user_id, pub_date__lte=pub_date
+        ).exclude(pub_date=pub_date, post_id__gt=post_id).delete()
+
+
+def trim_feeds(user_ids=None):
+    """
+    Обрезает ленты длиннее FOLLOW_FEED_MAX_LENGTH: пользователей
+    user_ids или все. Длинные ленты ищутся одним запросом по индексу.
+    Возвращает число обрезанных лент.
+    """
+    entries = FeedEntry.objects.all()
+    if user_ids is not None:
+        entries = entries.filter(user_id__in=user_ids)
+    users = list(entries.values('user_id').annotate(
+        total=Count('pk')
+    ).filter(
+        total__gt=settings.FOLLOW_FEED_MAX_LENGTH
+    ).values_list('user_id', flat=True))
+    for user_id in users:
+        trim_feed(user_id)
+    return len(users)
+
+
+def mark_popular(author_id):
+    """
+    Переводит автора на чтение "на лету", если у него больше
+    FOLLOW_FEED_FANOUT_MAX_FOLLOWERS подписчиков. Разосланные записи
+    удаляются, так как его посты теперь подмешиваются при чтении.
+    """
+    limit = settings.FOLLOW_FEED_FANOUT_MAX_FOLLOWERS
+    if is_popular(author_id):
+        return
+    followers = Follow.objects.filter(author_id=author_id)
+    if followers.values('pk')[:limit + 1].count() <= limit:
+        return
+    PopularAuthor.objects.get_or_create(author_id=author_id)
+    FeedEntry.objects.filter(author_id=author_id).delete()
+
+
+def index_feed():
+    """Посты главной страницы."""
+    return Post.objects.all().select_related('author', 'group')
+
+
+def group_feed(group):
+    """Посты группы."""
+    return group.posts.all().select_related('author', 'group').order_by(
+        'pub_date'
+    )
+
+
+def profile_feed(author):
+    """Посты автора."""
+    return author.posts.all().select_related('author', 'group')
+
+
+def without_text(feed):
+    """
+    Лента для карточек без исходного текста: карточкам хватает
+    готового HTML. Принимает queryset или список источников.
+    """
+    if isinstance(feed, (list, tuple)):
+        return [source.defer('text') for source in feed]
+    return feed.defer('text')
+
+
+def follow_feed(user):
+    """
+    Источники постов ленты подписок для CursorPaginator.
+
+    Без FOLLOW_FEED_FANOUT лента собирается при чтении из постов
+    авторов, на которых подписан пользователь. В режиме рассылки
+    основная часть читается из FeedEntry по индексу (user, pub_date),
+    а посты популярных авторов подмешиваются отдельным запросом.
+    Чтение ничего не меняет: до FOLLOW_FEED_MAX_LENGTH ленты
+    обрезаются при рассылке поста и при подписке.
+    Ключ пагинации во всех источниках - feed_date и feed_post.
+    """
+    follows = Follow.objects.filter(user=user)
+    posts = Post.objects.select_related('author', 'group')
+    if not settings.FOLLOW_FEED_FANOUT:
+        return [
+            posts.filter(
+                author__in=follows.values('author')
+            ).annotate(feed_date=F('pub_date'), feed_post=F('pk'))
+        ]
+    sources = [
+        posts.filter(feed_entries__user=user).annotate(
+            feed_date=F('feed_entries__pub_date'),
+            feed_post=F('feed_entries__post'),
+        )
+    ]
+    popular = list(
+        follows.filter(author__popular__isnull=False).values_list(
+            'author', flat=True
+        )
+    )
+    if popular:
+        sources.append(
+            posts.filter(author__in=popular).annotate(
+                feed_date=F('pub_date'), feed_post=F('pk')
+            )
+        )
+    return sources
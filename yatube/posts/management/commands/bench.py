@@ -0,0 +1,111 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.benchmark import (
+    ClientRunner, HTTPRunner, Workload, compare, run
+)
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Выполняет смесь запросов к posts.urls и выводит пропускную '
+        'способность, p50/p95/p99 времени ответа и число запросов к '
+        'базе в JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=1000)
+        parser.add_argument(
+            '--warmup', type=int, default=50,
+            help='Сколько первых запросов не учитывать.'
+        )
+        parser.add_argument(
+            '--user', help='Имя пользователя, по умолчанию первый.'
+        )
+        parser.add_argument(
+            '--url',
+            help='Адрес запущенного сервера, например '
+                 'http://127.0.0.1:8000. Без него запросы идут через '
+                 'тестовый клиент.'
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=1,
+            help='Сколько запросов к --url выполнять одновременно.'
+        )
+        parser.add_argument(
+            '--compare', metavar='URL',
+            help='Адрес второго сервера с той же базой. Та же смесь '
+                 'запросов выполняется на --url и на нем, в отчет '
+                 'попадают оба результата и отношение rps и p95. '
+                 'Например, --url для yatube.wsgi под gunicorn и '
+                 '--compare для yatube.asgi под uvicorn.'
+        )
+        parser.add_argument(
+            '--commit', action='store_true',
+            help='Сохранять изменения данных тестового клиента.'
+        )
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='Очищать кеш перед каждым запросом тестового клиента.'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Файл для отчета в JSON.')
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by('pk')
+        if options['user']:
+            users = users.filter(username=options['user'])
+        user = users.first()
+        if user is None:
+            raise CommandError(
+                'Нет пользователей, сначала выполните seed_benchmark.'
+            )
+        if options['concurrency'] < 1:
+            raise CommandError('--concurrency должно быть не меньше 1.')
+        if options['concurrency'] > 1 and not options['url']:
+            raise CommandError(
+                'Одновременные запросы выполняются только по HTTP, '
+                'укажите --url.'
+            )
+        if options['compare'] and not options['url']:
+            raise CommandError('Для --compare укажите и --url.')
+        if options['url']:
+            runners = {
+                url: HTTPRunner(url, user)
+                for url in (options['url'], options['compare']) if url
+            }
+        else:
+            runners = {None: ClientRunner(
+                user, rollback=not options['commit'], cold=options['cold']
+            )}
+        reports = {
+            url: run(
+                runner, Workload(user, random_seed=options['seed']),
+                options['requests'], options['warmup'],
+                options['concurrency']
+            )
+            for url, runner in runners.items()
+        }
+        if options['compare']:
+            report = {'servers': reports, 'ratio': compare(reports)}
+        else:
+            report = reports[options['url']]
+        report['config'] = {
+            'requests': options['requests'],
+            'warmup': options['warmup'],
+            'user': user.username,
+            'url': options['url'],
+            'compare': options['compare'],
+            'concurrency': options['concurrency'],
+            'cold': options['cold'],
+            'seed': options['seed'],
+        }
+        output = json.dumps(report, indent=2, ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as stream:
+                stream.write(output)
+        self.stdout.write(output)
@@ -0,0 +1,40 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.transfer import export_rows, rate
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает пользователей, группы, посты, комментарии и подписки '
+        'в NDJSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default='-',
+            help='Файл для выгрузки, "-" - стандартный вывод.'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=2000,
+            help='Сколько строк читать из базы за раз.'
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        if options['path'] == '-':
+            counts = export_rows(sys.stdout, options['chunk_size'])
+        else:
+            with open(options['path'], 'w', encoding='utf-8') as stream:
+                counts = export_rows(stream, options['chunk_size'])
+        total = sum(counts.values())
+        self.stderr.write(self.style.SUCCESS(
+            'Выгружено строк: {} ({}), {:.0f} строк/с'.format(
+                total,
+                ', '.join(f'{name}: {count}' for name, count in
+                          counts.items()),
+                rate(total, started),
+            )
+        ))
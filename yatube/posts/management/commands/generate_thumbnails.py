@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from posts.thumbnails import generate_thumbnails
+
+
+class Command(BaseCommand):
+    help = 'Создает миниатюры для картинок постов, у которых их еще нет.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Пересоздать миниатюры для всех постов с картинками.'
+        )
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='')
+        if not options['all']:
+            posts = posts.filter(thumbnails={})
+        total = 0
+        for post_id in posts.values_list('pk', flat=True).iterator():
+            generate_thumbnails(post_id)
+            total += 1
+        self.stdout.write(self.style.SUCCESS(f'Обработано постов: {total}'))
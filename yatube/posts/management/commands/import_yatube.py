@@ -0,0 +1,80 @@
+import os
+import sys
+import time
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+from posts.transfer import Importer, rate
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает NDJSON из export_yatube пакетами. Прерванную загрузку '
+        'из файла можно продолжить с --resume.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', help='Файл NDJSON, "-" - стандартный ввод.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=2000,
+            help='Сколько строк вставлять одним bulk_create.'
+        )
+        parser.add_argument(
+            '--merge', action='store_true',
+            help='Обновлять уже существующие объекты, а не пропускать.'
+        )
+        parser.add_argument(
+            '--resume', action='store_true',
+            help='Продолжить с последнего загруженного пакета.'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        checkpoint = None if path == '-' else f'{path}.checkpoint'
+        skip = 0
+        if options['resume'] and checkpoint and os.path.exists(checkpoint):
+            with open(checkpoint) as stream:
+                skip = int(stream.read() or 0)
+
+        def save_checkpoint(line_number):
+            with open(checkpoint, 'w') as stream:
+                stream.write(str(line_number))
+
+        importer = Importer(
+            batch_size=options['batch_size'],
+            merge=options['merge'],
+            on_commit=save_checkpoint if checkpoint else None,
+        )
+        started = time.monotonic()
+        if path == '-':
+            counts = importer.load(sys.stdin, skip)
+        else:
+            with open(path, encoding='utf-8') as stream:
+                counts = importer.load(stream, skip)
+        total = sum(counts.values())
+        speed = rate(total, started)
+        # bulk_create не вызывает сигналы: пересчитываются производные
+        # данные, которые сигналы поддерживают при обычной работе
+        call_command('recount_comments', stdout=StringIO())
+        call_command('recount_author_stats', stdout=StringIO())
+        call_command('rebuild_search_index', stdout=StringIO())
+        if settings.FOLLOW_FEED_FANOUT:
+            call_command('rebuild_follow_feeds', stdout=StringIO())
+        # Миниатюры не выгружаются, файлы картинок переносятся отдельно
+        call_command('generate_thumbnails', stdout=StringIO())
+        importer.invalidate()
+        if checkpoint and os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        self.stdout.write(self.style.SUCCESS(
+            'Загружено строк: {} ({}), {:.0f} строк/с'.format(
+                total,
+                ', '.join(f'{name}: {count}' for name, count in
+                          counts.items()),
+                speed,
+            )
+        ))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from posts import feeds
+from posts.models import FeedEntry, Follow, PopularAuthor
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает ленты подписок для режима FOLLOW_FEED_FANOUT.'
+
+    def handle(self, *args, **options):
+        FeedEntry.objects.all().delete()
+        PopularAuthor.objects.all().delete()
+        follows = Follow.objects.filter(
+            user__isnull=False, author__isnull=False
+        )
+        authors = follows.values_list(
+            'author_id', flat=True
+        ).distinct()
+        for author_id in authors.iterator():
+            feeds.mark_popular(author_id)
+        total = 0
+        pairs = follows.values_list('user_id', 'author_id')
+        for user_id, author_id in pairs.iterator():
+            feeds.backfill_feed(user_id, author_id)
+            total += 1
+        self.stdout.write(
+            self.style.SUCCESS(f'Обработано подписок: {total}')
+        )
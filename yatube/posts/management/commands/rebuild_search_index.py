@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from posts.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает поисковый индекс постов и комментариев.'
+
+    def handle(self, *args, **options):
+        total = rebuild_index()
+        self.stdout.write(
+            self.style.SUCCESS(f'Проиндексировано записей: {total}')
+        )
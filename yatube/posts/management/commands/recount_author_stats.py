@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from posts.stats import reconcile_author_stats
+
+
+class Command(BaseCommand):
+    help = (
+        'Сверяет счетчики постов, комментариев и подписок пользователей '
+        'с данными и исправляет расхождения.'
+    )
+
+    def handle(self, *args, **options):
+        fixed = reconcile_author_stats()
+        self.stdout.write(
+            self.style.SUCCESS(f'Исправлено записей: {fixed}')
+        )
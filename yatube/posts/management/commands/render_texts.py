@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Comment, Post
+from posts.rendering import fill_rendered_text
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает готовый HTML текста и его начала у всех постов '
+        'и комментариев, например после загрузки через bulk_create или '
+        'изменения EXCERPT_LENGTH.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        for model in (Post, Comment):
+            total = fill_rendered_text(model, options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(
+                f'{model._meta.verbose_name_plural}: {total}'
+            ))
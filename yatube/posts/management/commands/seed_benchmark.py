@@ -0,0 +1,58 @@
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.benchmark import seed
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу синтетическими пользователями, группами, постами, '
+        'комментариями и подписками для нагрузочного тестирования.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=50)
+        parser.add_argument('--posts', type=int, default=20000)
+        parser.add_argument('--comments', type=int, default=100000)
+        parser.add_argument(
+            '--follows', type=int, default=20,
+            help='Среднее число подписок пользователя.'
+        )
+        parser.add_argument(
+            '--images', type=float, default=0.2,
+            help='Доля постов с картинкой, от 0 до 1.'
+        )
+        parser.add_argument(
+            '--alpha', type=float, default=1.0,
+            help='Показатель степенного распределения авторов и подписок.'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            counts = seed(
+                users=options['users'],
+                groups=options['groups'],
+                posts=options['posts'],
+                comments=options['comments'],
+                follows=options['follows'],
+                images=options['images'],
+                alpha=options['alpha'],
+                random_seed=options['seed'],
+            )
+        call_command('recount_comments', stdout=StringIO())
+        call_command('recount_author_stats', stdout=StringIO())
+        call_command('render_texts', stdout=StringIO())
+        call_command('rebuild_search_index', stdout=StringIO())
+        if options['images']:
+            call_command('generate_thumbnails', stdout=StringIO())
+        if settings.FOLLOW_FEED_FANOUT:
+            call_command('rebuild_follow_feeds', stdout=StringIO())
+        self.stdout.write(self.style.SUCCESS('Создано: {}'.format(
+            ', '.join(f'{name}: {count}' for name, count in counts.items())
+        )))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from posts import feeds
+
+
+class Command(BaseCommand):
+    help = (
+        'Обрезает ленты подписок до FOLLOW_FEED_MAX_LENGTH записей. '
+        'При рассылке и подписке ленты обрезаются сами, команда '
+        'нужна после уменьшения FOLLOW_FEED_MAX_LENGTH.'
+    )
+
+    def handle(self, *args, **options):
+        total = feeds.trim_feeds()
+        self.stdout.write(self.style.SUCCESS(f'Обрезано лент: {total}'))
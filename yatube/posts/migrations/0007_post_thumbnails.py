@@ -0,0 +1,18 @@
+# Generated by Django 3.2.13 on 2026-10-18 06:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0006_post_updated'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='thumbnails',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Адреса готовых миниатюр картинки по размерам', verbose_name='Миниатюры'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 3.2.13 on 2026-10-18 07:01
+
+from django.db import migrations, models
+
+from posts.rendering import fill_rendered_text
+
+
+def fill_text_html(apps, schema_editor):
+    for name in ('Post', 'Comment'):
+        fill_rendered_text(apps.get_model('posts', name))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0009_author_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='excerpt',
+            field=models.TextField(blank=True, editable=False, help_text='Пусто, если комментарий показывается в ленте целиком', verbose_name='HTML начала комментария'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='text_html',
+            field=models.TextField(blank=True, editable=False, verbose_name='HTML комментария'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='excerpt',
+            field=models.TextField(blank=True, editable=False, help_text='Пусто, если текст показывается в ленте целиком', verbose_name='HTML начала текста'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='text_html',
+            field=models.TextField(blank=True, editable=False, verbose_name='HTML текста'),
+        ),
+        migrations.RunPython(fill_text_html, migrations.RunPython.noop),
+    ]
@@ -1,9 +1,33 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 
+from .rendering import RENDERED_FIELDS, render_text
+
 User = get_user_model()
 
 
+class RenderedTextMixin:
+    """
+    Хранит готовый HTML текста и его начала, чтобы не применять
+    linebreaks при каждом показе. Пересчитываются при сохранении текста.
+    """
+
+    def render_text(self):
+        self.text_html, self.excerpt = render_text(self.text)
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if 'text' not in self.get_deferred_fields() and (
+            update_fields is None or 'text' in update_fields
+        ):
+            self.render_text()
+            if update_fields is not None:
+                kwargs['update_fields'] = {
+                    *update_fields, *RENDERED_FIELDS
+                }
+        super().save(*args, **kwargs)
+
+
 class Group(models.Model):
     title = models.CharField(max_length=200)
     slug = models.SlugField(unique=True)
@@ -20,15 +44,30 @@ class Group(models.Model):
         verbose_name_plural = 'Группы'
 
 
-class Post(models.Model):
+class Post(RenderedTextMixin, models.Model):
     text = models.TextField(
         'Текст',
         help_text='Текст нового поста',
     )
+    text_html = models.TextField(
+        'HTML текста',
+        blank=True,
+        editable=False,
+    )
+    excerpt = models.TextField(
+        'HTML начала текста',
+        blank=True,
+        editable=False,
+        help_text='Пусто, если текст показывается в ленте целиком',
+    )
     pub_date = models.DateTimeField(
         'Дата публикации',
         auto_now_add=True
     )
+    updated = models.DateTimeField(
+        'Дата изменения',
+        auto_now=True
+    )
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -49,6 +88,18 @@ class Post(models.Model):
         upload_to='posts/',
         blank=True
     )
+    thumbnails = models.JSONField(
+        'Миниатюры',
+        default=dict,
+        blank=True,
+        editable=False,
+        help_text='Адреса готовых миниатюр картинки по размерам',
+    )
+    comments_count = models.PositiveIntegerField(
+        'Количество комментариев',
+        default=0,
+        editable=False,
+    )
 
     def __str__(self):
         return (self.text)[:15]
@@ -57,13 +108,38 @@ class Post(models.Model):
         ordering = ['-pub_date']
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        indexes = [
+            models.Index(
+                fields=['pub_date', 'id'],
+                name='post_pub_date_idx'
+            ),
+            models.Index(
+                fields=['author', 'pub_date', 'id'],
+                name='post_author_pub_date_idx'
+            ),
+            models.Index(
+                fields=['group', 'pub_date', 'id'],
+                name='post_group_pub_date_idx'
+            ),
+        ]
 
 
-class Comment(models.Model):
+class Comment(RenderedTextMixin, models.Model):
     text = models.TextField(
         'Комментарий',
         help_text='Текст комментария',
     )
+    text_html = models.TextField(
+        'HTML комментария',
+        blank=True,
+        editable=False,
+    )
+    excerpt = models.TextField(
+        'HTML начала комментария',
+        blank=True,
+        editable=False,
+        help_text='Пусто, если комментарий показывается в ленте целиком',
+    )
     post = models.ForeignKey(
         Post,
         on_delete=models.CASCADE,
@@ -89,6 +165,12 @@ class Comment(models.Model):
         ordering = ['-created']
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
+        indexes = [
+            models.Index(
+                fields=['post', 'created', 'id'],
+                name='comment_post_created_idx'
+            ),
+        ]
 
 
 class Follow(models.Model):
@@ -121,3 +203,137 @@ class Follow(models.Model):
                 name='unique_following'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['author', 'user'],
+                name='follow_author_user_idx'
+            ),
+        ]
+
+
+class FeedEntry(models.Model):
+    """Пост в предрассчитанной ленте подписок пользователя."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Подписчик'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Пост'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор поста'
+    )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    def __str__(self):
+        return f'{self.user_id} - {self.post_id}'
+
+    class Meta:
+        verbose_name = 'Запись ленты подписок'
+        verbose_name_plural = 'Записи ленты подписок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_feed_entry'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', 'pub_date', 'post'],
+                name='feed_user_pub_date_idx'
+            ),
+            models.Index(
+                fields=['user', 'author'],
+                name='feed_user_author_idx'
+            ),
+        ]
+
+
+class PopularAuthor(models.Model):
+    """
+    Автор со слишком большим числом подписчиков: его посты не рассылаются
+    по лентам, а читаются подписчиками напрямую.
+    """
+    author = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name='popular',
+        verbose_name='Автор'
+    )
+
+    def __str__(self):
+        return str(self.author_id)
+
+    class Meta:
+        verbose_name = 'Популярный автор'
+        verbose_name_plural = 'Популярные авторы'
+
+
+class SearchTerm(models.Model):
+    """
+    Запись переносимого поискового индекса: основа слова из поста или
+    комментария. Используется на базах без SQLite FTS5.
+    """
+    TERM_LENGTH = 64
+
+    term = models.CharField('Основа слова', max_length=TERM_LENGTH)
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Пост'
+    )
+    comment = models.ForeignKey(
+        Comment,
+        on_delete=models.CASCADE,
+        null=True,
+        related_name='+',
+        verbose_name='Комментарий'
+    )
+    weight = models.PositiveIntegerField('Вес', default=1)
+
+    def __str__(self):
+        return self.term
+
+    class Meta:
+        verbose_name = 'Слово поискового индекса'
+        verbose_name_plural = 'Слова поискового индекса'
+        indexes = [
+            models.Index(
+                fields=['term', 'post'],
+                name='search_term_post_idx'
+            ),
+        ]
+
+
+class AuthorStats(models.Model):
+    """
+    Счетчики пользователя для профиля и страницы поста. Меняются
+    сигналами при сохранении и удалении постов, комментариев и подписок.
+    """
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь'
+    )
+    posts_count = models.PositiveIntegerField('Постов', default=0)
+    comments_count = models.PositiveIntegerField('Комментариев', default=0)
+    followers_count = models.PositiveIntegerField('Подписчиков', default=0)
+    following_count = models.PositiveIntegerField('Подписок', default=0)
+
+    def __str__(self):
+        return str(self.user_id)
+
+    class Meta:
+        verbose_name = 'Статистика автора'
+        verbose_name_plural = 'Статистика авторов'
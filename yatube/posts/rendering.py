@@ -0,0 +1,39 @@
+from django.conf import settings
+from django.utils.html import linebreaks
+from django.utils.text import Truncator
+
+RENDERED_FIELDS = ('text_html', 'excerpt')
+
+
+def render_text(text):
+    """
+    HTML текста с абзацами, как у фильтра linebreaks, и HTML его
+    начала длиной до EXCERPT_LENGTH символов. Начало пустое, если
+    текст помещается целиком.
+    """
+    excerpt = Truncator(text).chars(settings.EXCERPT_LENGTH)
+    return (
+        linebreaks(text, autoescape=True),
+        linebreaks(excerpt, autoescape=True) if excerpt != text else '',
+    )
+
+
+def fill_rendered_text(model, batch_size=1000):
+    """
+    Пересчитывает text_html и excerpt всех записей модели пачками.
+    Подходит и для исторических моделей миграций.
+    """
+    objs = model.objects.only('pk', 'text').order_by('pk')
+    batch = []
+    total = 0
+    for obj in objs.iterator(chunk_size=batch_size):
+        obj.text_html, obj.excerpt = render_text(obj.text)
+        batch.append(obj)
+        if len(batch) == batch_size:
+            model.objects.bulk_update(batch, RENDERED_FIELDS)
+            total += len(batch)
+            batch = []
+    if batch:
+        model.objects.bulk_update(batch, RENDERED_FIELDS)
+        total += len(batch)
+    return total
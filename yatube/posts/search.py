@@ -0,0 +1,299 @@
+import re
+from collections import Counter
+
+from django.db import connection
+from django.db.models import Count, Sum
+
+from .models import Comment, Post, SearchTerm
+
+WORD_RE = re.compile(r'\w+')
+RUSSIAN_RE = re.compile('^[а-я]+$')
+VOWELS = 'аеиоуыэюя'
+
+# Окончания стеммера Портера (Snowball) для русского языка.
+# Окончания из групп с True должны идти после "а" или "я".
+PERFECTIVE_GERUND = (
+    (('в', 'вши', 'вшись'), True),
+    (('ив', 'ивши', 'ившись', 'ыв', 'ывши', 'ывшись'), False),
+)
+REFLEXIVE = ((('ся', 'сь'), False),)
+ADJECTIVE = ((
+    ('ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый', 'ой', 'ем',
+     'им', 'ым', 'ом', 'его', 'ого', 'ему', 'ому', 'их', 'ых', 'ую', 'юю',
+     'ая', 'яя', 'ою', 'ею'),
+    False,
+),)
+PARTICIPLE = (
+    (('ем', 'нн', 'вш', 'ющ', 'щ'), True),
+    (('ивш', 'ывш', 'ующ'), False),
+)
+VERB = (
+    (('ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но',
+      'ет', 'ют', 'ны', 'ть', 'ешь', 'нно'), True),
+    (('ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей',
+      'уй', 'ил', 'ыл', 'им', 'ым', 'ен', 'ило', 'ыло', 'ено', 'ят', 'ует',
+      'уют', 'ит', 'ыт', 'ены', 'ить', 'ыть', 'ишь', 'ую', 'ю'), False),
+)
+NOUN = ((
+    ('а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи', 'ии',
+     'и', 'ией', 'ей', 'ой', 'ий', 'й', 'иям', 'ям', 'ием', 'ем', 'ам',
+     'ом', 'о', 'у', 'ах', 'иях', 'ях', 'ы', 'ь', 'ию', 'ью', 'ю', 'ия',
+     'ья', 'я'),
+    False,
+),)
+I_ENDING = ((('и',), False),)
+DERIVATIONAL = ((('ост', 'ость'), False),)
+SUPERLATIVE = ((('ейш', 'ейше'), False),)
+
+
+def _strip(word, start, groups):
+    """Удаляет самое длинное из окончаний groups, лежащее в word[start:]."""
+    best = None
+    for endings, after_a in groups:
+        for ending in endings:
+            pos = len(word) - len(ending)
+            if pos < start or not word.endswith(ending):
+                continue
+            if after_a and (pos - 1 < start or word[pos - 1] not in 'ая'):
+                continue
+            if best is None or pos < best:
+                best = pos
+    if best is None:
+        return word, False
+    return word[:best], True
+
+
+def _region(word, start=0):
+    """Начало области после первой пары гласная-согласная."""
+    for i in range(start + 1, len(word)):
+        if word[i] not in VOWELS and word[i - 1] in VOWELS:
+            return i + 1
+    return len(word)
+
+
+def stem(word):
+    """
+    Основа слова для поиска. Русские слова обрабатываются стеммером
+    Портера, остальные только приводятся к нижнему регистру.
+    """
+    word = word.lower().replace('ё', 'е')
+    if not RUSSIAN_RE.match(word):
+        return word
+    rv = next((i + 1 for i, c in enumerate(word) if c in VOWELS), None)
+    if rv is None:
+        return word
+    r2 = _region(word, _region(word))
+    word, done = _strip(word, rv, PERFECTIVE_GERUND)
+    if not done:
+        word, _ = _strip(word, rv, REFLEXIVE)
+        word, done = _strip(word, rv, ADJECTIVE)
+        if done:
+            word, _ = _strip(word, rv, PARTICIPLE)
+        else:
+            word, done = _strip(word, rv, VERB)
+            if not done:
+                word, _ = _strip(word, rv, NOUN)
+    word, _ = _strip(word, rv, I_ENDING)
+    word, _ = _strip(word, r2, DERIVATIONAL)
+    word, done = _strip(word, rv, SUPERLATIVE)
+    if word.endswith('нн') and len(word) - 1 >= rv:
+        word = word[:-1]
+    elif not done and word.endswith('ь') and len(word) - 1 >= rv:
+        word = word[:-1]
+    return word
+
+
+def tokenize(text):
+    """Основы слов текста в порядке появления."""
+    return [
+        stem(word) for word in WORD_RE.findall(text or '')
+        if len(word) > 1 and not word.isdigit()
+    ]
+
+
+class FTSIndex:
+    """
+    Индекс в виртуальной таблице SQLite FTS5. Строки хранят основы
+    слов: пост в колонке post_text, комментарий - в comment_text.
+    rowid поста - 2 * pk, комментария - 2 * pk + 1, поэтому запись
+    удаляется и заменяется по первичному ключу таблицы.
+    """
+
+    table = 'posts_search'
+
+    def replace(self, rowid, post_id, post_text='', comment_text='',
+                created=False):
+        with connection.cursor() as cursor:
+            if not created:
+                cursor.execute(
+                    f'DELETE FROM {self.table} WHERE rowid = %s', [rowid]
+                )
+            if post_text or comment_text:
+                cursor.execute(
+                    f'INSERT INTO {self.table} '
+                    '(rowid, post_text, comment_text, post_id) '
+                    'VALUES (%s, %s, %s, %s)',
+                    [rowid, post_text, comment_text, post_id]
+                )
+
+    def index_post(self, post, created=False):
+        self.replace(post.pk * 2, post.pk, post_text=' '.join(
+            tokenize(post.text)
+        ), created=created)
+
+    def index_comment(self, comment, created=False):
+        self.replace(
+            comment.pk * 2 + 1, comment.post_id,
+            comment_text=' '.join(tokenize(comment.text)),
+            created=created
+        )
+
+    def unindex_post(self, post_id, comment_ids=()):
+        """Удаляет пост и, по списку id, его комментарии."""
+        rowids = [post_id * 2] + [pk * 2 + 1 for pk in comment_ids]
+        with connection.cursor() as cursor:
+            for start in range(0, len(rowids), 500):
+                chunk = rowids[start:start + 500]
+                placeholders = ', '.join(['%s'] * len(chunk))
+                cursor.execute(
+                    f'DELETE FROM {self.table} '
+                    f'WHERE rowid IN ({placeholders})',
+                    chunk
+                )
+
+    def unindex_comment(self, comment_id):
+        self.replace(comment_id * 2 + 1, None)
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+
+    def match(self, terms, column=None):
+        # Основы состоят из букв и цифр и берутся в кавычки как есть
+        prefix = f'{column} : ' if column else ''
+        return ' AND '.join(f'{prefix}"{term}"' for term in terms)
+
+    def search(self, terms, limit, offset=0):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT post_id FROM {self.table} '
+                f'WHERE {self.table} MATCH %s '
+                'GROUP BY post_id ORDER BY min(rank), post_id DESC '
+                'LIMIT %s OFFSET %s',
+                [self.match(terms), limit, offset]
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def search_comments(self, terms, limit):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {self.table} '
+                f'WHERE {self.table} MATCH %s ORDER BY rank LIMIT %s',
+                [self.match(terms, 'comment_text'), limit]
+            )
+            return [(row[0] - 1) // 2 for row in cursor.fetchall()]
+
+
+class TermIndex:
+    """
+    Переносимый инвертированный индекс в таблице SearchTerm для баз
+    без FTS5. Вес слова в посте вдвое больше, чем в комментарии.
+    """
+
+    def add(self, post_id, text, comment_id=None, weight=1):
+        SearchTerm.objects.bulk_create(
+            SearchTerm(
+                term=term[:SearchTerm.TERM_LENGTH],
+                post_id=post_id,
+                comment_id=comment_id,
+                weight=count * weight,
+            ) for term, count in Counter(tokenize(text)).items()
+        )
+
+    def index_post(self, post, created=False):
+        if not created:
+            self.unindex_post(post.pk)
+        self.add(post.pk, post.text, weight=2)
+
+    def index_comment(self, comment, created=False):
+        if not created:
+            self.unindex_comment(comment.pk)
+        self.add(comment.post_id, comment.text, comment_id=comment.pk)
+
+    def unindex_post(self, post_id, comment_ids=()):
+        # Слова комментариев удаляются каскадно вместе с постом
+        SearchTerm.objects.filter(post_id=post_id, comment=None).delete()
+
+    def unindex_comment(self, comment_id):
+        SearchTerm.objects.filter(comment_id=comment_id).delete()
+
+    def clear(self):
+        SearchTerm.objects.all().delete()
+
+    def search(self, terms, limit, offset=0):
+        terms = [term[:SearchTerm.TERM_LENGTH] for term in terms]
+        return list(
+            SearchTerm.objects.filter(term__in=terms).values('post').annotate(
+                matched=Count('term', distinct=True), score=Sum('weight')
+            ).filter(matched=len(terms)).order_by(
+                '-score', '-post'
+            ).values_list('post', flat=True)[offset:offset + limit]
+        )
+
+    def search_comments(self, terms, limit):
+        terms = [term[:SearchTerm.TERM_LENGTH] for term in terms]
+        return list(
+            SearchTerm.objects.filter(
+                term__in=terms, comment__isnull=False
+            ).values('comment').annotate(
+                matched=Count('term', distinct=True), score=Sum('weight')
+            ).filter(matched=len(terms)).order_by(
+                '-score', '-comment'
+            ).values_list('comment', flat=True)[:limit]
+        )
+
+
+def get_index():
+    """FTS5 для SQLite, переносимый индекс для остальных баз."""
+    if connection.vendor == 'sqlite':
+        return FTSIndex()
+    return TermIndex()
+
+
+def search_post_ids(query, limit, offset=0):
+    """id постов, подходящих под все слова запроса, по релевантности."""
+    terms = list(dict.fromkeys(tokenize(query)))
+    if not terms:
+        return []
+    return get_index().search(terms, limit, offset)
+
+
+def search_comment_ids(query, limit):
+    """id комментариев, подходящих под все слова запроса."""
+    terms = list(dict.fromkeys(tokenize(query)))
+    if not terms:
+        return []
+    return get_index().search_comments(terms, limit)
+
+
+def search_posts(query, limit, offset=0):
+    """Посты по запросу в порядке релевантности."""
+    ids = search_post_ids(query, limit, offset)
+    posts = Post.objects.select_related('author', 'group').defer(
+        'text'
+    ).in_bulk(ids)
+    return [posts[pk] for pk in ids if pk in posts]
+
+
+def rebuild_index(batch_size=1000):
+    """Перестраивает индекс по всем постам и комментариям."""
+    index = get_index()
+    index.clear()
+    total = 0
+    for model, add in (
+        (Post, index.index_post), (Comment, index.index_comment)
+    ):
+        for obj in model.objects.order_by().iterator(chunk_size=batch_size):
+            add(obj, created=True)
+            total += 1
+    return total
@@ -0,0 +1,367 @@
+import threading
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db.models import F, Q
+from django.db.models.signals import (
+    post_delete, post_save, pre_delete, pre_save
+)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import feeds, search
+from .cache import bump_feed_versions, post_feeds
+from .models import AuthorStats, Comment, Follow, Group, Post, User
+from .stats import change_author_stats
+from .thumbnails import schedule_thumbnails
+
+# Посты, которые сейчас удаляются вместе с комментариями
+_deleting = threading.local()
+# Поля пользователя, которые выводятся в карточках постов
+USER_CARD_FIELDS = ('username', 'first_name', 'last_name')
+
+
+def is_post_deleting(post_id):
+    return post_id in getattr(_deleting, 'posts', ())
+
+
+def change_comments_count(post_id, delta):
+    """
+    Атомарно меняет счетчик комментариев поста на delta и отмечает пост
+    измененным: закешированная карточка поста устаревает.
+    """
+    posts = Post.objects.filter(pk=post_id)
+    if delta < 0:
+        posts = posts.filter(comments_count__gte=-delta)
+    posts.update(
+        comments_count=F('comments_count') + delta,
+        updated=timezone.now(),
+    )
+
+
+def touch_posts(*post_ids):
+    """Отмечает посты измененными без изменения полей."""
+    Post.objects.filter(pk__in=post_ids).update(updated=timezone.now())
+
+
+@receiver(pre_save, sender=Comment)
+def remember_comment_post(sender, instance, **kwargs):
+    """Запоминает пост комментария до сохранения (правка в админке)."""
+    instance._old_post_id = None
+    if not instance._state.adding:
+        instance._old_post_id = Comment.objects.filter(
+            pk=instance.pk
+        ).values_list('post_id', flat=True).first()
+
+
+@receiver(post_save, sender=Comment)
+def count_saved_comment(sender, instance, created, **kwargs):
+    """Учитывает новый или перенесенный в другой пост комментарий."""
+    old_post_id = getattr(instance, '_old_post_id', None)
+    if created:
+        change_comments_count(instance.post_id, 1)
+    elif old_post_id is not None and old_post_id != instance.post_id:
+        change_comments_count(old_post_id, -1)
+        change_comments_count(instance.post_id, 1)
+    else:
+        touch_posts(instance.post_id)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    """Уменьшает счетчик при удалении комментария."""
+    if not is_post_deleting(instance.post_id):
+        change_comments_count(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Post)
+def fanout_created_post(sender, instance, created, **kwargs):
+    """Рассылает новый пост по лентам подписчиков."""
+    if created and settings.FOLLOW_FEED_FANOUT:
+        feeds.fanout_post(instance)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_followed_author(sender, instance, created, **kwargs):
+    """Дополняет ленту подписчика постами нового автора."""
+    if not (instance.user_id and instance.author_id):
+        return
+    if created and settings.FOLLOW_FEED_FANOUT:
+        feeds.mark_popular(instance.author_id)
+        feeds.backfill_feed(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_unfollowed_author(sender, instance, **kwargs):
+    """Убирает из ленты посты автора, от которого отписались."""
+    if settings.FOLLOW_FEED_FANOUT and instance.user_id:
+        feeds.prune_feed(instance.user_id, instance.author_id)
+
+
+def bump_post_feeds(*post_ids):
+    """Сбрасывает ленты, на которых показываются посты."""
+    feeds_list = []
+    posts = Post.objects.filter(pk__in=post_ids).values_list(
+        'author_id', 'group_id'
+    )
+    for author_id, group_id in posts:
+        feeds_list += post_feeds(author_id, group_id)
+    bump_feed_versions(*feeds_list)
+
+
+@receiver(pre_save, sender=Post)
+def remember_post_state(sender, instance, **kwargs):
+    """
+    Запоминает группу, картинку и текст поста до сохранения. Миниатюры
+    замененной картинки сбрасываются вместе с сохранением поста.
+    """
+    instance._old_group_id = None
+    old_image = old_text = None
+    if not instance._state.adding:
+        old_group_id, old_image, old_text = Post.objects.filter(
+            pk=instance.pk
+        ).values_list('group_id', 'image', 'text').first() or (
+            None, None, None
+        )
+        instance._old_group_id = old_group_id
+    instance._text_changed = instance.text != old_text
+    instance._image_changed = (instance.image.name or None) != (
+        old_image or None
+    )
+    if instance._image_changed:
+        instance.thumbnails = {}
+
+
+@receiver(post_save, sender=Post)
+def invalidate_saved_post(sender, instance, **kwargs):
+    """Новый или измененный пост меняет главную, профиль и группу."""
+    feeds_list = post_feeds(instance.author_id, instance.group_id)
+    old_group_id = getattr(instance, '_old_group_id', None)
+    if old_group_id is not None and old_group_id != instance.group_id:
+        feeds_list += post_feeds(instance.author_id, old_group_id)
+    bump_feed_versions(*feeds_list)
+
+
+@receiver(post_save, sender=Post)
+def generate_post_thumbnails(sender, instance, **kwargs):
+    """Новая картинка поста отправляется в пул генерации миниатюр."""
+    if getattr(instance, '_image_changed', False) and instance.image:
+        schedule_thumbnails(instance.pk)
+
+
+@receiver(post_save, sender=Post)
+def index_saved_post(sender, instance, created, **kwargs):
+    """Новый или измененный текст поста попадает в поисковый индекс."""
+    if getattr(instance, '_text_changed', True):
+        search.get_index().index_post(instance, created=created)
+
+
+@receiver(pre_delete, sender=Post)
+def remember_post_comments(sender, instance, **kwargs):
+    """
+    Комментарии удаляемого поста убираются из индекса одним запросом,
+    счетчики их авторов уменьшаются по одному запросу на величину.
+    """
+    comments = list(instance.comments.values_list('pk', 'author_id'))
+    instance._comment_ids = [pk for pk, _ in comments]
+    instance._comment_authors = Counter(
+        author_id for _, author_id in comments
+    )
+
+
+@receiver(post_delete, sender=Post)
+def unindex_deleted_post(sender, instance, **kwargs):
+    search.get_index().unindex_post(
+        instance.pk, getattr(instance, '_comment_ids', ())
+    )
+
+
+@receiver(post_save, sender=Comment)
+def index_saved_comment(sender, instance, created, **kwargs):
+    search.get_index().index_comment(instance, created=created)
+
+
+@receiver(post_delete, sender=Comment)
+def unindex_deleted_comment(sender, instance, **kwargs):
+    if not is_post_deleting(instance.post_id):
+        search.get_index().unindex_comment(instance.pk)
+
+
+@receiver(pre_delete, sender=Post)
+def start_post_delete(sender, instance, **kwargs):
+    """
+    Комментарии удаляемого поста удаляются каскадом: пересчитывать
+    счетчик и сбрасывать кеш для каждого из них не нужно.
+    """
+    if not hasattr(_deleting, 'posts'):
+        _deleting.posts = set()
+    _deleting.posts.add(instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+def invalidate_deleted_post(sender, instance, **kwargs):
+    getattr(_deleting, 'posts', set()).discard(instance.pk)
+    bump_feed_versions(*post_feeds(instance.author_id, instance.group_id))
+
+
+@receiver(post_save, sender=Comment)
+def invalidate_saved_comment(sender, instance, created, **kwargs):
+    """
+    Комментарии выводятся в карточках постов на всех лентах, их число -
+    в профиле автора комментария.
+    """
+    old_post_id = getattr(instance, '_old_post_id', None)
+    bump_post_feeds(instance.post_id, old_post_id)
+    if created:
+        bump_feed_versions(f'profile:{instance.author.username}')
+
+
+@receiver(post_delete, sender=Comment)
+def invalidate_deleted_comment(sender, instance, **kwargs):
+    if not is_post_deleting(instance.post_id):
+        bump_post_feeds(instance.post_id)
+        bump_feed_versions(f'profile:{instance.author.username}')
+
+
+@receiver(pre_save, sender=Group)
+def remember_group_slug(sender, instance, **kwargs):
+    """Запоминает адрес группы до сохранения."""
+    instance._old_slug = None
+    if not instance._state.adding:
+        instance._old_slug = Group.objects.filter(
+            pk=instance.pk
+        ).values_list('slug', flat=True).first()
+
+
+@receiver(post_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def touch_group_posts(sender, instance, **kwargs):
+    """
+    Название и адрес группы выводятся в карточках ее постов. При
+    удалении посты отмечаются до того, как у них обнулится группа.
+    """
+    Post.objects.filter(group=instance).update(updated=timezone.now())
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_group(sender, instance, **kwargs):
+    """Название группы выводится в карточках постов на главной."""
+    feeds_list = ['index', f'group:{instance.slug}']
+    old_slug = getattr(instance, '_old_slug', None)
+    if old_slug:
+        feeds_list.append(f'group:{old_slug}')
+    bump_feed_versions(*feeds_list)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow(sender, instance, **kwargs):
+    """
+    Подписка меняет ленту подписчика, кнопку и число подписчиков в
+    профиле автора и число подписок в профиле подписчика.
+    """
+    feeds_list = [f'follow:{instance.user_id}']
+    usernames = User.objects.filter(
+        pk__in=[instance.user_id, instance.author_id]
+    ).values_list('username', flat=True)
+    feeds_list += [f'profile:{username}' for username in usernames]
+    bump_feed_versions(*feeds_list)
+
+
+@receiver(pre_save, sender=User)
+def remember_user_names(sender, instance, update_fields=None, **kwargs):
+    """
+    Запоминает имя и логин пользователя до сохранения. Сохранения
+    других полей, например last_login при входе, не проверяются.
+    """
+    instance._old_card_fields = None
+    if instance._state.adding or (
+        update_fields is not None
+        and not set(update_fields) & set(USER_CARD_FIELDS)
+    ):
+        return
+    instance._old_card_fields = User.objects.filter(
+        pk=instance.pk
+    ).values_list(*USER_CARD_FIELDS).first()
+
+
+@receiver(post_save, sender=User)
+def touch_user_posts(sender, instance, **kwargs):
+    """
+    Имя и логин автора выводятся в карточках его постов, логин - еще
+    и в комментариях к чужим постам. Такие посты отмечаются
+    измененными, их ленты и ленты подписчиков их авторов сбрасываются.
+    """
+    old = getattr(instance, '_old_card_fields', None)
+    new = tuple(getattr(instance, field) for field in USER_CARD_FIELDS)
+    if old is None or old == new:
+        return
+    posts = Q(author=instance)
+    if old[0] != instance.username:
+        posts |= Q(comments__author=instance)
+    posts = list(Post.objects.filter(posts).values_list(
+        'pk', 'author_id'
+    ).distinct())
+    if not posts:
+        return
+    post_ids = [pk for pk, _ in posts]
+    touch_posts(*post_ids)
+    bump_post_feeds(*post_ids)
+    followers = Follow.objects.filter(
+        author_id__in={author_id for _, author_id in posts}
+    ).values_list('user_id', flat=True).distinct()
+    bump_feed_versions(
+        f'profile:{old[0]}', *(f'follow:{pk}' for pk in followers)
+    )
+
+
+@receiver(post_save, sender=User)
+def create_author_stats(sender, instance, created, raw=False, **kwargs):
+    """У нового пользователя все счетчики нулевые."""
+    if created and not raw:
+        AuthorStats.objects.create(user=instance)
+
+
+@receiver(post_save, sender=Post)
+def count_saved_post(sender, instance, created, **kwargs):
+    if created:
+        change_author_stats(instance.author_id, 'posts_count', 1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    """Пост удаляется вместе с комментариями других авторов."""
+    change_author_stats(instance.author_id, 'posts_count', -1)
+    authors = defaultdict(list)
+    for author_id, count in getattr(
+        instance, '_comment_authors', {}
+    ).items():
+        authors[count].append(author_id)
+    for count, author_ids in authors.items():
+        change_author_stats(author_ids, 'comments_count', -count)
+
+
+@receiver(post_save, sender=Comment)
+def count_comment_author(sender, instance, created, **kwargs):
+    if created:
+        change_author_stats(instance.author_id, 'comments_count', 1)
+
+
+@receiver(post_delete, sender=Comment)
+def uncount_comment_author(sender, instance, **kwargs):
+    if not is_post_deleting(instance.post_id):
+        change_author_stats(instance.author_id, 'comments_count', -1)
+
+
+@receiver(post_save, sender=Follow)
+def count_saved_follow(sender, instance, created, **kwargs):
+    if created:
+        change_author_stats(instance.author_id, 'followers_count', 1)
+        change_author_stats(instance.user_id, 'following_count', 1)
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    change_author_stats(instance.author_id, 'followers_count', -1)
+    change_author_stats(instance.user_id, 'following_count', -1)
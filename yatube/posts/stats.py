@@ -0,0 +1,92 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import AuthorStats, Comment, Follow, Post, User
+
+# Счетчик -> (модель, поле с пользователем)
+COUNTERS = {
+    'posts_count': (Post, 'author'),
+    'comments_count': (Comment, 'author'),
+    'followers_count': (Follow, 'author'),
+    'following_count': (Follow, 'user'),
+}
+
+
+def change_author_stats(user_ids, field, delta):
+    """
+    Атомарно меняет счетчик пользователя или списка пользователей на
+    delta. Если записи еще нет, она будет посчитана при первом чтении.
+    """
+    if not isinstance(user_ids, list):
+        user_ids = [user_ids]
+    user_ids = [pk for pk in user_ids if pk is not None]
+    if not user_ids:
+        return
+    stats = AuthorStats.objects.filter(pk__in=user_ids)
+    if delta < 0:
+        stats = stats.filter(**{f'{field}__gte': -delta})
+    stats.update(**{field: F(field) + delta})
+
+
+def count_author_stats(user_id):
+    """Точные значения счетчиков пользователя."""
+    return {
+        field: model.objects.filter(**{f'{user_field}_id': user_id}).count()
+        for field, (model, user_field) in COUNTERS.items()
+    }
+
+
+def get_author_stats(user):
+    """
+    Счетчики пользователя одной строкой. Прочитанная через
+    select_related('stats') запись не требует запросов.
+    """
+    try:
+        return user.stats
+    except AuthorStats.DoesNotExist:
+        pass
+    stats = AuthorStats(user=user, **count_author_stats(user.pk))
+    try:
+        with transaction.atomic():
+            stats.save(force_insert=True)
+    except IntegrityError:
+        # Запись создана параллельным запросом
+        stats = AuthorStats.objects.get(pk=user.pk)
+    user.stats = stats
+    return stats
+
+
+def counted(field):
+    """Подзапрос с точным значением счетчика для строки AuthorStats."""
+    model, user_field = COUNTERS[field]
+    return Coalesce(Subquery(
+        model.objects.filter(
+            **{user_field: OuterRef('pk')}
+        ).order_by().values(user_field).annotate(
+            total=Count('pk')
+        ).values('total')
+    ), 0)
+
+
+def reconcile_author_stats(batch_size=1000):
+    """
+    Создает недостающие записи, сверяет все записи с точными значениями
+    и исправляет расхождения. Возвращает число созданных и исправленных.
+    """
+    missing = User.objects.filter(stats__isnull=True).values_list(
+        'pk', flat=True
+    )
+    AuthorStats.objects.bulk_create(
+        (AuthorStats(user_id=pk) for pk in missing.iterator()),
+        batch_size=batch_size, ignore_conflicts=True
+    )
+    stats = AuthorStats.objects.annotate(**{
+        f'real_{field}': counted(field) for field in COUNTERS
+    })
+    drifted = stats.filter(Q(*(
+        ~Q(**{field: F(f'real_{field}')}) for field in COUNTERS
+    ), _connector=Q.OR))
+    return AuthorStats.objects.filter(
+        pk__in=drifted.values('pk')
+    ).update(**{field: counted(field) for field in COUNTERS})
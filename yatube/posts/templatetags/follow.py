@@ -0,0 +1,14 @@
+from django import template
+
+from ..models import Follow
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def is_following(context, author_id):
+    """Подписан ли текущий пользователь на автора."""
+    user = context['user']
+    return user.is_authenticated and Follow.objects.filter(
+        user=user, author_id=author_id
+    ).exists()
@@ -0,0 +1,102 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Group, Post
+
+User = get_user_model()
+
+
+class PostsAdminTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            username='Admin', email='admin@example.com', password='pass'
+        )
+        cls.author = User.objects.create_user(username='Author')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        cls.post = Post.objects.create(
+            author=cls.author, text='Пост о садовых цветах', group=cls.group
+        )
+        cls.comment = Comment.objects.create(
+            author=cls.admin, post=cls.post, text='Красивые розы'
+        )
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(PostsAdminTests.admin)
+
+    def changelist(self, model, params=None):
+        return self.client.get(
+            reverse(f'admin:posts_{model}_changelist'), params or {}
+        )
+
+    def test_posts_admin_changelist_queries_do_not_grow(self):
+        """
+        [!] Число запросов списка не зависит от числа строк.
+        """
+        for model in ('post', 'comment', 'follow'):
+            with self.subTest(model=model):
+                self.changelist(model)
+                with CaptureQueriesContext(connection) as few:
+                    self.changelist(model)
+                User.objects.bulk_create(
+                    User(username=f'{model}{i}') for i in range(3)
+                )
+                users = User.objects.filter(username__startswith=model)
+                for user in users:
+                    post = Post.objects.create(
+                        author=user, text='Текст', group=self.group
+                    )
+                    Comment.objects.create(
+                        author=user, post=post, text='Текст'
+                    )
+                    user.follower.create(author=PostsAdminTests.author)
+                with CaptureQueriesContext(connection) as many:
+                    self.changelist(model)
+                self.assertEqual(len(few), len(many))
+
+    def test_posts_admin_author_filter(self):
+        """
+        [!] Фильтр по автору - поле ввода имени, а не список.
+        """
+        response = self.changelist('comment', {'author': 'Admin'})
+        self.assertEqual(
+            list(response.context['cl'].result_list),
+            [PostsAdminTests.comment]
+        )
+        self.assertContains(response, 'name="author"')
+        response = self.changelist('post', {'author': 'Admin'})
+        self.assertEqual(list(response.context['cl'].result_list), [])
+
+    def test_posts_admin_comment_search(self):
+        """
+        [!] Комментарии ищутся по автору, своему тексту и тексту поста.
+        """
+        for term in ('Admin', 'роза', 'цветы'):
+            with self.subTest(term=term):
+                response = self.changelist('comment', {'q': term})
+                self.assertEqual(
+                    list(response.context['cl'].result_list),
+                    [PostsAdminTests.comment]
+                )
+        response = self.changelist('comment', {'q': 'Author'})
+        self.assertEqual(list(response.context['cl'].result_list), [])
+
+    @override_settings(ADMIN_EXACT_COUNT_LIMIT=0)
+    def test_posts_admin_estimated_count(self):
+        """
+        [!] Для большой таблицы без фильтров нет COUNT(*).
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.changelist('comment')
+        self.assertFalse(
+            [q for q in queries if 'COUNT(*)' in q['sql']
+             and '"posts_comment"' in q['sql']]
+        )
+        self.assertEqual(
+            response.context['cl'].result_count,
+            Comment.objects.order_by('-pk').first().pk
+        )
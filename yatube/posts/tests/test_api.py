@@ -0,0 +1,139 @@
+from http import HTTPStatus
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class PostsApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='Author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='testslug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.author,
+            text='Тестовый пост',
+            group=cls.group,
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(PostsApiTests.author)
+
+    def test_posts_api_feeds(self):
+        """
+        [!] Ленты отдаются в JSON с выбранными полями.
+        """
+        Follow.objects.create(
+            user=User.objects.create_user(username='Reader'),
+            author=PostsApiTests.author,
+        )
+        self.authorized_client.force_login(
+            User.objects.get(username='Reader')
+        )
+        urls = (
+            reverse('api:index'),
+            reverse('api:group_list', kwargs={'slug': 'testslug'}),
+            reverse('api:profile', kwargs={'username': 'Author'}),
+            reverse('api:follow_index'),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.authorized_client.get(
+                    url, {'fields': 'id,text,author,group'}
+                )
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                self.assertEqual(response.json()['results'], [{
+                    'id': PostsApiTests.post.pk,
+                    'text': 'Тестовый пост',
+                    'author': 'Author',
+                    'group': 'testslug',
+                }])
+                self.assertTrue(response.has_header('ETag'))
+                self.assertTrue(response.has_header('Last-Modified'))
+
+    def test_posts_api_unknown_fields_and_auth(self):
+        """
+        [!] Неизвестные поля дают 400, лента подписок гостю - 401.
+        """
+        response = self.guest_client.get(
+            reverse('api:index'), {'fields': 'id,password'}
+        )
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        response = self.guest_client.get(reverse('api:follow_index'))
+        self.assertEqual(response.status_code, HTTPStatus.UNAUTHORIZED)
+
+    @override_settings(POSTS_PER_PAGE=2)
+    def test_posts_api_cursor_paging(self):
+        """
+        [!] Ссылки next ведут по всей ленте с сохранением полей.
+        """
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=PostsApiTests.author)
+            for i in range(4)
+        )
+        url = reverse('api:index') + '?fields=id'
+        seen = []
+        while url:
+            data = self.guest_client.get(url).json()
+            self.assertTrue(all(set(row) == {'id'} for row in data['results']))
+            seen += [row['id'] for row in data['results']]
+            url = data['next']
+        self.assertEqual(
+            seen,
+            list(Post.objects.values_list('pk', flat=True))
+        )
+
+    def test_posts_api_feed_not_modified(self):
+        """
+        [!] Неизменившаяся лента отвечает 304 без запросов к базе.
+        """
+        url = reverse('api:index')
+        response = self.guest_client.get(url)
+        etag = response['ETag']
+        with self.assertNumQueries(0):
+            response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        Post.objects.create(text='Новый пост', author=PostsApiTests.author)
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_posts_api_post_detail_not_modified(self):
+        """
+        [!] Пост с комментариями отвечает 304, пока не изменился.
+        """
+        url = reverse(
+            'api:post_detail', kwargs={'post_id': PostsApiTests.post.pk}
+        )
+        response = self.guest_client.get(url)
+        self.assertEqual(response.json()['comments']['results'], [])
+        etag = response['ETag']
+        with self.assertNumQueries(1):
+            response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        Comment.objects.create(
+            text='Комментарий',
+            post=PostsApiTests.post,
+            author=PostsApiTests.author,
+        )
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(
+            response.json()['comments']['results'][0]['text'], 'Комментарий'
+        )
+        response = self.guest_client.get(
+            reverse('api:post_detail', kwargs={'post_id': 0})
+        )
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
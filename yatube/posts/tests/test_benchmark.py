@@ -0,0 +1,118 @@
+import json
+import shutil
+import tempfile
+import threading
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.db.models import Count
+from django.test import TestCase, override_settings
+
+from ..benchmark import REQUEST_MIX, Workload, compare, percentile, run
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class PostsBenchmarkTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command(
+            'seed_benchmark', '--users', '20', '--groups', '3',
+            '--posts', '200', '--comments', '300', '--follows', '5',
+            '--images', '0.5', stdout=StringIO()
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_posts_benchmark_seed(self):
+        """
+        [!] Данные создаются в заданном объеме со степенным распределением.
+        """
+        self.assertEqual(User.objects.count(), 20)
+        self.assertEqual(Group.objects.count(), 3)
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertEqual(Comment.objects.count(), 300)
+        self.assertTrue(Follow.objects.exists())
+        with_images = Post.objects.exclude(image='')
+        self.assertTrue(0 < with_images.count() < 200)
+        self.assertFalse(with_images.filter(thumbnails={}).exists())
+        self.assertEqual(
+            Post.objects.filter(comments_count__gt=0).count(),
+            Comment.objects.values('post').distinct().count()
+        )
+        authors = User.objects.annotate(
+            total=Count('posts')
+        ).order_by('-total')
+        self.assertEqual(authors[0].username, 'user1')
+
+    def test_posts_benchmark_report(self):
+        """
+        [!] bench выводит JSON со временем и числом запросов к базе.
+        """
+        posts = Post.objects.count()
+        out = StringIO()
+        call_command(
+            'bench', '--requests', '40', '--warmup', '5', stdout=out
+        )
+        report = json.loads(out.getvalue())
+        total = report['total']
+        self.assertEqual(total['requests'], 40)
+        for key in ('rps', 'p50_ms', 'p95_ms', 'p99_ms', 'queries_avg'):
+            self.assertIsNotNone(total[key], key)
+        self.assertLessEqual(total['p50_ms'], total['p99_ms'])
+        self.assertLessEqual(set(report['views']), set(REQUEST_MIX))
+        self.assertEqual(report['errors'], {})
+        self.assertEqual(Post.objects.count(), posts)
+
+    def test_posts_benchmark_percentile(self):
+        """
+        [!] Процентиль считается по ближайшему рангу.
+        """
+        timings = list(range(1, 101))
+        self.assertEqual(percentile(timings, 50), 50)
+        self.assertEqual(percentile(timings, 99), 99)
+        self.assertEqual(percentile([7], 95), 7)
+        self.assertIsNone(percentile([], 95))
+
+    def test_posts_benchmark_concurrency(self):
+        """
+        [!] При concurrency запросы идут из нескольких потоков.
+        """
+        threads = set()
+
+        def runner(method, url, data):
+            threads.add(threading.get_ident())
+            return 200, 1.0, None
+
+        workload = Workload(User.objects.first())
+        report = run(runner, workload, 40, concurrency=4)
+        self.assertEqual(report['total']['requests'], 40)
+        self.assertNotIn(threading.get_ident(), threads)
+        with self.assertRaises(CommandError):
+            call_command('bench', '--concurrency', '4', stdout=StringIO())
+
+    def test_posts_benchmark_compare(self):
+        """
+        [!] Сравнение серверов считает rps и p95 относительно первого.
+        """
+        reports = {
+            'wsgi': {'total': {'rps': 100.0, 'p95_ms': 40.0}},
+            'asgi': {'total': {'rps': 150.0, 'p95_ms': 30.0}},
+        }
+        self.assertEqual(compare(reports), {
+            'wsgi': {'rps': 1.0, 'p95_ms': 1.0},
+            'asgi': {'rps': 1.5, 'p95_ms': 0.75},
+        })
+        with self.assertRaises(CommandError):
+            call_command(
+                'bench', '--compare', 'http://127.0.0.1:8001',
+                stdout=StringIO()
+            )
@@ -0,0 +1,138 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import FeedEntry, Follow, PopularAuthor, Post
+
+User = get_user_model()
+
+
+@override_settings(FOLLOW_FEED_FANOUT=True, FOLLOW_FEED_MAX_LENGTH=5,
+                   FOLLOW_FEED_FANOUT_MAX_FOLLOWERS=2)
+class PostsFollowFeedFanoutTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.author = User.objects.create_user(username='Author')
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(PostsFollowFeedFanoutTests.reader)
+        cache.clear()
+
+    def follow(self, author, user=None):
+        return Follow.objects.create(
+            user=user or PostsFollowFeedFanoutTests.reader, author=author
+        )
+
+    def feed(self, cursor=None):
+        response = self.client.get(
+            reverse('posts:follow_index'),
+            {'cursor': cursor} if cursor else {}
+        )
+        return response.context['page_obj']
+
+    def test_posts_feeds_new_post_is_fanned_out(self):
+        """
+        [!] Новый пост попадает в ленты подписчиков.
+        """
+        self.follow(PostsFollowFeedFanoutTests.author)
+        post = Post.objects.create(
+            author=PostsFollowFeedFanoutTests.author, text='Пост')
+        self.assertTrue(FeedEntry.objects.filter(
+            user=PostsFollowFeedFanoutTests.reader, post=post).exists())
+        self.assertEqual(list(self.feed()), [post])
+
+    def test_posts_feeds_length_is_capped(self):
+        """
+        [!] Рассылка обрезает ленты до FOLLOW_FEED_MAX_LENGTH записей,
+        чтение ленты ничего не удаляет.
+        """
+        self.follow(PostsFollowFeedFanoutTests.author)
+        self.follow(
+            PostsFollowFeedFanoutTests.author,
+            User.objects.create_user(username='Another')
+        )
+        with self.settings(FOLLOW_FEED_BATCH_SIZE=1):
+            posts = [
+                Post.objects.create(
+                    author=PostsFollowFeedFanoutTests.author,
+                    text=f'Пост {i}'
+                )
+                for i in range(8)
+            ]
+        self.assertEqual(FeedEntry.objects.count(), 10)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(list(self.feed()), posts[::-1][:5])
+        self.assertFalse(
+            [q for q in queries if q['sql'].startswith('DELETE')]
+        )
+        with self.settings(FOLLOW_FEED_MAX_LENGTH=3):
+            out = StringIO()
+            call_command('trim_follow_feeds', stdout=out)
+        self.assertIn('Обрезано лент: 2', out.getvalue())
+        self.assertEqual(FeedEntry.objects.count(), 6)
+
+    def test_posts_feeds_follow_backfills_and_unfollow_prunes(self):
+        """
+        [!] Подписка дополняет ленту, отписка очищает ее от постов автора.
+        """
+        posts = [
+            Post.objects.create(
+                author=PostsFollowFeedFanoutTests.author, text=f'Пост {i}')
+            for i in range(7)
+        ]
+        follow = self.follow(PostsFollowFeedFanoutTests.author)
+        self.assertEqual(list(self.feed()), posts[::-1][:5])
+        follow.delete()
+        self.assertFalse(FeedEntry.objects.exists())
+        self.assertEqual(list(self.feed()), [])
+
+    def test_posts_feeds_popular_author_read_on_the_fly(self):
+        """
+        [!] Посты популярного автора подмешиваются при чтении ленты.
+        """
+        other = User.objects.create_user(username='Other')
+        self.follow(other)
+        self.follow(PostsFollowFeedFanoutTests.author)
+        for i in range(2):
+            self.follow(
+                PostsFollowFeedFanoutTests.author,
+                User.objects.create_user(username=f'Fan{i}')
+            )
+        self.assertTrue(PopularAuthor.objects.filter(
+            author=PostsFollowFeedFanoutTests.author).exists())
+        for i in range(4):
+            Post.objects.create(author=other, text=f'Пост {i}')
+            Post.objects.create(
+                author=PostsFollowFeedFanoutTests.author, text=f'Пост {i}')
+        self.assertFalse(FeedEntry.objects.filter(
+            author=PostsFollowFeedFanoutTests.author).exists())
+        with self.settings(POSTS_PER_PAGE=3):
+            seen, cursor = [], None
+            while True:
+                page_obj = self.feed(cursor)
+                seen += list(page_obj)
+                if not page_obj.has_next():
+                    break
+                cursor = page_obj.next_cursor
+        self.assertEqual(seen, list(Post.objects.order_by('-pub_date')))
+
+    def test_posts_feeds_rebuild_command(self):
+        """
+        [!] Команда rebuild_follow_feeds восстанавливает ленты.
+        """
+        post = Post.objects.create(
+            author=PostsFollowFeedFanoutTests.author, text='Пост')
+        with self.settings(FOLLOW_FEED_FANOUT=False):
+            self.follow(PostsFollowFeedFanoutTests.author)
+        self.assertFalse(FeedEntry.objects.exists())
+        call_command('rebuild_follow_feeds', stdout=StringIO())
+        self.assertEqual(list(self.feed()), [post])
@@ -1,7 +1,10 @@
+from io import StringIO
+
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.management import call_command
+from django.test import TestCase, override_settings
 
-from ..models import Group, Post
+from ..models import Comment, Group, Post
 
 User = get_user_model()
 
@@ -70,3 +73,104 @@ class PostsModelTest(TestCase):
                     PostsModelTest.post._meta.get_field(value).help_text,
                     expected
                 )
+
+
+class PostsCommentsCountTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    def setUp(self):
+        self.post = Post.objects.create(author=self.user, text='Пост')
+        self.other_post = Post.objects.create(author=self.user, text='Пост')
+
+    def count(self, post):
+        post.refresh_from_db(fields=['comments_count'])
+        return post.comments_count
+
+    def test_posts_models_comments_count_on_create_and_delete(self):
+        """
+        [!] Счетчик комментариев меняется при добавлении и удалении.
+        """
+        comment = Comment.objects.create(
+            post=self.post, author=self.user, text='Комментарий')
+        Comment.objects.create(
+            post=self.post, author=self.user, text='Комментарий')
+        self.assertEqual(self.count(self.post), 2)
+        comment.delete()
+        self.assertEqual(self.count(self.post), 1)
+        Comment.objects.all().delete()
+        self.assertEqual(self.count(self.post), 0)
+
+    def test_posts_models_comments_count_on_post_change(self):
+        """
+        [!] Перенос комментария в другой пост обновляет оба счетчика.
+        """
+        comment = Comment.objects.create(
+            post=self.post, author=self.user, text='Комментарий')
+        comment.post = self.other_post
+        comment.save()
+        self.assertEqual(self.count(self.post), 0)
+        self.assertEqual(self.count(self.other_post), 1)
+
+    def test_posts_models_recount_comments_command(self):
+        """
+        [!] Команда recount_comments восстанавливает счетчики.
+        """
+        Comment.objects.bulk_create(
+            Comment(post=self.post, author=self.user, text='Комментарий')
+            for _ in range(3)
+        )
+        Post.objects.update(comments_count=0)
+        call_command('recount_comments', stdout=StringIO())
+        self.assertEqual(self.count(self.post), 3)
+        self.assertEqual(self.count(self.other_post), 0)
+
+
+@override_settings(EXCERPT_LENGTH=20)
+class PostsRenderedTextTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='auth')
+
+    def test_posts_models_text_rendered_on_save(self):
+        """
+        [!] HTML текста и его начала сохраняются вместе с текстом.
+        """
+        post = Post.objects.create(author=self.user, text='<b>Коротко</b>')
+        self.assertEqual(post.text_html, '<p>&lt;b&gt;Коротко&lt;/b&gt;</p>')
+        self.assertEqual(post.excerpt, '')
+        post.text = 'Первый абзац\n\nВторой абзац длинного поста'
+        post.save(update_fields=['text'])
+        post.refresh_from_db()
+        self.assertEqual(
+            post.text_html, '<p>Первый абзац</p>\n\n<p>Второй абзац '
+            'длинного поста</p>'
+        )
+        self.assertEqual(post.excerpt, '<p>Первый абзац</p>\n\n<p>Второ…</p>')
+        comment = Comment.objects.create(
+            author=self.user, post=post, text='Комментарий'
+        )
+        self.assertEqual(comment.text_html, '<p>Комментарий</p>')
+
+    def test_posts_models_render_texts_command(self):
+        """
+        [!] Команда заполняет HTML записей, созданных в обход save().
+        """
+        post = Post.objects.create(author=self.user, text='Пост')
+        Comment.objects.bulk_create(
+            Comment(author=self.user, post=post, text=f'Комментарий {i}')
+            for i in range(3)
+        )
+        Post.objects.update(text_html='')
+        out = StringIO()
+        call_command('render_texts', stdout=out)
+        self.assertIn('Комментарии: 3', out.getvalue())
+        self.assertEqual(
+            Post.objects.get(pk=post.pk).text_html, '<p>Пост</p>'
+        )
+        self.assertEqual(
+            set(Comment.objects.values_list('text_html', flat=True)),
+            {f'<p>Комментарий {i}</p>' for i in range(3)}
+        )
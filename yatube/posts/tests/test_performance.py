@@ -0,0 +1,209 @@
+import json
+import math
+import os
+import time
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.queries import QueryInspector
+
+from .. import urls
+from ..benchmark import seed
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+# Бюджеты view: (число SQL-запросов, p95 времени ответа в мс).
+# Время умножается на PERF_LATENCY_FACTOR из окружения для медленных машин.
+BUDGETS = {
+    'index': (5, 150),
+    'post_detail': (9, 150),
+    'post_comments': (5, 100),
+    'group_list': (6, 150),
+    'profile': (8, 150),
+    'post_create': (9, 150),
+    'post_edit': (15, 150),
+    'post_delete': (18, 150),
+    'follow_index': (5, 150),
+    'search': (6, 150),
+    'profile_follow': (8, 100),
+    'profile_unfollow': (9, 100),
+    'add_comment': (12, 100),
+    'comment_delete': (14, 100),
+}
+
+
+class PostsPerformanceTests(TestCase):
+    """
+    Бюджеты запросов и времени ответа всех страниц posts.urls.
+
+    Отчет в JSON пишется в файл из переменной окружения PERF_REPORT.
+    """
+
+    USERS = 100
+    GROUPS = 10
+    POSTS = 2000
+    COMMENTS = 10000
+    FOLLOWS = 20
+    SAMPLES = 20
+
+    @classmethod
+    def setUpTestData(cls):
+        seed(
+            users=cls.USERS, groups=cls.GROUPS, posts=cls.POSTS,
+            comments=cls.COMMENTS, follows=cls.FOLLOWS,
+        )
+        users = list(User.objects.order_by('pk'))
+        groups = list(Group.objects.order_by('pk'))
+        call_command('recount_comments', stdout=StringIO())
+        call_command('recount_author_stats', stdout=StringIO())
+        call_command('render_texts', stdout=StringIO())
+        call_command('rebuild_search_index', stdout=StringIO())
+        cls.user = users[0]
+        cls.other = next(
+            user for user in users
+            if not Follow.objects.filter(user=cls.user, author=user).exists()
+            and user != cls.user
+        )
+        cls.followed = Follow.objects.filter(user=cls.user).first().author
+        cls.group = groups[0]
+        cls.post = Post.objects.filter(author=cls.user).order_by(
+            '-comments_count'
+        ).first()
+        cls.comment = Comment.objects.filter(author=cls.user).first()
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(PostsPerformanceTests.user)
+
+    def scenarios(self):
+        """Запрос к каждому адресу: имя -> (метод, адрес, данные)."""
+        cls = PostsPerformanceTests
+        return {
+            'index': ('get', reverse('posts:index'), None),
+            'post_detail': ('get', reverse(
+                'posts:post_detail', kwargs={'post_id': cls.post.pk}
+            ), None),
+            'post_comments': ('get', reverse(
+                'posts:post_comments', kwargs={'post_id': cls.post.pk}
+            ), None),
+            'group_list': ('get', reverse(
+                'posts:group_list', kwargs={'slug': cls.group.slug}
+            ), None),
+            'profile': ('get', reverse(
+                'posts:profile', kwargs={'username': cls.followed.username}
+            ), None),
+            'post_create': ('post', reverse('posts:post_create'), {
+                'text': 'Новый пост', 'group': cls.group.pk,
+            }),
+            'post_edit': ('post', reverse(
+                'posts:post_edit', kwargs={'post_id': cls.post.pk}
+            ), {'text': 'Измененный пост', 'group': cls.group.pk}),
+            'post_delete': ('get', reverse(
+                'posts:post_delete', kwargs={'post_id': cls.post.pk}
+            ), None),
+            'follow_index': ('get', reverse('posts:follow_index'), None),
+            'search': ('get', reverse('posts:search'), {
+                'q': cls.post.text.split()[0],
+            }),
+            'profile_follow': ('get', reverse(
+                'posts:profile_follow',
+                kwargs={'username': cls.other.username}
+            ), None),
+            'profile_unfollow': ('get', reverse(
+                'posts:profile_unfollow',
+                kwargs={'username': cls.followed.username}
+            ), None),
+            'add_comment': ('post', reverse(
+                'posts:add_comment', kwargs={'post_id': cls.post.pk}
+            ), {'text': 'Новый комментарий'}),
+            'comment_delete': ('get', reverse(
+                'posts:comment_delete', kwargs={
+                    'post_id': cls.comment.post_id,
+                    'comment_id': cls.comment.pk,
+                }
+            ), None),
+        }
+
+    def measure(self, method, url, data):
+        """
+        Выполняет запрос SAMPLES раз без кеша страниц и откатывает
+        изменения после каждого раза. Возвращает число запросов и p95.
+        """
+        timings = []
+        queries = 0
+        for _ in range(self.SAMPLES + 1):
+            cache.clear()
+            with transaction.atomic():
+                with CaptureQueriesContext(connection) as captured:
+                    start = time.perf_counter()
+                    response = getattr(self.client, method)(url, data)
+                    elapsed = time.perf_counter() - start
+                transaction.set_rollback(True)
+            self.assertLess(response.status_code, 400, url)
+            timings.append(elapsed * 1000)
+            queries = max(queries, len(captured))
+        # Первый запрос прогревает шаблоны и не учитывается
+        timings = sorted(timings[1:])
+        p95 = timings[math.ceil(0.95 * len(timings)) - 1]
+        return queries, round(p95, 1)
+
+    def test_posts_performance_budgets_cover_all_urls(self):
+        """
+        [!] Бюджет задан для каждого адреса posts.urls.
+        """
+        names = {pattern.name for pattern in urls.urlpatterns}
+        self.assertEqual(names, set(BUDGETS))
+        self.assertEqual(names, set(self.scenarios()))
+
+    def test_posts_performance_budgets(self):
+        """
+        [!] Страницы укладываются в бюджет запросов и времени ответа.
+        """
+        factor = float(os.environ.get('PERF_LATENCY_FACTOR', 1))
+        report = {}
+        for name, (method, url, data) in self.scenarios().items():
+            queries, p95 = self.measure(method, url, data)
+            max_queries, max_p95 = BUDGETS[name]
+            report[name] = {
+                'url': url,
+                'queries': queries,
+                'max_queries': max_queries,
+                'p95_ms': p95,
+                'max_p95_ms': max_p95 * factor,
+            }
+        path = os.environ.get('PERF_REPORT')
+        if path:
+            with open(path, 'w', encoding='utf-8') as report_file:
+                json.dump(report, report_file, indent=2, ensure_ascii=False)
+        over_budget = {
+            name: result for name, result in report.items()
+            if result['queries'] > result['max_queries']
+            or result['p95_ms'] > result['max_p95_ms']
+        }
+        self.assertEqual(
+            over_budget, {},
+            'Превышены бюджеты:\n' + json.dumps(
+                over_budget, indent=2, ensure_ascii=False
+            )
+        )
+
+    def test_posts_performance_no_repeated_queries(self):
+        """
+        [!] Ни одна страница не повторяет запрос одной формы (N+1).
+        """
+        for name, (method, url, data) in self.scenarios().items():
+            with self.subTest(name=name):
+                cache.clear()
+                with transaction.atomic():
+                    with QueryInspector() as inspector:
+                        getattr(self.client, method)(url, data)
+                    transaction.set_rollback(True)
+                self.assertEqual(inspector.repeated(), {})
@@ -0,0 +1,128 @@
+import random
+from io import StringIO
+from unittest import SkipTest
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class PostsQueryPlansTests(TestCase):
+    """Запросы лент не должны читать таблицы целиком и сортировать."""
+
+    USERS = 50
+    POSTS = 3000
+    COMMENTS = 3000
+
+    @classmethod
+    def setUpClass(cls):
+        if connection.vendor != 'sqlite':
+            raise SkipTest('План запроса проверяется для SQLite')
+        super().setUpClass()
+        rnd = random.Random(0)
+        User.objects.bulk_create(
+            User(username=f'user{i}') for i in range(cls.USERS)
+        )
+        users = list(User.objects.order_by('pk'))
+        Group.objects.bulk_create(
+            Group(title=f'Группа {i}', slug=f'group{i}') for i in range(5)
+        )
+        groups = list(Group.objects.order_by('pk'))
+        Post.objects.bulk_create(
+            Post(
+                text=f'Пост {i}',
+                author=rnd.choice(users),
+                group=rnd.choice(groups + [None]),
+            ) for i in range(cls.POSTS)
+        )
+        posts = list(Post.objects.all())
+        Comment.objects.bulk_create(
+            Comment(
+                text=f'Комментарий {i}',
+                post=rnd.choice(posts),
+                author=rnd.choice(users),
+            ) for i in range(cls.COMMENTS)
+        )
+        cls.user = users[0]
+        Follow.objects.bulk_create(
+            Follow(user=user, author=author)
+            for user in users
+            for author in rnd.sample(users, 10) if author != user
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        cls.group = groups[0]
+        cls.author = users[1]
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(PostsQueryPlansTests.user)
+        cache.clear()
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return [row[-1] for row in cursor.fetchall()]
+
+    def feed_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        page_obj = response.context.get('page_obj')
+        urls = [url]
+        if page_obj is not None and page_obj.has_next():
+            urls.append(f'{url}?cursor={page_obj.next_cursor}')
+            urls.append(f'{url}?cursor={page_obj.last_cursor}')
+        sql = [query['sql'] for query in queries]
+        for extra_url in urls[1:]:
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(extra_url)
+            sql += [query['sql'] for query in queries]
+        return [
+            query for query in sql
+            if query.startswith('SELECT') and '"posts_' in query
+        ]
+
+    def test_posts_feed_queries_use_indexes(self):
+        """
+        [!] Запросы лент используют индексы без полного сканирования.
+        """
+        feeds = (
+            ('posts:index', {}),
+            ('posts:group_list',
+             {'slug': PostsQueryPlansTests.group.slug}),
+            ('posts:profile',
+             {'username': PostsQueryPlansTests.author.username}),
+            ('posts:follow_index', {}),
+            ('posts:post_detail',
+             {'post_id': Comment.objects.first().post_id}),
+        )
+        self.assert_feeds_use_indexes(feeds)
+
+    def test_posts_fanout_follow_feed_uses_indexes(self):
+        """
+        [!] Лента подписок в режиме рассылки читается по индексу.
+        """
+        with self.settings(FOLLOW_FEED_FANOUT=True):
+            call_command('rebuild_follow_feeds', stdout=StringIO())
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+            self.assert_feeds_use_indexes((('posts:follow_index', {}),))
+
+    def assert_feeds_use_indexes(self, feeds):
+        for name, kwargs in feeds:
+            url = reverse(name, kwargs=kwargs)
+            for sql in self.feed_queries(url):
+                plan = self.explain(sql)
+                with self.subTest(url=url, sql=sql, plan=plan):
+                    for step in plan:
+                        self.assertNotIn('TEMP B-TREE', step)
+                        if step.startswith('SCAN'):
+                            self.assertIn('INDEX', step)
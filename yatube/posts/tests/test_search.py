@@ -0,0 +1,133 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Comment, Post
+from ..search import TermIndex, search_post_ids, stem
+
+User = get_user_model()
+
+
+class PostsSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='Author')
+        cls.admin = User.objects.create_superuser(
+            username='Admin', email='admin@example.com', password='pass'
+        )
+        cls.books = Post.objects.create(
+            author=cls.author, text='Читаю интересные книги о котах',
+        )
+        cls.dogs = Post.objects.create(
+            author=cls.author, text='Собака гуляет в парке',
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_posts_search_stem(self):
+        """
+        [!] Разные формы слова сводятся к одной основе.
+        """
+        for words in (
+            ('книга', 'книги', 'книгами'),
+            ('кот', 'котами', 'коты'),
+            ('новость', 'новости', 'Новостями'),
+            ('ёлка', 'елки'),
+        ):
+            with self.subTest(words=words):
+                self.assertEqual(len({stem(word) for word in words}), 1)
+        self.assertEqual(stem('Python'), 'python')
+
+    def test_posts_search_index_follows_changes(self):
+        """
+        [!] Индекс обновляется при создании, правке и удалении.
+        """
+        self.assertEqual(search_post_ids('книгами', 10), [self.books.pk])
+        self.assertEqual(search_post_ids('книга собака', 10), [])
+        post = self.dogs
+        post.text = 'Кошка спит'
+        post.save()
+        self.assertEqual(search_post_ids('собака', 10), [])
+        self.assertEqual(search_post_ids('кошки', 10), [post.pk])
+        comment = Comment.objects.create(
+            text='Моя собака любит книги', post=post,
+            author=PostsSearchTests.author,
+        )
+        self.assertEqual(search_post_ids('собаки', 10), [post.pk])
+        self.assertEqual(
+            search_post_ids('книги', 10), [self.books.pk, post.pk]
+        )
+        comment.delete()
+        self.assertEqual(search_post_ids('собака', 10), [])
+        Comment.objects.create(
+            text='Отличная подборка', post=self.books,
+            author=PostsSearchTests.author,
+        )
+        self.books.delete()
+        self.assertEqual(search_post_ids('книги', 10), [])
+        self.assertEqual(search_post_ids('подборка', 10), [])
+
+    def test_posts_search_term_index(self):
+        """
+        [!] Переносимый индекс ищет и ранжирует так же, как FTS5.
+        """
+        index = TermIndex()
+        for post in Post.objects.all():
+            index.index_post(post)
+        comment = Comment.objects.create(
+            text='Хочу такую же собаку', post=self.books,
+            author=PostsSearchTests.author,
+        )
+        index.index_comment(comment)
+        self.assertEqual(
+            index.search([stem('собаки')], 10),
+            [self.dogs.pk, self.books.pk]
+        )
+        self.assertEqual(
+            index.search([stem('собака'), stem('книги')], 10),
+            [self.books.pk]
+        )
+        index.unindex_comment(comment.pk)
+        self.assertEqual(
+            index.search([stem('собаки')], 10), [self.dogs.pk]
+        )
+
+    def test_posts_search_rebuild_command(self):
+        """
+        [!] Команда перестраивает индекс по всем постам.
+        """
+        Post.objects.bulk_create([
+            Post(author=PostsSearchTests.author, text='Массовая загрузка')
+        ])
+        self.assertEqual(search_post_ids('загрузка', 10), [])
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(len(search_post_ids('загрузки', 10)), 1)
+
+    def test_posts_search_view(self):
+        """
+        [!] Страница поиска выводит найденные посты.
+        """
+        response = self.client.get(reverse('posts:search'), {'q': 'котов'})
+        self.assertTemplateUsed(response, 'posts/search.html')
+        self.assertEqual(response.context['posts'], [self.books])
+        self.assertContains(response, 'Читаю интересные книги')
+        response = self.client.get(reverse('posts:search'))
+        self.assertEqual(response.context['posts'], [])
+
+    def test_posts_search_admin(self):
+        """
+        [!] Поиск в админке постов идет по индексу.
+        """
+        client = Client()
+        client.force_login(PostsSearchTests.admin)
+        response = client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'парки'}
+        )
+        self.assertEqual(
+            list(response.context['cl'].result_list), [self.dogs]
+        )
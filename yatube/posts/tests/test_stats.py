@@ -0,0 +1,100 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from ..models import AuthorStats, Comment, Follow, Post
+from ..stats import count_author_stats, get_author_stats
+
+User = get_user_model()
+
+
+class PostsStatsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='Author')
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+
+    def setUp(self):
+        cache.clear()
+
+    def stats(self, user):
+        return AuthorStats.objects.get(user=user)
+
+    def test_posts_stats_follow_changes(self):
+        """
+        [!] Счетчики меняются при создании и удалении объектов.
+        """
+        post = Post.objects.create(author=self.reader, text='Второй пост')
+        Comment.objects.create(author=self.reader, post=self.post, text='1')
+        Comment.objects.create(author=self.reader, post=self.post, text='2')
+        Comment.objects.create(author=self.author, post=self.post, text='3')
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        for user in (self.author, self.reader):
+            with self.subTest(user=user.username):
+                stats = self.stats(user)
+                self.assertEqual(
+                    count_author_stats(user.pk),
+                    {
+                        'posts_count': stats.posts_count,
+                        'comments_count': stats.comments_count,
+                        'followers_count': stats.followers_count,
+                        'following_count': stats.following_count,
+                    }
+                )
+        self.assertEqual(self.stats(self.reader).comments_count, 2)
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.post.delete()
+        post.delete()
+        follow.delete()
+        self.assertEqual(
+            [self.stats(self.reader).posts_count,
+             self.stats(self.reader).comments_count,
+             self.stats(self.reader).following_count],
+            [0, 0, 0]
+        )
+        self.assertEqual(self.stats(self.author).comments_count, 0)
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+
+    def test_posts_stats_created_on_first_read(self):
+        """
+        [!] Отсутствующая запись считается при первом чтении.
+        """
+        AuthorStats.objects.all().delete()
+        stats = get_author_stats(User.objects.get(pk=self.author.pk))
+        self.assertEqual(stats.posts_count, 1)
+        self.assertTrue(AuthorStats.objects.filter(user=self.author).exists())
+
+    def test_posts_stats_reconcile_command(self):
+        """
+        [!] Команда исправляет расхождения и создает недостающие записи.
+        """
+        AuthorStats.objects.filter(user=self.author).update(
+            posts_count=10, followers_count=3
+        )
+        AuthorStats.objects.filter(user=self.reader).delete()
+        out = StringIO()
+        call_command('recount_author_stats', stdout=out)
+        self.assertIn('Исправлено записей: 1', out.getvalue())
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+        self.assertEqual(self.stats(self.reader).posts_count, 0)
+
+    def test_posts_stats_in_pages(self):
+        """
+        [!] Профиль и страница поста выводят счетчики из записи.
+        """
+        Follow.objects.create(user=self.reader, author=self.author)
+        response = self.client.get(
+            reverse('posts:profile', kwargs={'username': 'Author'})
+        )
+        self.assertEqual(response.context['stats'].posts_count, 1)
+        self.assertContains(response, 'подписчиков: 1')
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        )
+        self.assertEqual(response.context['author_stats'].posts_count, 1)
@@ -0,0 +1,125 @@
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from ..models import Post, User
+from ..thumbnails import generate_thumbnails, wait_for_thumbnails
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+def get_image(name='small.gif'):
+    return SimpleUploadedFile(
+        name=name, content=SMALL_GIF, content_type='image/gif'
+    )
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class PostsThumbnailsTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='Author')
+
+    def test_posts_thumbnails_generated_for_all_sizes(self):
+        """
+        [!] Миниатюры всех размеров сохраняются в поле поста.
+        """
+        post = Post.objects.create(
+            text='Пост', author=self.user, image=get_image()
+        )
+        thumbnails = generate_thumbnails(post.pk)
+        post.refresh_from_db()
+        self.assertEqual(set(thumbnails), set(settings.POST_THUMBNAILS))
+        self.assertEqual(post.thumbnails, thumbnails)
+        self.assertTrue(
+            post.thumbnails['card'].startswith(settings.MEDIA_URL)
+        )
+
+    def test_posts_thumbnails_reset_when_image_changed(self):
+        """
+        [!] Замена картинки сбрасывает старые миниатюры.
+        """
+        post = Post.objects.create(
+            text='Пост', author=self.user, image=get_image()
+        )
+        generate_thumbnails(post.pk)
+        post.refresh_from_db()
+        post.text = 'Новый текст'
+        post.save()
+        post.refresh_from_db()
+        self.assertNotEqual(post.thumbnails, {})
+        post.image = get_image('other.gif')
+        post.save()
+        post.refresh_from_db()
+        self.assertEqual(post.thumbnails, {})
+
+    def test_posts_thumbnails_refresh_feeds(self):
+        """
+        [!] После сохранения миниатюр лента отдается заново с ними.
+        """
+        post = Post.objects.create(
+            text='Пост', author=self.user, image=get_image()
+        )
+        url = reverse('posts:index')
+        etag = self.client.get(url)['ETag']
+        thumbnails = generate_thumbnails(post.pk)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertContains(response, thumbnails['card'])
+
+    def test_posts_thumbnails_used_in_templates(self):
+        """
+        [!] Карточка поста и страница поста берут готовую миниатюру.
+        """
+        post = Post.objects.create(
+            text='Пост', author=self.user, image=get_image()
+        )
+        Post.objects.filter(pk=post.pk).update(
+            thumbnails={'card': '/media/cache/ready.jpg'}
+        )
+        for url in (
+            reverse('posts:index'),
+            reverse('posts:post_detail', kwargs={'post_id': post.pk}),
+        ):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertContains(response, '/media/cache/ready.jpg')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class PostsThumbnailsPoolTests(TransactionTestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_posts_thumbnails_scheduled_after_commit(self):
+        """
+        [!] Миниатюры новой картинки создаются пулом после коммита.
+        """
+        user = User.objects.create_user(username='Author')
+        post = Post.objects.create(
+            text='Пост', author=user, image=get_image()
+        )
+        wait_for_thumbnails(timeout=10)
+        post.refresh_from_db()
+        self.assertIn('card', post.thumbnails)
@@ -0,0 +1,144 @@
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from ..models import Comment, Follow, Group, Post
+from ..search import search_post_ids
+from .test_thumbnails import SMALL_GIF
+
+User = get_user_model()
+
+
+class PostsTransferTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='Author')
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Старый пост о книгах'
+        )
+        cls.pub_date = timezone.now() - timedelta(days=30)
+        Post.objects.filter(pk=cls.post.pk).update(pub_date=cls.pub_date)
+        Comment.objects.create(
+            author=cls.reader, post=cls.post, text='Комментарий'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        self.path = os.path.join(self.directory, 'dump.ndjson')
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def export(self):
+        call_command('export_yatube', self.path, stderr=StringIO())
+
+    def load(self, *args):
+        out = StringIO()
+        call_command('import_yatube', self.path, *args, stdout=out)
+        return out.getvalue()
+
+    def clear(self):
+        Follow.objects.all().delete()
+        Post.objects.all().delete()
+        Group.objects.all().delete()
+        User.objects.all().delete()
+
+    def test_posts_transfer_round_trip(self):
+        """
+        [!] Выгрузка загружается обратно с исходными id и датами.
+        """
+        self.export()
+        with open(self.path, encoding='utf-8') as stream:
+            self.assertEqual(len(stream.readlines()), 6)
+        self.clear()
+        output = self.load()
+        self.assertIn('строк/с', output)
+        post = Post.objects.get(pk=PostsTransferTests.post.pk)
+        self.assertEqual(post.pub_date, PostsTransferTests.pub_date)
+        self.assertEqual(post.author.username, 'Author')
+        self.assertEqual(post.group.slug, 'group')
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(search_post_ids('книги', 10), [post.pk])
+        self.assertTrue(Follow.objects.filter(
+            user__username='Reader', author__username='Author'
+        ).exists())
+        new_post = Post.objects.create(author=post.author, text='Новый')
+        self.assertGreater(new_post.pk, post.pk)
+
+    def test_posts_transfer_duplicates_skipped_or_merged(self):
+        """
+        [!] Повторная загрузка пропускает дубликаты, --merge обновляет.
+        """
+        self.export()
+        Post.objects.filter(pk=PostsTransferTests.post.pk).update(
+            text='Измененный текст'
+        )
+        Follow.objects.all().delete()
+        Follow.objects.create(
+            user=PostsTransferTests.reader, author=PostsTransferTests.author
+        )
+        self.load()
+        self.assertEqual(Follow.objects.count(), 1)
+        self.assertEqual(
+            Post.objects.get(pk=PostsTransferTests.post.pk).text,
+            'Измененный текст'
+        )
+        self.load('--merge')
+        self.assertEqual(
+            Post.objects.get(pk=PostsTransferTests.post.pk).text,
+            'Старый пост о книгах'
+        )
+
+    def test_posts_transfer_resume(self):
+        """
+        [!] Загрузка продолжается с сохраненной строки.
+        """
+        self.export()
+        self.clear()
+        # Первые три строки (пользователи и группа) уже загружены
+        call_command(
+            'import_yatube', self.path, '--batch-size', '1',
+            stdout=StringIO()
+        )
+        Comment.objects.all().delete()
+        with open(f'{self.path}.checkpoint', 'w') as stream:
+            stream.write('4')
+        self.load('--resume')
+        self.assertEqual(Comment.objects.count(), 1)
+        self.assertFalse(os.path.exists(f'{self.path}.checkpoint'))
+
+    def test_posts_transfer_refreshes_feeds_and_thumbnails(self):
+        """
+        [!] После загрузки ленты отдаются заново, для картинок
+        создаются миниатюры.
+        """
+        os.makedirs(os.path.join(self.directory, 'posts'))
+        with open(os.path.join(self.directory, 'posts', 'small.gif'),
+                  'wb') as stream:
+            stream.write(SMALL_GIF)
+        Post.objects.filter(pk=PostsTransferTests.post.pk).update(
+            image='posts/small.gif'
+        )
+        self.export()
+        Post.objects.filter(pk=PostsTransferTests.post.pk).update(
+            text='Измененный текст'
+        )
+        url = reverse('posts:group_list', kwargs={'slug': 'group'})
+        etag = self.client.get(url)['ETag']
+        with self.settings(MEDIA_ROOT=self.directory):
+            self.load('--merge')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Старый пост о книгах')
+        post = Post.objects.get(pk=PostsTransferTests.post.pk)
+        self.assertIn('card', post.thumbnails)
@@ -32,6 +32,8 @@ class PostsURLTests(TestCase):
                      kwargs={'slug': 'testslug'}), 'posts/group_list.html'),
             (reverse('posts:profile',
                      kwargs={'username': 'Author'}), 'posts/profile.html'),
+            (reverse('posts:post_comments',
+                     kwargs={'post_id': '1'}), 'includes/comment_list.html'),
         )
         cls.authorized_urls = (
             (reverse('posts:post_create'), 'posts/create_post.html'),
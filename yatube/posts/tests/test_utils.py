@@ -0,0 +1,189 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+
+from ..cache import COUNT_KEY, get_feed_count, store_count
+from ..models import Post
+from ..utils import CursorPaginator
+
+User = get_user_model()
+
+
+class PostsCursorPaginatorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Author')
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=cls.author) for i in range(25)
+        )
+        cls.posts = list(Post.objects.order_by('-pub_date', '-pk'))
+
+    def walk(self, paginator):
+        pages, cursor = [], None
+        while True:
+            page = paginator.get_page(cursor)
+            pages.append(list(page))
+            if not page.has_next():
+                return pages
+            cursor = page.next_cursor
+
+    def test_posts_utils_cursor_walks_whole_feed(self):
+        """
+        [!] Проход по курсорам выдает все посты без пропусков и повторов.
+        """
+        pages = self.walk(CursorPaginator(Post.objects.all(), 10))
+        self.assertEqual([len(page) for page in pages], [10, 10, 5])
+        self.assertEqual(sum(pages, []), self.posts)
+
+    def test_posts_utils_cursor_ascending_order(self):
+        """
+        [!] Направление сортировки берется из queryset.
+        """
+        pages = self.walk(
+            CursorPaginator(Post.objects.order_by('pub_date'), 10)
+        )
+        self.assertEqual(sum(pages, []), self.posts[::-1])
+
+    def test_posts_utils_cursor_last_and_previous(self):
+        """
+        [!] Последняя страница и переход назад от нее.
+        """
+        paginator = CursorPaginator(Post.objects.all(), 10)
+        last = paginator.get_page(paginator.get_page().last_cursor)
+        self.assertEqual(list(last), self.posts[-10:])
+        self.assertFalse(last.has_next())
+        previous = paginator.get_page(last.previous_cursor)
+        self.assertEqual(list(previous), self.posts[5:15])
+        self.assertTrue(previous.has_next())
+
+    def test_posts_utils_cursor_invalid_gives_first_page(self):
+        """
+        [!] Некорректный курсор возвращает первую страницу.
+        """
+        paginator = CursorPaginator(Post.objects.all(), 10)
+        for cursor in ('', 'garbage', '!!!', 'eyJrIjpbXX0'):
+            with self.subTest(cursor=cursor):
+                page = paginator.get_page(cursor)
+                self.assertEqual(list(page), self.posts[:10])
+                self.assertFalse(page.has_previous())
+
+
+class PostsPageWindowTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='Author')
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=cls.author) for i in range(95)
+        )
+        cls.posts = list(Post.objects.order_by('-pub_date', '-pk'))
+
+    def setUp(self):
+        cache.clear()
+
+    def numbers(self, page):
+        return [link and link['number'] for link in page.page_links]
+
+    def test_posts_utils_page_window(self):
+        """
+        [!] Окно содержит первую, последнюю и 3 страницы вокруг текущей.
+        """
+        paginator = CursorPaginator(Post.objects.all(), 5, count=95)
+        page = paginator.get_page()
+        self.assertEqual(page.number, 1)
+        self.assertEqual(page.num_pages, 19)
+        self.assertEqual(self.numbers(page), [1, 2, 3, 4, None, 19])
+        links = {link['number']: link for link in page.page_links if link}
+        page = paginator.get_page(links[4]['cursor'])
+        self.assertEqual(page.number, 4)
+        self.assertEqual(list(page), self.posts[15:20])
+        self.assertEqual(
+            self.numbers(page), [1, 2, 3, 4, 5, 6, 7, None, 19]
+        )
+        links = {link['number']: link for link in page.page_links if link}
+        self.assertTrue(links[4]['current'])
+        self.assertEqual(links[1]['cursor'], '')
+        page = paginator.get_page(links[7]['cursor'])
+        self.assertEqual(list(page), self.posts[30:35])
+        links = {link['number']: link for link in page.page_links if link}
+        page = paginator.get_page(links[4]['cursor'])
+        self.assertEqual(page.number, 4)
+        self.assertEqual(list(page), self.posts[15:20])
+        page = paginator.get_page(links[19]['cursor'])
+        self.assertEqual(page.number, 19)
+        self.assertEqual(list(page), self.posts[-5:])
+        self.assertEqual(self.numbers(page), [1, None, 16, 17, 18, 19])
+
+    def test_posts_utils_page_numbers_from_last_page(self):
+        """
+        [!] Номера страниц назад от последней совпадают с номерами вперед.
+        """
+        paginator = CursorPaginator(Post.objects.all(), 10, count=95)
+        page = paginator.get_page(paginator.get_page().last_cursor)
+        self.assertEqual(page.number, 10)
+        self.assertEqual(list(page), self.posts[90:])
+        links = {link['number']: link for link in page.page_links if link}
+        page = paginator.get_page(page.previous_cursor)
+        self.assertEqual(page.number, 9)
+        self.assertEqual(list(page), self.posts[80:90])
+        page = paginator.get_page(links[7]['cursor'])
+        self.assertEqual(page.number, 7)
+        self.assertEqual(list(page), self.posts[60:70])
+        paginator = CursorPaginator(
+            Post.objects.all(), 10, count=lambda: 95
+        )
+        page = paginator.get_page(paginator.get_page().last_cursor)
+        self.assertEqual(list(page), self.posts[90:])
+
+    def test_posts_utils_page_window_approximate_count(self):
+        """
+        [!] Неточное число постов уточняется по соседним страницам.
+        """
+        paginator = CursorPaginator(Post.objects.all(), 10, count=40)
+        page = paginator.get_page()
+        for _ in range(4):
+            page = paginator.get_page(page.next_cursor)
+        self.assertEqual(page.number, 5)
+        self.assertEqual(page.num_pages, 6)
+        paginator = CursorPaginator(Post.objects.all(), 10, count=500)
+        page = paginator.get_page(paginator.get_page().next_cursor)
+        self.assertEqual(page.num_pages, 50)
+        for _ in range(8):
+            page = paginator.get_page(page.next_cursor)
+        self.assertFalse(page.has_next())
+        self.assertEqual((page.number, page.num_pages), (10, 10))
+        self.assertEqual(CursorPaginator(
+            Post.objects.all(), 10
+        ).get_page().page_links, ())
+
+    def test_posts_utils_page_window_skip_limited(self):
+        """
+        [!] Курсор с пропуском больше окна не принимается.
+        """
+        paginator = CursorPaginator(Post.objects.all(), 5, count=95)
+        cursor = paginator.encode_cursor(
+            paginator.get_key(self.posts[4]), number=50, skip=200
+        )
+        page = paginator.get_page(cursor)
+        self.assertEqual(list(page), self.posts[:5])
+
+    def test_posts_utils_feed_count_cached(self):
+        """
+        [!] Число постов берется из кеша и пересчитывается после срока.
+        """
+        feed = Post.objects.all()
+        with self.assertNumQueries(1):
+            self.assertEqual(get_feed_count('index', feed), 95)
+        Post.objects.create(text='Новый пост', author=self.author)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_feed_count('index', feed), 95)
+        key = COUNT_KEY.format('index')
+        cache.set(key, (95, time.time() - 3600))
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.assertEqual(get_feed_count('index', feed), 95)
+            self.assertEqual(get_feed_count('index', feed), 95)
+        self.assertEqual(len(callbacks), 1)
+        store_count(key, feed)
+        self.assertEqual(get_feed_count('index', feed), 96)
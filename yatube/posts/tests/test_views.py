@@ -1,13 +1,23 @@
 import shutil
 import tempfile
 
-from django.test import TestCase, Client, override_settings
+from django.test import (
+    TestCase, TransactionTestCase, Client, RequestFactory,
+    override_settings
+)
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from django import forms
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils.html import escape
+from django.utils.text import Truncator
+
+from core.metrics import registry
+from core.page_cache import page_key
 
 from ..models import Follow, Group, Post, Comment
 
@@ -78,22 +88,30 @@ class PostsViewsTests(TestCase):
         fst_page = settings.POSTS_PER_PAGE
         sec_page = post_count - fst_page
         page_list = [
-            (reverse('posts:index'), fst_page),
-            (reverse('posts:index') + '?page=2', sec_page),
-            (reverse('posts:group_list',
-                     kwargs={'slug': 'testslug'}), fst_page),
-            (reverse('posts:group_list',
-                     kwargs={'slug': 'testslug'}) + '?page=2', sec_page),
-            (reverse('posts:profile',
-                     kwargs={'username': 'Author'}), fst_page),
-            (reverse('posts:profile',
-                     kwargs={'username': 'Author'}) + '?page=2', sec_page),
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'testslug'}),
+            reverse('posts:profile', kwargs={'username': 'Author'}),
         ]
-        for reverse_name, post_on_page in page_list:
+        for reverse_name in page_list:
             with self.subTest(reverse_name=reverse_name):
                 response = self.authorized_client.get(reverse_name)
+                page_obj = response.context['page_obj']
+                self.assertEqual(len(page_obj), fst_page)
+                self.assertFalse(page_obj.has_previous())
+                response = self.authorized_client.get(
+                    reverse_name, {'cursor': page_obj.next_cursor})
+                next_page_obj = response.context['page_obj']
+                self.assertEqual(len(next_page_obj), sec_page)
+                self.assertFalse(next_page_obj.has_next())
+                self.assertFalse(
+                    set(page_obj) & set(next_page_obj)
+                )
+                response = self.authorized_client.get(
+                    reverse_name,
+                    {'cursor': next_page_obj.previous_cursor}
+                )
                 self.assertEqual(
-                    len(response.context['page_obj']), post_on_page
+                    list(response.context['page_obj']), list(page_obj)
                 )
 
     def test_posts_views_index_correct_context(self):
@@ -199,7 +217,10 @@ class PostsViewsTests(TestCase):
         """
         response = self.authorized_client.get(reverse('posts:index'))
         page_content = response.content
-        Post.objects.first().delete()
+        Post.objects.filter(pk=PostsViewsTests.post.pk).update(
+            text='Текст, измененный в обход сигналов',
+            text_html='<p>Текст, измененный в обход сигналов</p>'
+        )
         response = self.authorized_client.get(reverse('posts:index'))
         cached_page_content = response.content
         cache.clear()
@@ -208,6 +229,129 @@ class PostsViewsTests(TestCase):
         self.assertEqual(page_content, cached_page_content)
         self.assertNotEqual(cached_page_content, cleared_page_content)
 
+    def test_index_page_cache_per_user(self):
+        """
+        [!] Гость и пользователь получают разные копии страницы.
+        """
+        Client().get(reverse('posts:index'))
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertContains(response, 'Пользователь: Author')
+        response = Client().get(reverse('posts:index'))
+        self.assertNotContains(response, 'Пользователь: Author')
+
+    def test_feed_page_cache_shared_with_personal_parts(self):
+        """
+        [!] Пользователи получают общую страницу со своими фрагментами.
+        """
+        follower = User.objects.create_user(username='Follower')
+        reader = User.objects.create_user(username='Reader')
+        Follow.objects.create(user=follower, author=PostsViewsTests.author)
+        url = reverse('posts:profile', kwargs={'username': 'Author'})
+        guest_page = Client().get(url)
+        self.assertNotContains(guest_page, 'Подписаться')
+        registry.clear()
+        buttons = {
+            follower: 'Отписаться', reader: 'Подписаться',
+            PostsViewsTests.author: None,
+        }
+        for user, button in buttons.items():
+            with self.subTest(user=user.username):
+                client = Client()
+                client.force_login(user)
+                response = client.get(url)
+                self.assertContains(response, f'Пользователь: {user}')
+                self.assertContains(response, 'Тестовый пост')
+                for text in ('Отписаться', 'Подписаться'):
+                    if text == button:
+                        self.assertContains(response, text)
+                    else:
+                        self.assertNotContains(response, text)
+        self.assertEqual(registry.counters[(
+            'yatube_page_cache_total', (('page', 'profile'), ('result', 'hit'))
+        )], 3)
+        self.assertNotIn('personal:', guest_page.content.decode())
+
+    def test_personal_parts_on_uncached_pages(self):
+        """
+        [!] На страницах без кеша фрагменты видят пользователя.
+        """
+        pages = (
+            reverse('about:author'),
+            reverse('posts:post_detail',
+                    kwargs={'post_id': PostsViewsTests.post.pk}),
+            reverse('posts:post_create'),
+        )
+        for page in pages:
+            with self.subTest(page=page):
+                response = self.authorized_client.get(page)
+                self.assertContains(response, 'Пользователь: Author')
+
+    @override_settings(EXCERPT_LENGTH=30)
+    def test_posts_views_cards_show_excerpt(self):
+        """
+        [!] Карточки и страница поста не выбирают исходный текст.
+        """
+        post = Post.objects.create(
+            author=PostsViewsTests.author, text='Длинный текст & поста. ' * 5
+        )
+        for url in (
+            reverse('posts:index'),
+            reverse('posts:profile', kwargs={'username': 'Author'}),
+        ):
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(url)
+                self.assertContains(response, post.excerpt, html=False)
+                self.assertNotContains(response, post.text_html, html=False)
+                self.assertContains(response, 'Читать дальше')
+                self.assertFalse(any(
+                    '"posts_post"."text"' in query['sql']
+                    for query in queries
+                ))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse('posts:post_detail', kwargs={'post_id': post.pk})
+            )
+        self.assertContains(response, post.text_html, html=False)
+        self.assertContains(response, escape(Truncator(post.text).chars(30)))
+        self.assertFalse(any(
+            '"posts_post"."text"' in query['sql'] for query in queries
+        ))
+
+    def test_feed_cache_invalidated_only_for_affected_feeds(self):
+        """
+        [!] Изменения сбрасывают кеш только затронутых лент.
+        """
+        feeds = {
+            'index': reverse('posts:index'),
+            'group': reverse('posts:group_list',
+                             kwargs={'slug': 'testslug'}),
+            'profile': reverse('posts:profile',
+                               kwargs={'username': 'Author'}),
+        }
+
+        def contents():
+            return {
+                name: self.authorized_client.get(url).content
+                for name, url in feeds.items()
+            }
+
+        before = contents()
+        another_author = User.objects.create_user(username='AnotherAuthor')
+        Post.objects.create(author=another_author, text='Новый пост')
+        after_create = contents()
+        self.assertNotEqual(before['index'], after_create['index'])
+        self.assertEqual(before['group'], after_create['group'])
+        self.assertEqual(before['profile'], after_create['profile'])
+        Comment.objects.create(
+            post=PostsViewsTests.post, author=another_author,
+            text='Комментарий'
+        )
+        after_comment = contents()
+        for name in feeds:
+            with self.subTest(name=name):
+                self.assertNotEqual(after_create[name], after_comment[name])
+
     def test_posts_view_follow_authenticated(self):
         """
         [!] Авторизованный пользователь может подписаться на автора.
@@ -256,7 +400,7 @@ class PostsViewsTests(TestCase):
 
     def test_posts_views_comments_in_context(self):
         """
-        [!] Комментарии в контексте основных страниц.
+        [!] Комментарии подгружаются к постам основных страниц.
         """
         page_list = [
             reverse('posts:index'),
@@ -275,12 +419,248 @@ class PostsViewsTests(TestCase):
             user=PostsViewsTests.author,
             author=another_author
         )
+        Follow.objects.create(
+            user=PostsViewsTests.author,
+            author=PostsViewsTests.author
+        )
         for page in page_list:
             with self.subTest(page=page):
+                # Комментарии подгружаются только для новых карточек
+                cache.clear()
                 response = self.authorized_client.get(page)
-                self.assertEqual(
-                    response.context['comments'][0].text, comment.text)
-                self.assertEqual(
-                    response.context['comments'][0].author, comment.author)
-                self.assertEqual(
-                    response.context['comments'][0].created, comment.created)
+                comments = response.context['page_obj'][0].latest_comments
+                self.assertEqual(comments[0].text, comment.text)
+                self.assertEqual(comments[0].author, comment.author)
+                self.assertEqual(comments[0].created, comment.created)
+
+    @override_settings(FEED_COMMENTS=2)
+    def test_posts_views_feed_shows_latest_comments(self):
+        """
+        [!] Карточка выводит только последние комментарии и ссылку на все.
+        """
+        comments = [
+            Comment.objects.create(
+                text=f'Комментарий {i}', post=PostsViewsTests.post,
+                author=PostsViewsTests.author
+            )
+            for i in range(4)
+        ]
+        response = self.authorized_client.get(reverse('posts:index'))
+        post = response.context['page_obj'][0]
+        self.assertEqual(post.latest_comments, comments[:1:-1])
+        self.assertContains(response, 'Комментарии (4)')
+        self.assertContains(response, 'Все комментарии')
+        self.assertNotContains(response, 'Комментарий 1')
+
+    def test_posts_views_comments_queries_do_not_grow(self):
+        """
+        [!] Число запросов ленты не зависит от количества комментариев.
+        """
+        url = reverse('posts:profile', kwargs={'username': 'Author'})
+        self.authorized_client.get(url)
+        cache.clear()
+        with CaptureQueriesContext(connection) as few:
+            self.authorized_client.get(url)
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=PostsViewsTests.author)
+            for i in range(5)
+        )
+        Comment.objects.bulk_create(
+            Comment(text='Комментарий', post=post,
+                    author=PostsViewsTests.author)
+            for post in Post.objects.all() for _ in range(3)
+        )
+        cache.clear()
+        with CaptureQueriesContext(connection) as many:
+            self.authorized_client.get(url)
+        self.assertEqual(len(few), len(many))
+
+    def test_posts_views_post_cards_cached(self):
+        """
+        [!] Карточки постов берутся из кеша и сбрасываются при изменении.
+        """
+        url = reverse('posts:group_list', kwargs={'slug': 'testslug'})
+        pages = (
+            url,
+            reverse('posts:profile', kwargs={'username': 'Author'}),
+            reverse('posts:index'),
+        )
+        Comment.objects.create(
+            text='Комментарий',
+            post=PostsViewsTests.post,
+            author=PostsViewsTests.author
+        )
+        for page in pages:
+            self.authorized_client.get(page)
+        with CaptureQueriesContext(connection) as queries:
+            for page in pages:
+                # Другой адрес, чтобы не попасть в кеш всей страницы
+                self.authorized_client.get(page + '?cursor=')
+        self.assertFalse(
+            [q for q in queries if '"posts_comment"' in q['sql']]
+        )
+        self.authorized_client.post(
+            reverse('posts:post_edit',
+                    kwargs={'post_id': PostsViewsTests.post.pk}),
+            data={'text': 'Измененный текст', 'group': self.group.pk},
+        )
+        response = self.authorized_client.get(url + '?cursor=')
+        self.assertContains(response, 'Измененный текст')
+        Comment.objects.create(
+            text='Новый комментарий',
+            post=PostsViewsTests.post,
+            author=PostsViewsTests.author
+        )
+        response = self.authorized_client.get(url + '?cursor=')
+        self.assertContains(response, 'Новый комментарий')
+
+    def test_posts_views_post_cards_follow_group_and_author(self):
+        """
+        [!] Карточки постов сбрасываются при изменении группы и автора.
+        """
+        url = reverse('posts:index')
+        self.authorized_client.get(url)
+        self.group.title = 'Новое название'
+        self.group.save()
+        self.assertContains(self.authorized_client.get(url), 'Новое название')
+        author = User.objects.get(pk=PostsViewsTests.author.pk)
+        author.first_name = 'Лев'
+        author.username = 'Renamed'
+        author.save()
+        response = self.authorized_client.get(url)
+        self.assertContains(response, 'Лев')
+        self.assertContains(
+            response, reverse('posts:profile', kwargs={'username': 'Renamed'})
+        )
+        self.group.delete()
+        self.assertNotContains(
+            self.authorized_client.get(url), 'Новое название'
+        )
+
+    @override_settings(COMMENTS_PER_PAGE=5)
+    def test_posts_views_post_detail_comments_paginated(self):
+        """
+        [!] Комментарии поста выводятся порциями с догрузкой.
+        """
+        for i in range(12):
+            Comment.objects.create(
+                text=f'Комментарий {i}', post=PostsViewsTests.post,
+                author=PostsViewsTests.author
+            )
+        response = self.authorized_client.get(
+            reverse('posts:post_detail',
+                    kwargs={'post_id': PostsViewsTests.post.pk})
+        )
+        comments = response.context['comments']
+        self.assertEqual(len(comments), 5)
+        self.assertContains(response, 'id="modal2"', count=1)
+        self.assertContains(response, 'data-delete-url=', count=5)
+        seen = [comment.pk for comment in comments]
+        url = reverse('posts:post_comments',
+                      kwargs={'post_id': PostsViewsTests.post.pk})
+        while comments.has_next():
+            response = self.client.get(
+                url, {'cursor': comments.next_cursor}
+            )
+            self.assertTemplateUsed(response, 'includes/comment_list.html')
+            comments = response.context['comments']
+            seen += [comment.pk for comment in comments]
+        self.assertEqual(
+            seen,
+            list(Comment.objects.filter(
+                post=PostsViewsTests.post
+            ).order_by('-created', '-pk').values_list('pk', flat=True))
+        )
+
+    def test_posts_views_conditional_get(self):
+        """
+        [!] Неизменившиеся страницы отвечают 304, гостям - public кеш.
+        """
+        # Страница поста проверяется одним запросом по первичному ключу
+        pages = {
+            reverse('posts:index'): 0,
+            reverse('posts:group_list', kwargs={'slug': 'testslug'}): 0,
+            reverse('posts:profile', kwargs={'username': 'Author'}): 0,
+            reverse('posts:post_detail',
+                    kwargs={'post_id': PostsViewsTests.post.pk}): 1,
+        }
+        guest_client = Client()
+        for page, queries in pages.items():
+            with self.subTest(page=page):
+                response = guest_client.get(page)
+                self.assertIn('public', response['Cache-Control'])
+                self.assertIn('max-age', response['Cache-Control'])
+                etag = response['ETag']
+                with self.assertNumQueries(queries):
+                    response = guest_client.get(
+                        page, HTTP_IF_NONE_MATCH=etag
+                    )
+                self.assertEqual(response.status_code, 304)
+                response = self.authorized_client.get(page)
+                self.assertIn('private', response['Cache-Control'])
+                self.assertNotEqual(response['ETag'], etag)
+        etags = {page: guest_client.get(page)['ETag'] for page in pages}
+        Post.objects.create(
+            text='Новый пост', author=PostsViewsTests.author,
+            group=PostsViewsTests.group
+        )
+        for page, etag in etags.items():
+            with self.subTest(page=page):
+                response = guest_client.get(page, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+
+    def test_posts_views_stale_copy_without_validators(self):
+        """
+        [!] Устаревшая копия страницы отдается без ETag и Last-Modified.
+        """
+        url = reverse('posts:index')
+        guest_client = Client()
+        guest_client.get(url)
+        Post.objects.create(text='Новый пост', author=PostsViewsTests.author)
+        lock_key = page_key('index', RequestFactory().get(url)) + ':lock'
+        cache.add(lock_key, True)
+        response = guest_client.get(url)
+        self.assertNotContains(response, 'Новый пост')
+        self.assertFalse(response.has_header('ETag'))
+        self.assertFalse(response.has_header('Last-Modified'))
+        cache.delete(lock_key)
+        response = guest_client.get(url)
+        self.assertContains(response, 'Новый пост')
+        self.assertTrue(response.has_header('ETag'))
+
+
+class PostsViewsParallelTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='Author')
+        self.reader = User.objects.create_user(username='Reader')
+        self.post = Post.objects.create(author=self.author, text='Пост')
+        Comment.objects.create(
+            author=self.reader, post=self.post, text='Комментарий'
+        )
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.client.force_login(self.reader)
+
+    def test_posts_views_parallel_loading(self):
+        """
+        [!] Вне транзакции данные страниц загружаются пулом потоков.
+        """
+        response = self.client.get(
+            reverse('posts:profile', kwargs={'username': 'Author'})
+        )
+        self.assertContains(response, 'Отписаться')
+        self.assertEqual(response.context['author'], self.author)
+        self.assertEqual(len(response.context['page_obj']), 1)
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        )
+        self.assertEqual(response.context['post'], self.post)
+        self.assertEqual(len(response.context['comments']), 1)
+        for url in (reverse('posts:index'), reverse('posts:follow_index')):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.context['page_obj'].num_pages, 1)
+        response = self.client.get(
+            reverse('posts:profile', kwargs={'username': 'Nobody'})
+        )
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,70 @@
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from sorl.thumbnail import get_thumbnail
+
+from .cache import bump_feed_versions, post_feeds
+from .models import Post
+
+_executor = None
+_pending = set()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.THUMBNAIL_WORKERS,
+            thread_name_prefix='thumbnails',
+        )
+    return _executor
+
+
+def generate_thumbnails(post_id):
+    """
+    Создает миниатюры картинки поста всех размеров из POST_THUMBNAILS
+    и сохраняет их адреса в Post.thumbnails. Ленты поста сбрасываются:
+    в закешированных страницах карточка еще с исходной картинкой.
+    """
+    post = Post.objects.filter(pk=post_id).only(
+        'pk', 'image', 'author_id', 'group_id'
+    ).first()
+    # После загрузки из выгрузки файла картинки может не быть
+    if post is None or not post.image or not post.image.storage.exists(
+        post.image.name
+    ):
+        return {}
+    thumbnails = {
+        size: get_thumbnail(post.image, geometry, **options).url
+        for size, (geometry, options) in settings.POST_THUMBNAILS.items()
+    }
+    # Картинку могли заменить, пока миниатюры создавались
+    stored = Post.objects.filter(pk=post_id, image=post.image.name).update(
+        thumbnails=thumbnails, updated=timezone.now()
+    )
+    if stored:
+        bump_feed_versions(*post_feeds(post.author_id, post.group_id))
+    return thumbnails
+
+
+def _generate_in_worker(post_id):
+    try:
+        return generate_thumbnails(post_id)
+    finally:
+        connection.close()
+
+
+def schedule_thumbnails(post_id):
+    """Отправляет пост в пул генерации миниатюр после коммита."""
+    def submit():
+        future = get_executor().submit(_generate_in_worker, post_id)
+        _pending.add(future)
+        future.add_done_callback(_pending.discard)
+    transaction.on_commit(submit)
+
+
+def wait_for_thumbnails(timeout=None):
+    """Дожидается завершения запущенных задач пула."""
+    return wait(list(_pending), timeout=timeout)
@@ -0,0 +1,223 @@
+import datetime
+import json
+import time
+
+from django.core.management.color import no_style
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .cache import bump_feed_versions
+from .models import (
+    Comment, Follow, Group, Post, RenderedTextMixin, User
+)
+from .rendering import RENDERED_FIELDS
+
+# Модели в порядке зависимостей и выгружаемые поля
+MODELS = {
+    'user': (User, (
+        'id', 'username', 'password', 'email', 'first_name', 'last_name',
+        'is_active', 'is_staff', 'is_superuser', 'date_joined', 'last_login',
+    )),
+    'group': (Group, ('id', 'title', 'slug', 'description')),
+    'post': (Post, (
+        'id', 'text', 'pub_date', 'author_id', 'group_id', 'image',
+    )),
+    'comment': (Comment, ('id', 'text', 'post_id', 'author_id', 'created')),
+    'follow': (Follow, ('id', 'user_id', 'author_id')),
+}
+
+
+class ExportEncoder(DjangoJSONEncoder):
+    """Даты пишутся с микросекундами, без округления до миллисекунд."""
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def export_rows(stream, chunk_size=2000):
+    """
+    Пишет все объекты в stream как NDJSON: одна строка - один объект
+    с полем "model". Строки читаются из базы порциями по chunk_size.
+    Возвращает {модель: число строк}.
+    """
+    counts = {}
+    for name, (model, fields) in MODELS.items():
+        counts[name] = 0
+        rows = model.objects.order_by('pk').values(*fields)
+        for row in rows.iterator(chunk_size=chunk_size):
+            stream.write(json.dumps(
+                {'model': name, **row},
+                cls=ExportEncoder, ensure_ascii=False
+            ))
+            stream.write('\n')
+            counts[name] += 1
+    return counts
+
+
+class Importer:
+    """
+    Загружает NDJSON из export_rows пакетами через bulk_create.
+
+    Существующие по первичному ключу объекты пропускаются или, при
+    merge=True, обновляются. Дубликаты по уникальным ограничениям, в том
+    числе повтор подписки (unique_following), пропускаются. После
+    каждого пакета номер строки передается в on_commit, чтобы прерванную
+    загрузку можно было продолжить с этого места. Пользователи, группы
+    и посты загруженных строк запоминаются для invalidate.
+    """
+
+    def __init__(self, batch_size=2000, merge=False, on_commit=None):
+        self.batch_size = batch_size
+        self.merge = merge
+        self.on_commit = on_commit
+        self.counts = {name: 0 for name in MODELS}
+        self.user_ids = set()
+        self.group_ids = set()
+        self.post_ids = set()
+
+    def load(self, lines, skip=0):
+        """Загружает строки, пропуская первые skip уже загруженных."""
+        batch, batch_model, line_number = [], None, skip
+        for line_number, line in enumerate(lines, 1):
+            if line_number <= skip or not line.strip():
+                continue
+            row = json.loads(line)
+            name = row.pop('model')
+            if name not in MODELS:
+                raise ValueError(f'Строка {line_number}: модель {name}?')
+            if batch and (name != batch_model
+                          or len(batch) >= self.batch_size):
+                self.flush(batch_model, batch, line_number - 1)
+                batch = []
+            batch_model = name
+            batch.append(row)
+        if batch:
+            self.flush(batch_model, batch, line_number)
+        self.reset_sequences()
+        return self.counts
+
+    def build(self, model, row):
+        obj = model(**row)
+        for field in model._meta.concrete_fields:
+            value = getattr(obj, field.attname)
+            if field.get_internal_type() == 'DateTimeField' and value:
+                setattr(obj, field.attname, parse_datetime(value))
+        return obj
+
+    def flush(self, name, rows, line_number):
+        model, fields = MODELS[name]
+        objs = [self.build(model, row) for row in rows]
+        update_fields = [field for field in fields if field != 'id']
+        if issubclass(model, RenderedTextMixin):
+            # bulk_create и bulk_update не вызывают save()
+            for obj in objs:
+                obj.render_text()
+            update_fields += RENDERED_FIELDS
+        existing = set(model.objects.filter(
+            pk__in=[obj.pk for obj in objs]
+        ).values_list('pk', flat=True))
+        new = [obj for obj in objs if obj.pk not in existing]
+        # bulk_create заменяет auto_now_add текущим временем,
+        # исходные даты возвращаются отдельным обновлением
+        auto_dates = [
+            field.attname for field in model._meta.concrete_fields
+            if getattr(field, 'auto_now_add', False)
+        ]
+        dates = [
+            [getattr(obj, attname) for attname in auto_dates] for obj in new
+        ]
+        with transaction.atomic():
+            model.objects.bulk_create(new, ignore_conflicts=True)
+            if auto_dates and new:
+                for obj, values in zip(new, dates):
+                    for attname, value in zip(auto_dates, values):
+                        setattr(obj, attname, value)
+                model.objects.bulk_update(new, auto_dates)
+            if self.merge and existing:
+                # bulk_update не вызывает pre_save и не обновляет auto_now
+                changed = [
+                    field.attname for field in model._meta.concrete_fields
+                    if getattr(field, 'auto_now', False)
+                ]
+                merged = [obj for obj in objs if obj.pk in existing]
+                for obj in merged:
+                    for attname in changed:
+                        setattr(obj, attname, timezone.now())
+                model.objects.bulk_update(merged, update_fields + changed)
+            if self.on_commit:
+                transaction.on_commit(lambda: self.on_commit(line_number))
+        self.counts[name] += len(objs)
+        self.remember(name, rows)
+
+    def remember(self, name, rows):
+        """Запоминает объекты, чьи ленты меняет пакет строк."""
+        for row in rows:
+            if name == 'user':
+                self.user_ids.add(row['id'])
+            elif name == 'group':
+                self.group_ids.add(row['id'])
+            elif name == 'post':
+                self.user_ids.add(row['author_id'])
+                if row['group_id'] is not None:
+                    self.group_ids.add(row['group_id'])
+            elif name == 'comment':
+                self.user_ids.add(row['author_id'])
+                self.post_ids.add(row['post_id'])
+            elif name == 'follow':
+                self.user_ids.update((row['user_id'], row['author_id']))
+
+    def invalidate(self, chunk_size=2000):
+        """
+        Сбрасывает кеш карточек и лент загруженных объектов: bulk_create
+        и bulk_update не вызывают сигналы. Посты загруженных
+        комментариев, а при merge и посты загруженных пользователей и
+        групп, отмечаются измененными. Главная входит и в ленты подписок.
+        """
+        now = timezone.now()
+        posts = list(self.post_ids)
+        for start in range(0, len(posts), chunk_size):
+            chunk = Post.objects.filter(pk__in=posts[start:start + chunk_size])
+            for author_id, group_id in chunk.values_list(
+                'author_id', 'group_id'
+            ):
+                self.user_ids.add(author_id)
+                if group_id is not None:
+                    self.group_ids.add(group_id)
+            chunk.update(updated=now)
+        feeds = ['index']
+        for model, ids, field, feed, lookup in (
+            (User, self.user_ids, 'username', 'profile:{}', 'author_id__in'),
+            (Group, self.group_ids, 'slug', 'group:{}', 'group_id__in'),
+        ):
+            ids = list(ids)
+            for start in range(0, len(ids), chunk_size):
+                chunk = ids[start:start + chunk_size]
+                if self.merge:
+                    Post.objects.filter(**{lookup: chunk}).update(
+                        updated=now
+                    )
+                feeds += [
+                    feed.format(value) for value in model.objects.filter(
+                        pk__in=chunk
+                    ).values_list(field, flat=True)
+                ]
+        bump_feed_versions(*feeds)
+
+    def reset_sequences(self):
+        """Сдвигает счетчики первичных ключей после явных id."""
+        models = [model for model, _ in MODELS.values()]
+        statements = connection.ops.sequence_reset_sql(no_style(), models)
+        if statements:
+            with connection.cursor() as cursor:
+                for sql in statements:
+                    cursor.execute(sql)
+
+
+def rate(rows, started):
+    """Скорость в строках в секунду."""
+    elapsed = time.monotonic() - started
+    return rows / elapsed if elapsed else float(rows)
@@ -19,6 +19,8 @@ urlpatterns = [
         views.post_delete,
         name='post_delete'
     ),
+    # Поиск
+    path('search/', views.search, name='search'),
     # Подписки на авторов
     path('follow/', views.follow_index, name='follow_index'),
     path(
@@ -32,6 +34,11 @@ urlpatterns = [
         name='profile_unfollow'
     ),
     # Комментарии
+    path(
+        'posts/<int:post_id>/comments/',
+        views.post_comments,
+        name='post_comments'
+    ),
     path(
         'posts/<int:post_id>/comment/',
         views.add_comment,
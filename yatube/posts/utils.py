@@ -1,9 +1,351 @@
-from django.core.paginator import Paginator
+import base64
+import binascii
+import json
+import math
+from collections.abc import Sequence
+
 from django.conf import settings
+from django.core.cache import cache
+from django.db.models import (
+    Prefetch, Q, Subquery, prefetch_related_objects
+)
+from django.template.loader import render_to_string
+from django.utils.dateparse import parse_datetime
+from django.utils.safestring import mark_safe
+
+from core.parallel import gather
+
+from .models import Comment
+
+
+class CursorPage(Sequence):
+    """
+    Страница курсорного паджинатора. number - номер страницы, если он
+    известен, page_links - окно ссылок на страницы, где None - пропуск.
+    """
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None,
+                 last_cursor=None, number=None, num_pages=None,
+                 page_links=()):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.last_cursor = last_cursor
+        self.number = number
+        self.num_pages = num_pages
+        self.page_links = page_links
+
+    def __repr__(self):
+        return f'<CursorPage: {len(self)} objects>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """
+    Курсорный (keyset) паджинатор по паре (дата, id).
+
+    Вместо OFFSET и COUNT(*) страница выбирается условием по ключу
+    последней показанной записи, поэтому любая страница стоит столько же,
+    сколько первая. Направление сортировки берется из queryset.
+    Вместо одного queryset можно передать список непересекающихся
+    источников с общим ключом: страницы сливаются из их выборок.
+
+    Курсор помнит номер страницы. Если известно примерное число
+    записей count, страница получает окно ссылок: первая, последняя и
+    window страниц вокруг текущей. Переход к странице из окна - это
+    выборка по ключу текущей страницы со смещением не больше
+    window - 1 страниц, поэтому он тоже не зависит от размера ленты.
+    Если count - функция, она выполняется одновременно с выборкой
+    страницы.
+    """
+
+    def __init__(self, object_list, per_page, date_field='pub_date',
+                 id_field='pk', count=None, window=3):
+        if not isinstance(object_list, (list, tuple)):
+            object_list = [object_list]
+        self.sources = object_list
+        self.per_page = per_page
+        self.count = count
+        self.window = window
+        self.date_field = date_field
+        self.id_field = id_field
+        self.descending = True
+        first = object_list[0]
+        ordering = first.query.order_by or first.model._meta.ordering
+        for field in ordering:
+            if isinstance(field, str) and field.lstrip('-') == date_field:
+                self.descending = field.startswith('-')
+                break
+
+    @staticmethod
+    def encode_cursor(key=None, backwards=False, number=None, skip=0):
+        """
+        Упаковывает позицию в непрозрачную строку для ?cursor=: ключ,
+        направление, номер страницы и число пропускаемых записей.
+        """
+        position = {'b': int(backwards)}
+        if key is not None:
+            position['k'] = [key[0].isoformat(), key[1]]
+        if number is not None:
+            position['n'] = number
+        if skip:
+            position['s'] = skip
+        raw = json.dumps(position, separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        """
+        Возвращает (ключ, назад, номер, пропуск) или None для
+        некорректного курсора.
+        """
+        if not cursor:
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            position = json.loads(raw)
+            key = position.get('k')
+            if key is not None:
+                date, pk = parse_datetime(key[0]), int(key[1])
+                if date is None:
+                    return None
+                key = (date, pk)
+            number = position.get('n')
+            if number is not None:
+                number = max(int(number), 1)
+            skip = int(position.get('s', 0))
+            # Пропуск ограничен окном, чтобы курсор не стал OFFSET
+            if not 0 <= skip <= self.window * self.per_page:
+                return None
+            return key, bool(position.get('b')), number, skip
+        except (binascii.Error, ValueError, TypeError, AttributeError,
+                IndexError, KeyError):
+            return None
+
+    def get_key(self, obj):
+        return getattr(obj, self.date_field), getattr(obj, self.id_field)
+
+    def get_ordering(self, backwards=False):
+        prefix = '-' if self.descending != backwards else ''
+        return f'{prefix}{self.date_field}', f'{prefix}{self.id_field}'
+
+    def get_filter(self, key, backwards=False):
+        lookup = 'lt' if self.descending != backwards else 'gt'
+        date, pk = key
+        return (
+            Q(**{f'{self.date_field}__{lookup}': date})
+            | Q(**{self.date_field: date, f'{self.id_field}__{lookup}': pk})
+        )
+
+    def fetch(self, key, backwards, skip=0):
+        """
+        per_page + 1 объектов после ключа из всех источников, начиная
+        с skip-го.
+        """
+        limit = skip + self.per_page + 1
+        rows = []
+        for source in self.sources:
+            if key is not None:
+                source = source.filter(self.get_filter(key, backwards))
+            source = source.order_by(*self.get_ordering(backwards))
+            if len(self.sources) == 1:
+                return list(source[skip:limit])
+            rows += source[:limit]
+        rows.sort(key=self.get_key, reverse=self.descending != backwards)
+        return rows[skip:limit]
+
+    def get_page(self, cursor=None):
+        """Страница по курсору; некорректный курсор дает первую страницу."""
+        key, backwards, number, skip = (
+            self.decode_cursor(cursor) or (None, False, None, 0)
+        )
+        count = self.count
+        if callable(count):
+            rows, count = gather(
+                lambda: self.fetch(key, backwards, skip), count
+            )
+        else:
+            rows = self.fetch(key, backwards, skip)
+        size = self.per_page
+        if key is None and backwards and count is not None:
+            # Последняя страница неполная, как при проходе вперед, чтобы
+            # номера страниц назад от нее совпадали с номерами вперед
+            size = count % self.per_page or self.per_page
+        has_more = len(rows) > size
+        rows = rows[:size]
+        if backwards:
+            rows.reverse()
+            has_next, has_previous = key is not None, has_more
+        else:
+            has_next, has_previous = has_more, key is not None
+        num_pages = None
+        if count is not None:
+            num_pages = max(math.ceil(count / self.per_page), 1)
+            if key is None and backwards:
+                number = num_pages
+        if not has_previous:
+            number = 1
+        if number is not None and num_pages is not None:
+            # Примерное число страниц уточняется по соседним страницам
+            num_pages = number if not has_next else max(
+                num_pages, number + 1
+            )
+        page = CursorPage(
+            rows,
+            number=number,
+            num_pages=num_pages,
+            last_cursor=self.encode_cursor(backwards=True),
+        )
+        if rows and has_next:
+            page.next_cursor = self.cursor_to(page, 1)
+        if rows and has_previous:
+            page.previous_cursor = self.cursor_to(page, -1)
+        if number is not None and num_pages is not None:
+            page.page_links = self.page_links(page)
+        return page
+
+    def cursor_to(self, page, step):
+        """
+        Курсор страницы на step страниц от текущей: следующие идут от
+        ее последнего ключа, предыдущие - от первого, с пропуском
+        промежуточных страниц. Пустая строка - первая страница.
+        """
+        number = None if page.number is None else page.number + step
+        if number == 1:
+            return ''
+        if step > 0:
+            return self.encode_cursor(
+                self.get_key(page[-1]), number=number,
+                skip=(step - 1) * self.per_page
+            )
+        return self.encode_cursor(
+            self.get_key(page[0]), backwards=True, number=number,
+            skip=(-step - 1) * self.per_page
+        )
+
+    def page_links(self, page):
+        """
+        Окно ссылок: первая, последняя и window страниц вокруг текущей.
+        Элементы - {'number', 'cursor', 'current'}, None - пропуск.
+        """
+        around = range(
+            max(page.number - self.window, 1),
+            min(page.number + self.window, page.num_pages) + 1
+        )
+        links = []
+        for number in sorted({1, page.num_pages, *around}):
+            if links and number - links[-1]['number'] > 1:
+                links.append(None)
+            if number == page.number:
+                cursor = None
+            elif number in around:
+                cursor = self.cursor_to(page, number - page.number)
+            elif number == 1:
+                cursor = ''
+            else:
+                cursor = page.last_cursor
+            links.append({
+                'number': number,
+                'cursor': cursor,
+                'current': number == page.number,
+            })
+        return links
+
+
+def posts_on_page(request, post_list, **kwargs):
+    """
+    Функция-паджинатор. Примерное число постов count включает окно
+    ссылок на страницы.
+    """
+    paginator = CursorPaginator(post_list, settings.POSTS_PER_PAGE, **kwargs)
+    return paginator.get_page(request.GET.get('cursor'))
+
+
+def comments_on_page(request, post):
+    """
+    Страница комментариев поста или поста с id post по ?cursor=, от
+    новых к старым. Выборка идет по индексу (post, created, id).
+    """
+    paginator = CursorPaginator(
+        Comment.objects.filter(post=post).select_related('author'),
+        settings.COMMENTS_PER_PAGE,
+        date_field='created',
+    )
+    return paginator.get_page(request.GET.get('cursor'))
+
+
+def comments_prefetch(posts):
+    """
+    Подгрузка одним запросом последних FEED_COMMENTS комментариев
+    постов страницы в post.latest_comments. У постов с большим числом
+    комментариев выборка ограничена датой FEED_COMMENTS-го с конца
+    комментария: она берется некоррелированным подзапросом по индексу
+    (post, created, id), и стоимость не зависит от числа комментариев.
+    """
+    limit = settings.FEED_COMMENTS
+    latest = Q()
+    for post in posts:
+        if post.comments_count > limit:
+            cutoff = Comment.objects.filter(post_id=post.pk).order_by(
+                '-created', '-id'
+            ).values('created')[limit - 1:limit]
+            latest |= Q(post_id=post.pk, created__gte=Subquery(cutoff))
+        else:
+            latest |= Q(post_id=post.pk)
+    return Prefetch(
+        'comments',
+        queryset=Comment.objects.filter(latest).select_related(
+            'author'
+        ).defer('text').order_by('-post_id', '-created', '-id'),
+        to_attr='latest_comments',
+    )
+
+
+def post_card_key(post, is_profile=False, is_group=False):
+    return 'post_card:{}:{}:{:d}{:d}'.format(
+        post.pk, post.updated.timestamp(), is_profile, is_group
+    )
+
 
+def render_post_cards(posts, is_profile=False, is_group=False):
+    """
+    Готовит HTML карточек постов страницы в post.card.
 
-def posts_on_page(request, post_list):
-    """Функция-паджинатор."""
-    paginator = Paginator(post_list, settings.POSTS_PER_PAGE)
-    page_number = request.GET.get('page')
-    return paginator.get_page(page_number)
+    Карточки кешируются по id поста, времени изменения и флагам
+    шаблона. Все карточки страницы читаются из кеша одним get_many,
+    комментарии подгружаются и карточки рендерятся только для промахов.
+    """
+    flags = {'is_profile': is_profile, 'is_group': is_group}
+    keys = {post_card_key(post, **flags): post for post in posts}
+    cached = cache.get_many(keys)
+    missed = [post for key, post in keys.items() if key not in cached]
+    if missed:
+        prefetch_related_objects(missed, comments_prefetch(missed))
+    for post in missed:
+        # Комментарии с одной датой могут выйти за предел
+        post.latest_comments = post.latest_comments[:settings.FEED_COMMENTS]
+    rendered = {}
+    for key, post in keys.items():
+        if key in cached:
+            post.card = mark_safe(cached[key])
+        else:
+            post.card = render_to_string(
+                'includes/post_card.html', {'post': post, **flags}
+            )
+            rendered[key] = str(post.card)
+    if rendered:
+        cache.set_many(rendered, settings.POST_CARD_CACHE_TIMEOUT)
+    return posts
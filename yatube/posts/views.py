@@ -1,58 +1,83 @@
+from functools import partial
+
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.db import transaction
 from django.shortcuts import get_object_or_404, render, redirect
+
+from core.parallel import gather
+
+from .feeds import (
+    follow_feed, group_feed, index_feed, profile_feed, without_text
+)
 from .forms import PostForm, CommentForm
 from .models import Follow, Post, Group, User, Comment
-from .utils import posts_on_page
-from django.views.decorators.cache import cache_page
-from django.core.cache import cache
+from .search import search_posts
+from .stats import get_author_stats
+from .utils import comments_on_page, posts_on_page, render_post_cards
+from .cache import (
+    cache_feed, feed_condition, get_feed_count, post_condition,
+    public_cache_control
+)
 
 
-@cache_page(20, key_prefix='index_page')
+@public_cache_control(settings.FEED_CACHE_TIMEOUT)
+@feed_condition('index')
+@cache_feed(settings.FEED_CACHE_TIMEOUT, 'index')
 def index(request):
     """Главная страница - список постов."""
-    posts = Post.objects.all().select_related('author', 'group')
-    comments = Comment.objects.all().select_related('post', 'author')
-    page_obj = posts_on_page(request, posts)
+    feed = without_text(index_feed())
+    page_obj = posts_on_page(
+        request, feed, count=partial(get_feed_count, 'index', feed)
+    )
+    render_post_cards(page_obj)
     return render(
         request,
         'posts/index.html',
-        {'page_obj': page_obj, 'comments': comments,
-         'is_index': True}
+        {'page_obj': page_obj, 'is_index': True}
     )
 
 
+@public_cache_control(settings.FEED_CACHE_TIMEOUT)
+@feed_condition('group:{slug}')
+@cache_feed(settings.FEED_CACHE_TIMEOUT, 'group:{slug}')
 def group_posts(request, slug):
     """Страница с постами одной группы."""
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all().select_related('author', 'group'
-                                             ).order_by('pub_date')
-    page_obj = posts_on_page(request, posts)
-    comments = Comment.objects.all().select_related('post', 'author')
+    feed = without_text(group_feed(group))
+    page_obj = posts_on_page(
+        request, feed, count=partial(get_feed_count, f'group:{slug}', feed)
+    )
+    render_post_cards(page_obj, is_group=True)
     return render(
         request,
         'posts/group_list.html',
-        {'group': group, 'page_obj': page_obj,
-         'comments': comments, 'is_group': True}
+        {'group': group, 'page_obj': page_obj, 'is_group': True}
     )
 
 
+@public_cache_control(settings.FEED_CACHE_TIMEOUT)
+@feed_condition('profile:{username}')
+@cache_feed(settings.FEED_CACHE_TIMEOUT, 'profile:{username}')
 def profile(request, username):
-    """Список постов одного автора с подпиской на автора."""
-    author = get_object_or_404(User, username=username)
-    posts = author.posts.all().select_related('author', 'group')
-    page_obj = posts_on_page(request, posts)
-    following = (
-        request.user.is_authenticated and request.user.follower.filter(
-            user=request.user,
-            author=author
-        ).exists()
-    )
-    comments = Comment.objects.all().select_related('post', 'author')
+    """
+    Список постов одного автора. Кнопка подписки отрисовывается для
+    каждого пользователя отдельно от общей закешированной страницы.
+    """
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username
+    )
+    stats = get_author_stats(author)
+    page_obj = posts_on_page(
+        request, without_text(profile_feed(author)),
+        count=stats.posts_count
+    )
+    render_post_cards(page_obj, is_profile=True)
     return render(
         request,
         'posts/profile.html',
-        {'page_obj': page_obj, 'author': author, 'comments': comments,
-         'is_profile': True, 'following': following}
+        {'page_obj': page_obj, 'author': author,
+         'stats': stats, 'is_profile': True}
     )
 
 
@@ -64,19 +89,44 @@ def add_comment(request, post_id):
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = get_object_or_404(Post, pk=post_id)
-        comment.save()
+        with transaction.atomic():
+            comment.save()
     return redirect('posts:post_detail', post_id=post_id)
 
 
+@public_cache_control(settings.FEED_CACHE_TIMEOUT)
+@post_condition()
 def post_detail(request, post_id):
     """Страница одного поста с добавлением комментариев и редактированием."""
-    post = get_object_or_404(Post, pk=post_id)
-    comments = post.comments.all().select_related('author', 'post')
+    post, comments = gather(
+        partial(
+            get_object_or_404,
+            Post.objects.select_related(
+                'author__stats', 'group'
+            ).defer('text'),
+            pk=post_id
+        ),
+        partial(comments_on_page, request, post_id),
+    )
     form = CommentForm()
     return render(
         request,
         'posts/post_detail.html',
-        {'post': post, 'comments': comments, 'form': form}
+        {'post': post, 'comments': comments, 'form': form,
+         'author_stats': get_author_stats(post.author)}
+    )
+
+
+def post_comments(request, post_id):
+    """Очередная страница комментариев поста для догрузки."""
+    post, comments = gather(
+        partial(get_object_or_404, Post, pk=post_id),
+        partial(comments_on_page, request, post_id),
+    )
+    return render(
+        request,
+        'includes/comment_list.html',
+        {'post': post, 'comments': comments}
     )
 
 
@@ -135,17 +185,23 @@ def post_edit(request, post_id):
 
 
 @login_required
+@public_cache_control(settings.FEED_CACHE_TIMEOUT)
+@feed_condition('index', 'follow:{request.user.pk}')
+@cache_feed(
+    settings.FEED_CACHE_TIMEOUT, 'index', 'follow:{request.user.pk}'
+)
 def follow_index(request):
     """Список постов авторов на которых подписан."""
-    posts = Post.objects.filter(
-        author__following__user=request.user
-    ).select_related('author', 'group')
-    page_obj = posts_on_page(request, posts)
-    comments = Comment.objects.all().select_related('post', 'author')
+    feed = without_text(follow_feed(request.user))
+    page_obj = posts_on_page(
+        request, feed, date_field='feed_date', id_field='feed_post',
+        count=partial(get_feed_count, f'follow:{request.user.pk}', feed)
+    )
+    render_post_cards(page_obj)
     return render(
         request,
         'posts/follow.html',
-        {'page_obj': page_obj, 'is_follow': True, 'comments': comments}
+        {'page_obj': page_obj, 'is_follow': True}
     )
 
 
@@ -176,7 +232,6 @@ def post_delete(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
     if request.user == post.author:
         post.delete()
-        cache.clear()
     return redirect('posts:profile', username=request.user)
 
 
@@ -185,5 +240,36 @@ def comment_delete(request, post_id, comment_id):
     """Удаление комментария."""
     comment = get_object_or_404(Comment, pk=comment_id)
     if request.user == comment.author:
-        comment.delete()
+        with transaction.atomic():
+            comment.delete()
     return redirect('posts:post_detail', post_id=post_id)
+
+
+def search(request):
+    """Поиск постов по тексту постов и комментариев."""
+    query = request.GET.get('q', '').strip()
+    try:
+        page_number = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        page_number = 1
+    per_page = settings.POSTS_PER_PAGE
+    offset = (page_number - 1) * per_page
+    posts = []
+    if query and offset < settings.SEARCH_MAX_RESULTS:
+        posts = search_posts(query, per_page + 1, offset)
+    has_next = (
+        len(posts) > per_page
+        and offset + per_page < settings.SEARCH_MAX_RESULTS
+    )
+    posts = render_post_cards(posts[:per_page])
+    return render(
+        request,
+        'posts/search.html',
+        {
+            'query': query,
+            'posts': posts,
+            'page_number': page_number,
+            'previous_page': page_number - 1 if page_number > 1 else None,
+            'next_page': page_number + 1 if has_next else None,
+        }
+    )
@@ -0,0 +1,25 @@
+// Догрузка комментариев на странице поста и общее окно удаления
+document.addEventListener('click', function (event) {
+  const link = event.target.closest('[data-comments-more] a');
+  if (!link) {
+    return;
+  }
+  event.preventDefault();
+  const item = link.closest('[data-comments-more]');
+  fetch(link.dataset.url)
+    .then(function (response) {
+      return response.text();
+    })
+    .then(function (html) {
+      item.insertAdjacentHTML('afterend', html);
+      item.remove();
+    });
+});
+
+document.addEventListener('show.bs.modal', function (event) {
+  const button = event.relatedTarget;
+  const confirm = event.target.querySelector('[data-delete-confirm]');
+  if (button && confirm && button.dataset.deleteUrl) {
+    confirm.href = button.dataset.deleteUrl;
+  }
+});
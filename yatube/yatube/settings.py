@@ -7,7 +7,9 @@ SECRET_KEY = str(os.getenv('SECRET_KEY'))
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
-DEBUG = True
+DEBUG = os.getenv('DEBUG', 'True') == 'True'
+# Панель django-debug-toolbar подключается только в режиме отладки
+DEBUG_TOOLBAR = DEBUG and os.getenv('DEBUG_TOOLBAR', 'True') == 'True'
 
 ALLOWED_HOSTS = [
     'localhost',
@@ -30,10 +32,11 @@ INSTALLED_APPS = [
     'core.apps.CoreConfig',
     'about.apps.AboutConfig',
     'sorl.thumbnail',
-    'debug_toolbar',
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.QueryInspectorMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -41,9 +44,12 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'debug_toolbar.middleware.DebugToolbarMiddleware',
 ]
 
+if DEBUG_TOOLBAR:
+    INSTALLED_APPS.append('debug_toolbar')
+    MIDDLEWARE.append('debug_toolbar.middleware.DebugToolbarMiddleware')
+
 ROOT_URLCONF = 'yatube.urls'
 
 TEMPLATES = [
@@ -64,6 +70,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'yatube.wsgi.application'
+ASGI_APPLICATION = 'yatube.asgi.application'
 
 DATABASES = {
     'default': {
@@ -112,18 +119,96 @@ EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 POSTS_PER_PAGE = 10
+# Длина начала текста поста или комментария в карточках ленты
+EXCERPT_LENGTH = 500
+# Сколько секунд число постов ленты для ссылок на страницы берется из
+# кеша без пересчета; пересчет идет в фоновом потоке
+FEED_COUNT_REFRESH = 60
+# Потоки для одновременной загрузки независимых данных страницы
+# (core.parallel.gather), 0 - загружать по очереди
+VIEW_LOADER_THREADS = int(os.getenv('VIEW_LOADER_THREADS', '4'))
+# Сколько лучших результатов поиска можно пролистать
+SEARCH_MAX_RESULTS = 1000
+# Начиная с этого размера таблицы админка не считает строки COUNT(*)
+ADMIN_EXACT_COUNT_LIMIT = 10000
+# Комментарии на странице поста и в каждой догружаемой порции
+COMMENTS_PER_PAGE = 20
+# Последние комментарии в карточке поста на ленте, остальные - на
+# странице поста
+FEED_COMMENTS = 5
+
+# Лента подписок с рассылкой постов подписчикам при публикации
+FOLLOW_FEED_FANOUT = os.getenv('FOLLOW_FEED_FANOUT', 'False') == 'True'
+FOLLOW_FEED_MAX_LENGTH = 1000
+FOLLOW_FEED_FANOUT_MAX_FOLLOWERS = 10000
+FOLLOW_FEED_BATCH_SIZE = 500
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Миниатюры картинок постов, создаваемые заранее: размер -> (геометрия
+# и параметры sorl-thumbnail), и число потоков пула генерации
+POST_THUMBNAILS = {
+    'card': ('960x339', {'crop': 'top', 'upscale': True}),
+}
+THUMBNAIL_WORKERS = 2
+
+# Кеш выбирается переменной окружения CACHE_BACKEND:
+# locmem - в памяти процесса (по умолчанию, только для одного процесса),
+# file и sqlite - общий для всех воркеров одного сервера,
+# redis - общий для нескольких серверов (нужен пакет django-redis).
+CACHE_BACKENDS = {
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', ''),
+    'file': (
+        'django.core.cache.backends.filebased.FileBasedCache',
+        os.path.join(BASE_DIR, 'cache', 'files'),
+    ),
+    'sqlite': (
+        'core.cache_backends.sqlite.SQLiteCache',
+        os.path.join(BASE_DIR, 'cache', 'cache.sqlite3'),
+    ),
+    'redis': ('django_redis.cache.RedisCache', 'redis://127.0.0.1:6379/1'),
+}
+CACHE_BACKEND, CACHE_LOCATION = CACHE_BACKENDS[
+    os.getenv('CACHE_BACKEND', 'locmem')
+]
+
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': os.getenv('CACHE_LOCATION', CACHE_LOCATION),
     }
 }
 
+# Время жизни закешированных страниц лент (index, group, profile, follow)
+FEED_CACHE_TIMEOUT = 20
+# Устаревшую страницу ленты перестраивает один запрос, остальные
+# PAGE_CACHE_STALE секунд получают старую копию. Свежесть сокращается
+# на случайную долю до PAGE_CACHE_JITTER. Страницу, которой еще нет в
+# кеше, запросы ждут до PAGE_CACHE_WAIT секунд; блокировка перестроения
+# снимается через PAGE_CACHE_LOCK_TIMEOUT, если запрос не завершился.
+PAGE_CACHE_STALE = 60
+PAGE_CACHE_JITTER = 0.1
+PAGE_CACHE_WAIT = 2
+PAGE_CACHE_LOCK_TIMEOUT = 10
+# Время жизни отрендеренных карточек постов
+POST_CARD_CACHE_TIMEOUT = 60 * 60
+
+# Метрики запросов для Prometheus по адресу /metrics: включаются
+# METRICS_ENABLED, измеряется доля METRICS_SAMPLE_RATE запросов.
+# Сборщик без сессии персонала передает METRICS_TOKEN.
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'False') == 'True'
+METRICS_SAMPLE_RATE = float(os.getenv('METRICS_SAMPLE_RATE', '1.0'))
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+# Поиск N+1 и медленных запросов: off, log - запись в лог core.queries,
+# raise - ошибка при повторе запроса одной формы (для тестов).
+QUERY_INSPECTOR = os.getenv('QUERY_INSPECTOR', 'log' if DEBUG else 'off')
+QUERY_REPEAT_THRESHOLD = 5
+SLOW_QUERY_MS = 200
+
 INTERNAL_IPS = [
     '127.0.0.1',
 ]